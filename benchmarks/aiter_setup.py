@@ -0,0 +1,116 @@
+"""Benchmark the setup cost of `async for` with `desugar.builtins.aiter()`.
+
+Many short `async for` loops are run in an asyncio task, natively, desugared,
+and desugared with the cache of validated `__anext__` methods cleared before
+every loop (as before it was added). Each case is timed both as the bare call
+(`__aiter__()` looked up on the type, as `async for` does, for the native
+variant) and as a whole loop over a 3-item async iterator. Runs of each
+variant alternate, and the fastest is reported.
+
+    python -m benchmarks.aiter_setup [--loops N] [--repeat N]
+
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import time
+import types
+from typing import Any, Callable, Dict, List, Optional
+
+from desugar import builtins as debuiltins
+
+
+class Counter:
+
+    """An async iterator yielding `stop` integers."""
+
+    def __init__(self, stop: int) -> None:
+        self.current = 0
+        self.stop = stop
+
+    def __aiter__(self) -> Counter:
+        return self
+
+    async def __anext__(self) -> int:
+        if self.current >= self.stop:
+            raise StopAsyncIteration
+        self.current += 1
+        return self.current
+
+
+async def native_aiter(loops: int, uncached: bool) -> float:
+    start = time.perf_counter()
+    for _ in range(loops):
+        iterable = Counter(3)
+        type(iterable).__aiter__(iterable)
+    return time.perf_counter() - start
+
+
+async def desugared_aiter(loops: int, uncached: bool) -> float:
+    start = time.perf_counter()
+    for _ in range(loops):
+        if uncached:
+            debuiltins._validated_anext.clear()
+        debuiltins.aiter(Counter(3))
+    return time.perf_counter() - start
+
+
+async def native_loop(loops: int, uncached: bool) -> float:
+    start = time.perf_counter()
+    for _ in range(loops):
+        async for _ in Counter(3):
+            pass
+    return time.perf_counter() - start
+
+
+@types.coroutine
+def desugared_loop(loops: int, uncached: bool) -> Any:
+    start = time.perf_counter()
+    for _ in range(loops):
+        if uncached:
+            debuiltins._validated_anext.clear()
+        _iter = debuiltins.aiter(Counter(3))
+        while True:
+            try:
+                yield from debuiltins._await(debuiltins.anext(_iter))
+            except StopAsyncIteration:
+                break
+    return time.perf_counter() - start
+
+
+CASES: Dict[str, Dict[str, Callable[[int, bool], Any]]] = {
+    "aiter()": {"native": native_aiter, "desugared": desugared_aiter},
+    "3-item async for": {"native": native_loop, "desugared": desugared_loop},
+}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.partition("\n")[0])
+    parser.add_argument("--loops", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=15)
+    args = parser.parse_args(argv)
+    if args.loops < 1 or args.repeat < 1:
+        parser.error("--loops and --repeat must be positive")
+
+    for name, functions in CASES.items():
+        variants = {
+            "native": (functions["native"], False),
+            "desugared": (functions["desugared"], False),
+            "uncached": (functions["desugared"], True),
+        }
+        timings: Dict[str, float] = {}
+        for _ in range(args.repeat):
+            for variant, (function, uncached) in variants.items():
+                seconds = asyncio.run(function(args.loops, uncached)) / args.loops
+                timings[variant] = min(timings.get(variant, seconds), seconds)
+        print(
+            f"{name:<18}",
+            *(
+                f"{variant} {seconds * 1e9:>6.0f}ns"
+                for variant, seconds in timings.items()
+            ),
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Benchmark the throughput of `amap()` as its concurrency grows.
+
+Every call sleeps for `--latency` milliseconds on average (from half to one
+and a half times as long, so calls finish out of order), standing in for I/O.
+The calls of `desugar.builtins.amap()` are timed for each `--concurrency`,
+yielding results both in order and as they finish. Runs alternate, and the
+fastest is reported as items per second.
+
+    python -m benchmarks.amap [--items N] [--latency MS]
+        [--concurrency N ...] [--repeat N]
+
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import random
+import time
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from desugar import builtins as debuiltins
+
+
+async def source(delays: List[float]) -> AsyncIterator[float]:
+    for delay in delays:
+        yield delay
+
+
+async def call(delay: float) -> float:
+    await asyncio.sleep(delay)
+    return delay
+
+
+async def run(delays: List[float], concurrency: int, ordered: bool) -> List[float]:
+    return [
+        result
+        async for result in debuiltins.amap(
+            call, source(delays), concurrency=concurrency, ordered=ordered
+        )
+    ]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.partition("\n")[0])
+    parser.add_argument("--items", type=int, default=256)
+    parser.add_argument("--latency", type=float, default=5.0)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+    if min(args.items, args.repeat, *args.concurrency) < 1:
+        parser.error("--items, --concurrency and --repeat must be positive")
+    if args.latency < 0:
+        parser.error("--latency must not be negative")
+
+    rng = random.Random(0)
+    delays = [rng.uniform(0.5, 1.5) * args.latency / 1e3 for _ in range(args.items)]
+    expected = sorted(delays)
+    variants = [
+        (concurrency, ordered)
+        for concurrency in args.concurrency
+        for ordered in (True, False)
+    ]
+    timings: Dict[Tuple[int, bool], float] = {}
+    for _ in range(args.repeat):
+        for concurrency, ordered in variants:
+            start = time.perf_counter()
+            results = asyncio.run(run(delays, concurrency, ordered))
+            seconds = time.perf_counter() - start
+            assert results == delays if ordered else sorted(results) == expected
+            key = concurrency, ordered
+            timings[key] = min(timings.get(key, seconds), seconds)
+    print(f"{args.items:,} calls of {args.latency}ms on average")
+    for concurrency in args.concurrency:
+        print(
+            f"  concurrency {concurrency:<4}",
+            *(
+                f"{'ordered' if ordered else 'unordered'}"
+                f" {args.items / timings[concurrency, ordered]:>8,.0f}/s"
+                for ordered in (True, False)
+            ),
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""Microbenchmarks of the async protocols under asyncio.
+
+Every case is run twice: once as native syntax and once as the desugared
+equivalent from the README (`await` ➠ `yield from desugar.builtins._await()`,
+`async for` ➠ `aiter()`/`anext()`, etc.). Operations are timed in batches and
+the per-operation time of each batch is treated as a sample, so the reported
+percentiles show tail latency and not just the mean.
+
+    python -m benchmarks.async_protocols [--samples N] [--batch N] [case ...]
+
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+import types
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from desugar.builtins import _await, aiter, anext
+
+Benchmark = Callable[[int, int], Awaitable[List[float]]]
+
+
+class AsyncCounter:
+
+    """An async iterator yielding `stop` integers."""
+
+    def __init__(self, stop: int) -> None:
+        self.current = 0
+        self.stop = stop
+
+    def __aiter__(self) -> AsyncCounter:
+        return self
+
+    async def __anext__(self) -> int:
+        if self.current >= self.stop:
+            raise StopAsyncIteration
+        self.current += 1
+        return self.current
+
+
+class AsyncContextManager:
+
+    """An async context manager which does nothing."""
+
+    async def __aenter__(self) -> AsyncContextManager:
+        return self
+
+    async def __aexit__(self, exc_type: Any, exc_value: Any, traceback: Any) -> None:
+        return None
+
+
+async def native_async_for(samples: int, batch: int) -> List[float]:
+    """Time each item of `async for`."""
+    timings = []
+    count = 0
+    start = time.perf_counter_ns()
+    async for _ in AsyncCounter(samples * batch):
+        count += 1
+        if count == batch:
+            now = time.perf_counter_ns()
+            timings.append((now - start) / batch)
+            count = 0
+            start = now
+    return timings
+
+
+@types.coroutine
+def desugared_async_for(samples: int, batch: int) -> Any:
+    """Time each item of the desugared `async for`."""
+    timings = []
+    count = 0
+    start = time.perf_counter_ns()
+    _iter = aiter(AsyncCounter(samples * batch))
+    while True:
+        try:
+            _ = yield from _await(anext(_iter))
+        except StopAsyncIteration:
+            break
+        else:
+            count += 1
+            if count == batch:
+                now = time.perf_counter_ns()
+                timings.append((now - start) / batch)
+                count = 0
+                start = now
+    del _iter
+    return timings
+
+
+async def native_async_with(samples: int, batch: int) -> List[float]:
+    """Time the setup and teardown of `async with`."""
+    timings = []
+    manager = AsyncContextManager()
+    for _ in range(samples):
+        start = time.perf_counter_ns()
+        for _ in range(batch):
+            async with manager:
+                pass
+        timings.append((time.perf_counter_ns() - start) / batch)
+    return timings
+
+
+@types.coroutine
+def desugared_async_with(samples: int, batch: int) -> Any:
+    """Time the setup and teardown of the desugared `async with`."""
+    timings = []
+    manager = AsyncContextManager()
+    for _ in range(samples):
+        start = time.perf_counter_ns()
+        for _ in range(batch):
+            _enter = type(manager).__aenter__
+            _exit = type(manager).__aexit__
+            yield from _await(_enter(manager))
+            try:
+                pass
+            except:
+                if not (yield from _await(_exit(manager, *sys.exc_info()))):
+                    raise
+            else:
+                yield from _await(_exit(manager, None, None, None))
+        timings.append((time.perf_counter_ns() - start) / batch)
+    return timings
+
+
+def _completed_futures(count: int) -> List[asyncio.Future]:
+    """Create futures which already have a result."""
+    loop = asyncio.get_running_loop()
+    futures = []
+    for _ in range(count):
+        future = loop.create_future()
+        future.set_result(None)
+        futures.append(future)
+    return futures
+
+
+async def native_completed_future(samples: int, batch: int) -> List[float]:
+    """Time awaiting an already-completed future."""
+    timings = []
+    for _ in range(samples):
+        futures = _completed_futures(batch)
+        start = time.perf_counter_ns()
+        for future in futures:
+            await future
+        timings.append((time.perf_counter_ns() - start) / batch)
+    return timings
+
+
+@types.coroutine
+def desugared_completed_future(samples: int, batch: int) -> Any:
+    """Time awaiting an already-completed future through `_await()`."""
+    timings = []
+    for _ in range(samples):
+        futures = _completed_futures(batch)
+        start = time.perf_counter_ns()
+        for future in futures:
+            yield from _await(future)
+        timings.append((time.perf_counter_ns() - start) / batch)
+    return timings
+
+
+async def _native_coroutine() -> None:
+    pass
+
+
+@types.coroutine
+def _desugared_coroutine() -> Any:
+    return None
+    yield
+
+
+def _time_creation(
+    coroutine_function: Callable[[], Any], samples: int, batch: int
+) -> List[float]:
+    """Time creating (and closing) coroutines."""
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter_ns()
+        for _ in range(batch):
+            coroutine_function().close()
+        timings.append((time.perf_counter_ns() - start) / batch)
+    return timings
+
+
+async def native_coroutine_creation(samples: int, batch: int) -> List[float]:
+    """Time creating an `async def` coroutine."""
+    return _time_creation(_native_coroutine, samples, batch)
+
+
+@types.coroutine
+def desugared_coroutine_creation(samples: int, batch: int) -> Any:
+    """Time creating a `types.coroutine`-decorated generator."""
+    return _time_creation(_desugared_coroutine, samples, batch)
+    yield
+
+
+CASES: Dict[str, Tuple[Benchmark, Benchmark]] = {
+    "async_for": (native_async_for, desugared_async_for),
+    "async_with": (native_async_with, desugared_async_with),
+    "completed_future": (native_completed_future, desugared_completed_future),
+    "coroutine_creation": (native_coroutine_creation, desugared_coroutine_creation),
+}
+
+
+def summarize(timings: List[float]) -> Dict[str, float]:
+    """Calculate the mean and percentiles of the timings."""
+    percentiles = statistics.quantiles(timings, n=100, method="inclusive")
+    return {
+        "mean": statistics.fmean(timings),
+        "p50": percentiles[49],
+        "p90": percentiles[89],
+        "p99": percentiles[98],
+        "max": max(timings),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.partition("\n")[0])
+    parser.add_argument("cases", nargs="*", metavar="case", help=", ".join(CASES))
+    parser.add_argument("--samples", type=int, default=1_000)
+    parser.add_argument("--batch", type=int, default=100)
+    args = parser.parse_args(argv)
+    if args.samples < 2:
+        parser.error("at least 2 samples are needed to calculate percentiles")
+    for name in args.cases:
+        if name not in CASES:
+            parser.error(f"unknown case {name!r}")
+
+    columns = "mean", "p50", "p90", "p99", "max"
+    print(f"{'case':<20} {'variant':<10}", *(f"{name:>9}" for name in columns))
+    for name in args.cases or CASES:
+        for variant, benchmark in zip(("native", "desugared"), CASES[name]):
+            # Warm up before measuring.
+            asyncio.run(benchmark(2, args.batch))
+            stats = summarize(asyncio.run(benchmark(args.samples, args.batch)))
+            row = (f"{stats[column]:>7.0f}ns" for column in columns)
+            print(f"{name:<20} {variant:<10}", *row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Benchmark carving frames out of a memory-mapped file with `getitem_view()`.
+
+A file of length-prefixed frames (a 4-byte little-endian length followed by
+that many bytes, 4 KiB on average) is created in a temporary directory and
+memory-mapped. Parsing it slices out each header and payload via the desugared
+subscription, once with `desugar.operator.__getitem__()`, which copies every
+slice, and once with `desugar.operator.getitem_view()`, which returns
+`memoryview` slices instead. The file is parsed once before timing so the
+page cache is warm, runs alternate, and the fastest run is reported.
+
+    python -m benchmarks.buffer_views [--mib N] [--repeat N]
+
+"""
+from __future__ import annotations
+import argparse
+import mmap
+import pathlib
+import random
+import tempfile
+import time
+from typing import Any, Callable, List, Optional, Tuple
+
+from desugar import operator
+
+HEADER_SIZE = 4
+
+
+def write_frames(path: pathlib.Path, size: int) -> int:
+    """Write frames to the file until it is at least `size` bytes long."""
+    rng = random.Random(0)
+    payloads = [rng.randbytes(length) for length in range(0, 8193, 512)]
+    frames = written = 0
+    with path.open("wb") as file:
+        while written < size:
+            payload = rng.choice(payloads)
+            file.write(len(payload).to_bytes(HEADER_SIZE, "little"))
+            file.write(payload)
+            written += HEADER_SIZE + len(payload)
+            frames += 1
+    return frames
+
+
+def parse(blob: Any, getitem: Callable[[Any, Any], Any]) -> Tuple[int, int]:
+    """Count the frames and the bytes of their payloads."""
+    frames = total = position = 0
+    end = len(blob)
+    while position < end:
+        header = getitem(blob, slice(position, position + HEADER_SIZE))
+        length = int.from_bytes(header, "little")
+        position += HEADER_SIZE
+        payload = getitem(blob, slice(position, position + length))
+        position += length
+        frames += 1
+        total += len(payload)
+        # Views must be released before the file can be unmapped.
+        del header, payload
+    return frames, total
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.partition("\n")[0])
+    parser.add_argument("--mib", type=int, default=1024, help="size of the file")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+    if args.mib < 1 or args.repeat < 1:
+        parser.error("--mib and --repeat must be positive")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = pathlib.Path(directory) / "frames.bin"
+        frames = write_frames(path, args.mib * 1024 ** 2)
+        with path.open("rb") as file, mmap.mmap(
+            file.fileno(), 0, access=mmap.ACCESS_READ
+        ) as blob:
+            variants = {
+                "copy": operator.__getitem__,
+                "view": operator.getitem_view,
+            }
+            results = [parse(blob, getitem) for getitem in variants.values()]
+            assert results == [results[0]] * len(results), results
+            assert results[0][0] == frames
+            timings = {}
+            for _ in range(args.repeat):
+                for name, getitem in variants.items():
+                    start = time.perf_counter()
+                    parse(blob, getitem)
+                    seconds = time.perf_counter() - start
+                    timings[name] = min(timings.get(name, seconds), seconds)
+    print(f"{frames:,} frames in {args.mib:,} MiB")
+    for name, seconds in timings.items():
+        print(f"  {name:<5} {seconds:>8.3f}s")
+    print(f"  speedup with views: {timings['copy'] / timings['view']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Benchmark fusing comprehensions into loops.
+
+Each case is a comprehension, desugared with the default rules (which consume
+a generator expression) and with "fused_comprehension" added (which adds each
+element to the result in a loop), and also run without desugaring for
+reference. Each is timed with a short and a long input, and the difference
+gives the cost per element, without the cost of starting each comprehension.
+Runs of each variant alternate so drift does not favour any of them, and the
+fastest run is reported.
+
+    python -m benchmarks.comprehensions [--repeat N] [--number N] [case ...]
+
+"""
+
+from __future__ import annotations
+import argparse
+import textwrap
+import timeit
+from typing import Any, Callable, Dict, FrozenSet, List, Optional
+
+from desugar import transform
+
+SHORT = 10
+LONG = 1_000
+
+# Each case defines `run(values)`.
+CASES: Dict[str, str] = {
+    "list": """
+        def run(values):
+            return [value for value in values]
+        """,
+    "list with condition": """
+        def run(values):
+            return [value for value in values if value]
+        """,
+    "set": """
+        def run(values):
+            return {value for value in values}
+        """,
+    "dict": """
+        def run(values):
+            return {value: value for value in values}
+        """,
+    "nested": """
+        def run(values):
+            return [pair for value in values for pair in (value, value)]
+        """,
+}
+
+
+def compile_case(source: str, rules: Optional[FrozenSet[str]]) -> Callable[..., Any]:
+    source = textwrap.dedent(source)
+    if rules is not None:
+        source = transform.transform(source, rules)
+    namespace: Dict[str, Any] = {"__name__": "case"}
+    exec(compile(source, "<case>", "exec"), namespace)
+    return namespace["run"]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.partition("\n")[0])
+    parser.add_argument("cases", nargs="*", choices=[[], *CASES], default=[])
+    parser.add_argument("--repeat", type=int, default=15)
+    parser.add_argument("--number", type=int, default=100)
+    args = parser.parse_args(argv)
+    if args.repeat < 1 or args.number < 1:
+        parser.error("--repeat and --number must be positive")
+
+    variants: Dict[str, Optional[FrozenSet[str]]] = {
+        "native": None,
+        "default": transform.DEFAULT_RULES,
+        "default+fused": transform.DEFAULT_RULES | {"fused_comprehension"},
+    }
+    inputs = {length: list(range(length)) for length in (SHORT, LONG)}
+    for name in args.cases or CASES:
+        runs = {
+            variant: compile_case(CASES[name], rules)
+            for variant, rules in variants.items()
+        }
+        for values in inputs.values():
+            results = [run(values) for run in runs.values()]
+            assert all(result == results[0] for result in results), results
+        timings: Dict[str, Dict[int, float]] = {variant: {} for variant in runs}
+        for _ in range(args.repeat):
+            for variant, run in runs.items():
+                for length, values in inputs.items():
+                    seconds = (
+                        timeit.timeit(lambda: run(values), number=args.number)
+                        / args.number
+                    )
+                    best = timings[variant].get(length, seconds)
+                    timings[variant][length] = min(best, seconds)
+        print(name)
+        per_element = {
+            variant: (times[LONG] - times[SHORT]) / (LONG - SHORT)
+            for variant, times in timings.items()
+        }
+        for variant, seconds in per_element.items():
+            print(f"  {variant:<16} {seconds * 1e9:>8.1f}ns per element")
+        speedup = per_element["default"] / per_element["default+fused"]
+        print(f"  per-element speedup when fused: {speedup:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
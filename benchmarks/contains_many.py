@@ -0,0 +1,78 @@
+"""Benchmark bulk membership testing with `contains_many()`.
+
+For each kind of container, checking which of a batch of items it contains is
+timed as one call of `desugar.operator.contains_many()` and as a call of
+`desugar.operator.__contains__()` per item, which looks up `__contains__` on
+the container's type every time. Runs of each variant alternate so drift does
+not favour either of them, and the fastest run is reported.
+
+    python -m benchmarks.contains_many [--items N] [--repeat N] [--number N]
+
+"""
+from __future__ import annotations
+import argparse
+import timeit
+from typing import Any, Callable, Dict, List, Optional
+
+from desugar import operator
+
+
+class Custom:
+
+    """A container with a `__contains__` method written in Python."""
+
+    def __init__(self, items: List[int]) -> None:
+        self._items = set(items)
+
+    def __contains__(self, item: Any) -> bool:
+        return item in self._items
+
+
+def containers(size: int) -> Dict[str, Any]:
+    """Create containers holding every other integer up to `size`."""
+    items = list(range(0, size, 2))
+    return {
+        "set": set(items),
+        "dict": dict.fromkeys(items),
+        "list": items,
+        "custom": Custom(items),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.partition("\n")[0])
+    parser.add_argument("--items", type=int, default=1_000)
+    parser.add_argument("--repeat", type=int, default=15)
+    parser.add_argument("--number", type=int, default=20)
+    args = parser.parse_args(argv)
+    if min(args.items, args.repeat, args.number) < 1:
+        parser.error("--items, --repeat and --number must be positive")
+
+    items = list(range(args.items))
+    for name, container in containers(args.items).items():
+        runs: Dict[str, Callable[[], Any]] = {
+            "per item": lambda: bytearray(
+                operator.__contains__(container, item) for item in items
+            ),
+            "contains_many": lambda: operator.contains_many(container, items),
+        }
+        results = [run() for run in runs.values()]
+        assert all(result == results[0] for result in results)
+        timings: Dict[str, float] = {}
+        for _ in range(args.repeat):
+            for variant, run in runs.items():
+                seconds = timeit.timeit(run, number=args.number) / args.number
+                timings[variant] = min(timings.get(variant, seconds), seconds)
+        speedup = timings["per item"] / timings["contains_many"]
+        print(
+            f"{name:<8}",
+            *(
+                f"{variant} {seconds * 1e6:>8.1f}µs"
+                for variant, seconds in timings.items()
+            ),
+            f"({speedup:.2f}x)",
+        )
+
+
+if __name__ == "__main__":
+    main()
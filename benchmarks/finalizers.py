@@ -0,0 +1,146 @@
+"""Benchmark the size of desugared code with nested `finally` blocks.
+
+For each depth, a function nesting that many `try` statements in the `finally`
+blocks of one another (and, for comparison, in their bodies) is desugared with
+the default rules, which copy each `finally` block into an exception handler,
+and with "shared_finally", which keeps a single copy. The size of the
+desugared source and its bytecode are reported along with the fastest of the
+repeats of desugaring and compiling it. Then calls of a function with a
+`finally` block are timed, to show the cost of keeping the pending exception
+in a temporary.
+
+    python -m benchmarks.finalizers [--repeat N] [--depth N]
+
+"""
+
+from __future__ import annotations
+import argparse
+import marshal
+import textwrap
+import time
+import timeit
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+from desugar import transform
+
+WITHOUT = transform.DEFAULT_RULES
+WITH = transform.DEFAULT_RULES | {"shared_finally"}
+
+# Each case defines `run()`.
+CASES: Dict[str, str] = {
+    "no exception": """
+        def run():
+            result = 0
+            try:
+                result += 1
+            finally:
+                result += 2
+            return result
+        """,
+    "exception": """
+        def run():
+            result = 0
+            try:
+                try:
+                    raise KeyError
+                finally:
+                    result += 2
+            except KeyError:
+                return result
+        """,
+}
+
+
+def nested(depth: int, in_finally: bool) -> str:
+    """Create a function nesting `try` statements to the depth."""
+    block = "cleanup(0)"
+    for level in range(1, depth + 1):
+        if in_finally:
+            body, finalbody = f"work({level})", block
+        else:
+            body, finalbody = block, f"cleanup({level})"
+        block = "\n".join(
+            [
+                "try:",
+                textwrap.indent(body, "    "),
+                "finally:",
+                textwrap.indent(finalbody, "    "),
+            ]
+        )
+    return f"def run():\n{textwrap.indent(block, '    ')}\n"
+
+
+def fastest(function: Callable[[], Any], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def measure(source: str, rules: FrozenSet[str], repeat: int) -> Tuple[int, ...]:
+    """Return the size of the desugared source and bytecode, and the time to
+    desugar and compile it (in microseconds)."""
+    desugared = transform.transform(source, rules)
+    code = compile(desugared, "<nested>", "exec")
+    transforming = fastest(lambda: transform.transform(source, rules), repeat)
+    compiling = fastest(lambda: compile(desugared, "<nested>", "exec"), repeat)
+    return (
+        len(desugared),
+        len(marshal.dumps(code)),
+        round(transforming * 1e6),
+        round(compiling * 1e6),
+    )
+
+
+def compile_case(source: str, rules: Optional[FrozenSet[str]]) -> Callable[[], Any]:
+    source = textwrap.dedent(source)
+    if rules is not None:
+        source = transform.transform(source, rules)
+    namespace: Dict[str, Any] = {"__name__": "case"}
+    exec(compile(source, "<case>", "exec"), namespace)
+    return namespace["run"]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.partition("\n")[0])
+    parser.add_argument("--repeat", type=int, default=15)
+    parser.add_argument("--depth", type=int, default=10)
+    parser.add_argument("--number", type=int, default=100_000)
+    args = parser.parse_args(argv)
+    if args.repeat < 1 or args.depth < 1 or args.number < 1:
+        parser.error("--repeat, --depth and --number must be positive")
+
+    columns = ("source", "bytecode", "desugar µs", "compile µs")
+    for in_finally in (True, False):
+        print("nested in finally" if in_finally else "nested in try")
+        print(f"  {'depth':>5}  {'rules':<14}" + "".join(f"{c:>12}" for c in columns))
+        for depth in range(2, args.depth + 1, 2):
+            source = nested(depth, in_finally)
+            for label, rules in (("default", WITHOUT), ("shared_finally", WITH)):
+                sizes = measure(source, rules, args.repeat)
+                print(
+                    f"  {depth:>5}  {label:<14}"
+                    + "".join(f"{size:>12,}" for size in sizes)
+                )
+
+    for name, source in CASES.items():
+        runs = [compile_case(source, rules) for rules in (None, WITHOUT, WITH)]
+        results = [run() for run in runs]
+        assert len(set(results)) == 1, results
+        # Alternating between the variants keeps drift (e.g. in clock speed)
+        # from favouring any of them.
+        timings: List[List[float]] = [[], [], []]
+        for _ in range(args.repeat):
+            for run, times in zip(runs, timings):
+                times.append(timeit.timeit(run, number=args.number) / args.number)
+        native, without, with_ = map(min, timings)
+        print(
+            f"{name:<14} native {native * 1e9:>7.1f}ns, default {without * 1e9:>7.1f}ns"
+            f" ➠ shared_finally {with_ * 1e9:>7.1f}ns ({without / with_:.2f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
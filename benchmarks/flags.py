@@ -0,0 +1,110 @@
+"""Benchmark unravelling loop control with exceptions versus with flags.
+
+Each case is a function with a tight loop, desugared with `break`, `continue`
+and `if` raising exceptions (the default) and with the "flags" rule. Each is
+timed both with only the control flow rules and with every default rule, and
+also without desugaring for reference. Runs of each variant alternate so drift
+does not favour any of them, and the fastest run is reported.
+
+    python -m benchmarks.flags [--repeat N] [--number N] [case ...]
+
+"""
+from __future__ import annotations
+import argparse
+import textwrap
+import timeit
+from typing import Any, Callable, Dict, FrozenSet, List, Optional
+
+from desugar import transform
+
+CONTROL_FLOW = frozenset({"for", "break", "continue", "if", "elif"})
+
+# Each case defines `run()`.
+CASES: Dict[str, str] = {
+    "while continue": """
+        def run():
+            total = i = 0
+            while i < 1000:
+                i += 1
+                if i % 3:
+                    continue
+                total += i
+            return total
+        """,
+    "for continue": """
+        def run():
+            total = 0
+            for i in range(1000):
+                if i % 3:
+                    continue
+                total += i
+            return total
+        """,
+    "for break": """
+        def run():
+            total = 0
+            for i in range(100):
+                for j in range(10):
+                    if j == 5:
+                        break
+                    total += j
+            return total
+        """,
+    "for if": """
+        def run():
+            total = 0
+            for i in range(1000):
+                if i % 3:
+                    total += i
+            return total
+        """,
+}
+
+
+def compile_case(source: str, rules: Optional[FrozenSet[str]]) -> Callable[[], Any]:
+    source = textwrap.dedent(source)
+    if rules is not None:
+        source = transform.transform(source, rules)
+    namespace: Dict[str, Any] = {"__name__": "case"}
+    exec(compile(source, "<case>", "exec"), namespace)
+    return namespace["run"]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.partition("\n")[0])
+    parser.add_argument("cases", nargs="*", choices=[[], *CASES], default=[])
+    parser.add_argument("--repeat", type=int, default=15)
+    parser.add_argument("--number", type=int, default=100)
+    args = parser.parse_args(argv)
+    if args.repeat < 1 or args.number < 1:
+        parser.error("--repeat and --number must be positive")
+
+    variants: Dict[str, Optional[FrozenSet[str]]] = {
+        "native": None,
+        "control flow": CONTROL_FLOW,
+        "control flow+flags": CONTROL_FLOW | {"flags"},
+        "default": transform.DEFAULT_RULES,
+        "default+flags": transform.DEFAULT_RULES | {"flags"},
+    }
+    for name in args.cases or CASES:
+        runs = {
+            variant: compile_case(CASES[name], rules)
+            for variant, rules in variants.items()
+        }
+        results = {variant: run() for variant, run in runs.items()}
+        assert len(set(results.values())) == 1, results
+        timings: Dict[str, float] = {}
+        for _ in range(args.repeat):
+            for variant, run in runs.items():
+                seconds = timeit.timeit(run, number=args.number) / args.number
+                timings[variant] = min(timings.get(variant, seconds), seconds)
+        print(name)
+        for variant, seconds in timings.items():
+            print(f"  {variant:<20} {seconds * 1e6:>10.1f}µs")
+        for base in ("control flow", "default"):
+            speedup = timings[base] / timings[f"{base}+flags"]
+            print(f"  {base} speedup with flags: {speedup:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
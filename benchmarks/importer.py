@@ -0,0 +1,151 @@
+"""Benchmark importing a package through `desugar.importer`.
+
+A package of generated modules is imported in a fresh interpreter, both
+normally and desugared, with a cold cache (no bytecode in `__pycache__`) and
+a warm one. Warm imports are repeated and the median is reported.
+
+    python -m benchmarks.importer [--modules N] [--repeat N]
+
+"""
+from __future__ import annotations
+import argparse
+import os
+import pathlib
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import textwrap
+from typing import List, Optional
+
+MODULE = textwrap.dedent(
+    '''\
+    """Generated module {index}."""
+    import collections
+    import contextlib
+
+    from . import {previous}
+
+    CONSTANT = {index}
+
+
+    class Record{index}:
+
+        """A record."""
+
+        def __init__(self, name, values=()):
+            self.name = name
+            self.values = list(values)
+
+        def __repr__(self):
+            return f"Record{index}({{self.name!r}}, {{self.values!r}})"
+
+        @property
+        def total(self):
+            total = 0
+            for value in self.values:
+                if value < 0:
+                    continue
+                elif value > 1000:
+                    break
+                total += value
+            else:
+                total *= 2
+            return total
+
+
+    def summarize(records):
+        counts = collections.Counter(record.name for record in records)
+        squares = {{name: count ** 2 for name, count in counts.items()}}
+        try:
+            best = max(squares, key=lambda name: (squares[name], name))
+        except ValueError:
+            best = None
+        finally:
+            counts.clear()
+        with contextlib.suppress(KeyError):
+            del squares[best]
+        return best, [value for value in squares.values() if value % 2 or value > 3]
+
+
+    async def fetch(source):
+        async with source as connection:
+            async for item in connection:
+                yield item
+    '''
+)
+
+IMPORT_ALL = """
+import importlib, sys, time
+sys.path.insert(0, {root!r})
+{setup}
+start = time.perf_counter()
+for index in range({count}):
+    importlib.import_module(f"generated.module{{index}}")
+print(time.perf_counter() - start)
+"""
+
+DESUGAR = "import desugar.importer; desugar.importer.install('generated')"
+
+
+def create_package(root: pathlib.Path, count: int) -> None:
+    package = root / "generated"
+    package.mkdir()
+    (package / "__init__.py").write_text("", encoding="utf-8")
+    for index in range(count):
+        # Each module imports its predecessor to exercise relative imports.
+        previous = f"module{index - 1}" if index else "__init__ as _"
+        source = MODULE.format(index=index, previous=previous)
+        (package / f"module{index}.py").write_text(source, encoding="utf-8")
+
+
+def time_import(root: pathlib.Path, count: int, desugared: bool) -> float:
+    """Time importing the package in a new interpreter."""
+    script = IMPORT_ALL.format(
+        root=str(root), count=count, setup=DESUGAR if desugared else ""
+    )
+    # The repository root must be importable for `desugar` itself.
+    cwd = pathlib.Path(__file__).parent.parent
+    # Bytecode must be written for the warm imports to be warm.
+    env = {
+        key: value
+        for key, value in os.environ.items()
+        if key != "PYTHONDONTWRITEBYTECODE"
+    }
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=cwd,
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return float(result.stdout)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.partition("\n")[0])
+    parser.add_argument("--modules", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+    if args.modules < 1 or args.repeat < 1:
+        parser.error("--modules and --repeat must be positive")
+
+    with tempfile.TemporaryDirectory() as directory:
+        root = pathlib.Path(directory)
+        create_package(root, args.modules)
+        print(f"{args.modules} modules")
+        print(f"{'import':<10} {'cold':>10} {'warm':>10}")
+        for desugared in (False, True):
+            shutil.rmtree(root / "generated" / "__pycache__", ignore_errors=True)
+            cold = time_import(root, args.modules, desugared)
+            warm = statistics.median(
+                time_import(root, args.modules, desugared) for _ in range(args.repeat)
+            )
+            name = "desugared" if desugared else "regular"
+            print(f"{name:<10} {cold * 1000:>8.1f}ms {warm * 1000:>8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Benchmark the latency from an edit to desugared output for a large module.
+
+A module is desugared in full and then with `desugar.transform.Incremental`
+after two kinds of edits: changing a line in the middle of the module and
+inserting a statement at the top (which moves every other statement). Each
+edit alternates between two versions so every run sees a change, and the
+median of the runs is reported.
+
+    python -m benchmarks.incremental [--lines N] [--repeat N] [FILE]
+
+"""
+
+from __future__ import annotations
+import argparse
+import ast
+import pathlib
+import statistics
+import time
+from typing import Callable, List, Optional, Tuple
+
+from desugar import transform
+
+from .importer import MODULE
+
+
+def generate(lines: int) -> str:
+    """Generate a module with at least the specified number of lines."""
+    chunks = []
+    total = 0
+    index = 0
+    while total < lines:
+        chunk = MODULE.format(index=index, previous=f"module{index}")
+        chunks.append(chunk)
+        total += chunk.count("\n")
+        index += 1
+    return "".join(chunks)
+
+
+def edits(source: str) -> List[Tuple[str, Tuple[str, str]]]:
+    """Create pairs of versions of the source for each kind of edit."""
+    lines = source.splitlines(keepends=True)
+    body = ast.parse(source).body
+    # Change an integer in (or after) the middle statement of the module.
+    for statement in body[len(body) // 2 :]:
+        for node in ast.walk(statement):
+            if type(getattr(node, "value", None)) is int:
+                line = lines[node.lineno - 1]
+                number = line[node.col_offset : node.end_col_offset]
+                line = line[: node.col_offset] + f"({number} + 1)"
+                line += lines[node.lineno - 1][node.end_col_offset :]
+                changed = lines[: node.lineno - 1] + [line] + lines[node.lineno :]
+                break
+        else:
+            continue
+        break
+    else:
+        raise ValueError("no integer literal to edit")
+    # Insert a statement after any docstring and `__future__` imports.
+    position = transform._header_length(body)
+    offset = body[position].lineno - 1
+    inserted = lines[:offset] + ["_edit = 0\n"] + lines[offset:]
+    return [
+        ("edit line", (source, "".join(changed))),
+        ("insert line", (source, "".join(inserted))),
+    ]
+
+
+def median_time(func: Callable[[], object], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.partition("\n")[0])
+    parser.add_argument("file", nargs="?", type=pathlib.Path)
+    parser.add_argument("--lines", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+    if args.repeat < 1:
+        parser.error("--repeat must be positive")
+    if args.file is None:
+        source = generate(args.lines)
+    else:
+        source = args.file.read_text(encoding="utf-8")
+    print(f"{source.count(chr(10)):,} lines")
+
+    full = median_time(lambda: transform.transform(source), args.repeat)
+    print(f"{'full':<12} {'transform':<14} {full * 1000:>9.1f}ms")
+    for name, versions in edits(source):
+        for method in ("transform", "transform_ast"):
+            incremental = transform.Incremental()
+            getattr(incremental, method)(versions[0])
+            toggle = iter(versions[1:] + versions[:1])
+
+            def run() -> None:
+                nonlocal toggle
+                try:
+                    version = next(toggle)
+                except StopIteration:
+                    toggle = iter(versions[1:] + versions[:1])
+                    version = next(toggle)
+                getattr(incremental, method)(version)
+
+            latency = median_time(run, args.repeat)
+            print(f"{name:<12} {method:<14} {latency * 1000:>9.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
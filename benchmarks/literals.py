@@ -0,0 +1,99 @@
+"""Benchmark hoisting desugared literals out of loops.
+
+Each case is a function whose loop uses string (and other) literals, which
+the "literal" rule rebuilds from their bytes every time they are evaluated.
+Each is desugared with the default rules and with "hoist_literals" added, and
+also timed without desugaring for reference. Runs of each variant alternate so
+drift does not favour any of them, and the fastest run is reported.
+
+    python -m benchmarks.literals [--repeat N] [--number N] [case ...]
+
+"""
+
+from __future__ import annotations
+import argparse
+import textwrap
+import timeit
+from typing import Any, Callable, Dict, FrozenSet, List, Optional
+
+from desugar import transform
+
+# Each case defines `run()`.
+CASES: Dict[str, str] = {
+    "keyword matching": """
+        WORDS = ["alpha", "beta", "gamma", "delta"] * 50
+        def run():
+            counts = {"alpha": 0, "other": 0}
+            for word in WORDS:
+                if word == "alpha" or word == "gamma":
+                    counts["alpha"] += 1
+                else:
+                    counts["other"] += 1
+            return counts
+        """,
+    "formatting": """
+        def run():
+            lines = []
+            for i in range(200):
+                lines.append("item " + str(i) + ": " + "ok")
+            return "\\n".join(lines)
+        """,
+    "slicing": """
+        WORDS = ["prefix-" + str(i) for i in range(200)]
+        def run():
+            return [word[7:] + word[:3] for word in WORDS]
+        """,
+    "mixed literals": """
+        def run():
+            values = []
+            for i in range(200):
+                values.append((None, True, b"xy", 2j, "text"))
+            return values
+        """,
+}
+
+
+def compile_case(source: str, rules: Optional[FrozenSet[str]]) -> Callable[[], Any]:
+    source = textwrap.dedent(source)
+    if rules is not None:
+        source = transform.transform(source, rules)
+    namespace: Dict[str, Any] = {"__name__": "case"}
+    exec(compile(source, "<case>", "exec"), namespace)
+    return namespace["run"]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.partition("\n")[0])
+    parser.add_argument("cases", nargs="*", choices=[[], *CASES], default=[])
+    parser.add_argument("--repeat", type=int, default=15)
+    parser.add_argument("--number", type=int, default=20)
+    args = parser.parse_args(argv)
+    if args.repeat < 1 or args.number < 1:
+        parser.error("--repeat and --number must be positive")
+
+    variants: Dict[str, Optional[FrozenSet[str]]] = {
+        "native": None,
+        "default": transform.DEFAULT_RULES,
+        "default+hoist_literals": transform.DEFAULT_RULES | {"hoist_literals"},
+    }
+    for name in args.cases or CASES:
+        runs = {
+            variant: compile_case(CASES[name], rules)
+            for variant, rules in variants.items()
+        }
+        results = [run() for run in runs.values()]
+        assert all(result == results[0] for result in results), results
+        timings: Dict[str, float] = {}
+        for _ in range(args.repeat):
+            for variant, run in runs.items():
+                seconds = timeit.timeit(run, number=args.number) / args.number
+                timings[variant] = min(timings.get(variant, seconds), seconds)
+        print(name)
+        for variant, seconds in timings.items():
+            print(f"  {variant:<24} {seconds * 1e6:>10.1f}µs")
+        speedup = timings["default"] / timings["default+hoist_literals"]
+        print(f"  speedup with hoist_literals: {speedup:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Benchmark `desugar.loop` against asyncio.
+
+Two tasks switching back and forth with `sleep(0)` measure the cost of a task
+switch, and a client echoing `--size` bytes off a server task over a
+non-blocking socket pair measures the cost of a round trip through the
+selector. Both are run on `desugar.loop` and on asyncio's default event loop,
+with equivalent coroutines written against each one's API. Runs alternate,
+and the fastest is reported.
+
+    python -m benchmarks.loop [--switches N] [--round-trips N] [--size N]
+        [--repeat N]
+
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import socket
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from desugar import loop as deloop
+
+
+async def switch_desugar(switches: int) -> int:
+    async def switcher() -> None:
+        for _ in range(switches):
+            await deloop.sleep(0)
+
+    tasks = [await deloop.spawn(switcher()) for _ in range(2)]
+    for task in tasks:
+        await deloop.join(task)
+    return 2 * switches
+
+
+async def switch_asyncio(switches: int) -> int:
+    async def switcher() -> None:
+        for _ in range(switches):
+            await asyncio.sleep(0)
+
+    await asyncio.gather(switcher(), switcher())
+    return 2 * switches
+
+
+def socket_pair() -> Tuple[socket.socket, socket.socket]:
+    client, server = socket.socketpair()
+    client.setblocking(False)
+    server.setblocking(False)
+    return client, server
+
+
+async def echo_desugar(round_trips: int, size: int) -> int:
+    client, server = socket_pair()
+
+    async def serve() -> None:
+        while data := await deloop.sock_recv(server, 65536):
+            await deloop.sock_sendall(server, data)
+
+    with client, server:
+        task = await deloop.spawn(serve())
+        message = bytes(size)
+        for _ in range(round_trips):
+            await deloop.sock_sendall(client, message)
+            received = 0
+            while received < size:
+                received += len(await deloop.sock_recv(client, 65536))
+        client.shutdown(socket.SHUT_WR)
+        await deloop.join(task)
+    return round_trips
+
+
+async def echo_asyncio(round_trips: int, size: int) -> int:
+    loop = asyncio.get_running_loop()
+    client, server = socket_pair()
+
+    async def serve() -> None:
+        while data := await loop.sock_recv(server, 65536):
+            await loop.sock_sendall(server, data)
+
+    with client, server:
+        task = asyncio.create_task(serve())
+        message = bytes(size)
+        for _ in range(round_trips):
+            await loop.sock_sendall(client, message)
+            received = 0
+            while received < size:
+                received += len(await loop.sock_recv(client, 65536))
+        client.shutdown(socket.SHUT_WR)
+        await task
+    return round_trips
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.partition("\n")[0])
+    parser.add_argument("--switches", type=int, default=50_000)
+    parser.add_argument("--round-trips", type=int, default=10_000)
+    parser.add_argument("--size", type=int, default=64, help="bytes per message")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+    if min(args.switches, args.round_trips, args.size, args.repeat) < 1:
+        parser.error("--switches, --round-trips, --size and --repeat must be positive")
+
+    cases: Dict[str, Dict[str, Callable[[], Any]]] = {
+        "task switch": {
+            "desugar.loop": lambda: deloop.run(switch_desugar(args.switches)),
+            "asyncio": lambda: asyncio.run(switch_asyncio(args.switches)),
+        },
+        f"{args.size}-byte echo": {
+            "desugar.loop": lambda: deloop.run(
+                echo_desugar(args.round_trips, args.size)
+            ),
+            "asyncio": lambda: asyncio.run(echo_asyncio(args.round_trips, args.size)),
+        },
+    }
+    for name, runs in cases.items():
+        timings: Dict[str, float] = {}
+        for _ in range(args.repeat):
+            for variant, run in runs.items():
+                start = time.perf_counter()
+                count = run()
+                seconds = (time.perf_counter() - start) / count
+                timings[variant] = min(timings.get(variant, seconds), seconds)
+        speedup = timings["asyncio"] / timings["desugar.loop"]
+        print(
+            f"{name:<14}",
+            *(
+                f"{variant} {seconds * 1e6:>6.2f}µs"
+                for variant, seconds in timings.items()
+            ),
+            f"({speedup:.2f}x)",
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Benchmark desugared `match` statements against testing each case in turn.
+
+Each case is a function with a `match` statement of many cases, and an
+equivalent chain of `if`/`elif` statements testing the cases one after the
+other (how `match` would be unravelled naively). Both are desugared with the
+default rules, less "if" and "elif" so the chain is left as plain `if`
+statements like the desugared `match`; the `match` is also timed without
+desugaring for reference. Runs of each variant alternate so drift does not
+favour any of them, and the fastest run is reported.
+
+    python -m benchmarks.match [--repeat N] [--number N] [case ...]
+
+"""
+from __future__ import annotations
+
+import argparse
+import textwrap
+import timeit
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+from desugar import transform
+
+COUNT = 50
+
+RULES = transform.DEFAULT_RULES - {"if", "elif"}
+
+
+def _cases(pattern: str, condition: str) -> Tuple[str, str]:
+    """Return the `case` clauses and the `if`/`elif` chain for `COUNT` cases."""
+    cases = "".join(
+        f"            case {pattern.format(i=i)}:\n" f"                total += {i}\n"
+        for i in range(COUNT)
+    )
+    chain = "".join(
+        f"        {'if' if i == 0 else 'elif'} {condition.format(i=i)}:\n"
+        f"            total += {i}\n"
+        for i in range(COUNT)
+    )
+    return cases, chain
+
+
+def _literals() -> Tuple[str, str]:
+    cases, chain = _cases("{i}", "subject == {i}")
+    prologue = f"SUBJECTS = list(range({COUNT} + 10)) * 4\n"
+    match = f"""{prologue}
+def run():
+    total = 0
+    for subject in SUBJECTS:
+        match subject:
+{cases}            case _:
+                total -= 1
+    return total
+"""
+    chain = f"""{prologue}
+def run():
+    total = 0
+    for subject in SUBJECTS:
+{chain}        else:
+            total -= 1
+    return total
+"""
+    return match, chain
+
+
+def _classes() -> Tuple[str, str]:
+    cases, chain = _cases(
+        "Point({i}, y)", "isinstance(subject, Point) and subject.x == {i}"
+    )
+    chain = chain.replace("total += ", "y = subject.y\n            total += ")
+    prologue = f"""
+class Point:
+    __match_args__ = ("x", "y")
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+SUBJECTS = [Point(i, i) for i in range({COUNT} + 10)] * 4
+"""
+    match = f"""{prologue}
+def run():
+    total = 0
+    for subject in SUBJECTS:
+        match subject:
+{cases.replace("total += ", "total += y + ")}            case _:
+                total -= 1
+    return total
+"""
+    chain = f"""{prologue}
+def run():
+    total = 0
+    for subject in SUBJECTS:
+{chain.replace("total += ", "total += y + ")}        else:
+            total -= 1
+    return total
+"""
+    return match, chain
+
+
+# Each case is a `match` statement and the equivalent `if` chain defining `run()`.
+CASES: Dict[str, Callable[[], Tuple[str, str]]] = {
+    f"{COUNT} literal cases": _literals,
+    f"{COUNT} class patterns": _classes,
+}
+
+
+def compile_case(source: str, rules: Optional[FrozenSet[str]]) -> Callable[[], Any]:
+    source = textwrap.dedent(source)
+    if rules is not None:
+        source = transform.transform(source, rules)
+    namespace: Dict[str, Any] = {"__name__": "case"}
+    exec(compile(source, "<case>", "exec"), namespace)
+    return namespace["run"]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.partition("\n")[0])
+    parser.add_argument("cases", nargs="*", choices=[[], *CASES], default=[])
+    parser.add_argument("--repeat", type=int, default=15)
+    parser.add_argument("--number", type=int, default=20)
+    args = parser.parse_args(argv)
+    if args.repeat < 1 or args.number < 1:
+        parser.error("--repeat and --number must be positive")
+
+    for name in args.cases or CASES:
+        match, chain = CASES[name]()
+        runs = {
+            "native": compile_case(match, None),
+            "desugared match": compile_case(match, RULES),
+            "desugared chain": compile_case(chain, RULES),
+        }
+        results = [run() for run in runs.values()]
+        assert all(result == results[0] for result in results), results
+        timings: Dict[str, float] = {}
+        for _ in range(args.repeat):
+            for variant, run in runs.items():
+                seconds = timeit.timeit(run, number=args.number) / args.number
+                timings[variant] = min(timings.get(variant, seconds), seconds)
+        print(name)
+        for variant, seconds in timings.items():
+            print(f"  {variant:<20} {seconds * 1e6:>10.1f}µs")
+        speedup = timings["desugared chain"] / timings["desugared match"]
+        print(f"  speedup over the chain: {speedup:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Benchmark membership testing of a container without `__contains__`.
+
+`desugar.operator.__contains__()` falls back on iterating over such a
+container, scanning it for every lookup. With `index_membership()` the first
+lookup builds a hash index instead, which every later lookup probes. Lookups
+of items spread over the container (and some missing ones) are timed both
+ways; as the scan is slow, only `--scan-lookups` of them are timed and the
+total is extrapolated. The time with the index includes building it.
+
+    python -m benchmarks.membership [--size N] [--lookups N] [--scan-lookups N]
+
+"""
+from __future__ import annotations
+import argparse
+import time
+from typing import Any, Iterator, List, Optional
+
+from desugar import operator
+
+
+class Items:
+
+    """An iterable which can only be searched by iterating over it."""
+
+    def __init__(self, size: int) -> None:
+        self._items = list(range(size))
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._items)
+
+
+def lookups(size: int, count: int) -> List[int]:
+    """Create items to look up, a tenth of which are missing."""
+    step = max(1, size // count)
+    return [
+        size + index if index % 10 == 9 else (index * step) % size
+        for index in range(count)
+    ]
+
+
+def time_lookups(container: Any, items: List[int]) -> float:
+    start = time.perf_counter()
+    for item in items:
+        operator.__contains__(container, item)
+    return time.perf_counter() - start
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.partition("\n")[0])
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=10_000)
+    parser.add_argument("--scan-lookups", type=int, default=100)
+    args = parser.parse_args(argv)
+    if min(args.size, args.lookups, args.scan_lookups) < 1:
+        parser.error("--size, --lookups and --scan-lookups must be positive")
+
+    items = lookups(args.size, args.lookups)
+    scanned = Items(args.size)
+    sample = items[:: max(1, len(items) // args.scan_lookups)]
+    scan = time_lookups(scanned, sample) * len(items) / len(sample)
+    indexed = Items(args.size)
+    operator.index_membership(indexed)
+    index = time_lookups(indexed, items)
+    print(f"{len(items):,} lookups in {args.size:,} items")
+    print(f"  scan   {scan:>10.3f}s (extrapolated from {len(sample):,} lookups)")
+    print(f"  index  {index:>10.3f}s (including building it)")
+    print(f"  speedup {scan / index:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Benchmark reading ahead of an async iterator with `aprefetch()`.
+
+The source stands in for a network stream: every `__anext__()` claims its item
+and then sleeps for `--latency` milliseconds, while the consumer sleeps for
+`--work` milliseconds per item. It is consumed directly, through
+`desugar.builtins.aprefetch()` reading one call at a time (the default), and
+through `aprefetch()` with `concurrent=True`, for each `--depth`. Runs of each
+variant alternate, and the fastest is reported.
+
+    python -m benchmarks.prefetch [--items N] [--latency MS] [--work MS]
+        [--depth N ...] [--repeat N]
+
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from desugar import builtins as debuiltins
+
+
+class Source:
+
+    """An async iterator of `items` integers, each taking `latency` seconds."""
+
+    def __init__(self, items: int, latency: float) -> None:
+        self._next = 0
+        self._items = items
+        self._latency = latency
+
+    def __aiter__(self) -> Source:
+        return self
+
+    async def __anext__(self) -> int:
+        item = self._next
+        if item >= self._items:
+            raise StopAsyncIteration
+        self._next += 1
+        await asyncio.sleep(self._latency)
+        return item
+
+
+async def consume(iterable: AsyncIterator[int], work: float) -> List[int]:
+    items = []
+    async for item in iterable:
+        await asyncio.sleep(work)
+        items.append(item)
+    return items
+
+
+def prefetch(depth: int, *, concurrent: bool) -> Callable[[Source], Any]:
+    return lambda source: debuiltins.aprefetch(source, depth, concurrent=concurrent)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.partition("\n")[0])
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=2.0)
+    parser.add_argument("--work", type=float, default=1.0)
+    parser.add_argument("--depth", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+    if min(args.items, args.repeat, *args.depth) < 1:
+        parser.error("--items, --depth and --repeat must be positive")
+    if min(args.latency, args.work) < 0:
+        parser.error("--latency and --work must not be negative")
+
+    latency, work = args.latency / 1e3, args.work / 1e3
+    variants: Dict[str, Callable[[Source], Any]] = {"direct": lambda source: source}
+    for depth in args.depth:
+        variants[f"depth {depth}"] = prefetch(depth, concurrent=False)
+        variants[f"depth {depth} concurrent"] = prefetch(depth, concurrent=True)
+
+    expected = list(range(args.items))
+    timings: Dict[str, float] = {}
+    for _ in range(args.repeat):
+        for name, wrap in variants.items():
+            start = time.perf_counter()
+            items = asyncio.run(consume(wrap(Source(args.items, latency)), work))
+            seconds = time.perf_counter() - start
+            assert items == expected, name
+            timings[name] = min(timings.get(name, seconds), seconds)
+    print(
+        f"{args.items:,} items, {args.latency}ms latency, {args.work}ms work per item"
+    )
+    for name, seconds in timings.items():
+        speedup = timings["direct"] / seconds
+        print(f"  {name:<22} {seconds:>7.3f}s ({speedup:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
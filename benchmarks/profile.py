@@ -0,0 +1,107 @@
+"""Benchmark desugaring with fast paths from a profile of observed types.
+
+Each kernel is an unannotated function. It is desugared with the default
+rules, and also instrumented, run once to record a profile of the types at
+each operator and attribute site, and re-desugared with that profile. Each is
+also timed without desugaring for reference. Runs of each variant alternate so
+drift does not favour any of them, and the fastest run is reported.
+
+    python -m benchmarks.profile [--repeat N] [--number N] [kernel ...]
+
+"""
+
+from __future__ import annotations
+import argparse
+import textwrap
+import timeit
+from typing import Any, Callable, Dict, List, Optional
+
+from desugar import profile, transform
+
+# Each kernel defines `run()`.
+KERNELS: Dict[str, str] = {
+    "float dot product": """
+        XS = [float(i) for i in range(200)]
+        YS = [float(i) / 3 for i in range(200)]
+        def dot(xs, ys):
+            total = 0.0
+            for i in range(len(xs)):
+                total += xs[i] * ys[i]
+            return total
+        def run():
+            return dot(XS, YS)
+        """,
+    "int loop": """
+        def collatz(n):
+            steps = 0
+            while n != 1:
+                if n % 2 == 0:
+                    n = n // 2
+                else:
+                    n = 3 * n + 1
+                steps += 1
+            return steps
+        def run():
+            return collatz(871)
+        """,
+    "str methods": """
+        WORDS = [str(i) for i in range(100)]
+        def shout(words):
+            parts = []
+            for word in words:
+                parts.append(word.upper() + "!")
+            return parts
+        def run():
+            return shout(WORDS)
+        """,
+    "mixed types": """
+        VALUES = [1, 2.5, "x", 3] * 25
+        def double(values):
+            return [value + value for value in values]
+        def run():
+            return double(VALUES)
+        """,
+}
+
+
+def compile_kernel(source: str) -> Callable[[], Any]:
+    namespace: Dict[str, Any] = {"__name__": "kernel"}
+    exec(compile(source, "<kernel>", "exec"), namespace)
+    return namespace["run"]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.partition("\n")[0])
+    parser.add_argument("kernels", nargs="*", choices=[[], *KERNELS], default=[])
+    parser.add_argument("--repeat", type=int, default=15)
+    parser.add_argument("--number", type=int, default=20)
+    args = parser.parse_args(argv)
+    if args.repeat < 1 or args.number < 1:
+        parser.error("--repeat and --number must be positive")
+
+    for name in args.kernels or KERNELS:
+        source = textwrap.dedent(KERNELS[name])
+        profile.recorded().clear()
+        compile_kernel(profile.instrument(source, "kernel"))()
+        sources = {
+            "native": source,
+            "default": transform.transform(source),
+            "profile-guided": profile.specialize(source, "kernel", profile.recorded()),
+        }
+        runs = {variant: compile_kernel(code) for variant, code in sources.items()}
+        results = [run() for run in runs.values()]
+        assert all(result == results[0] for result in results), results
+        timings: Dict[str, float] = {}
+        for _ in range(args.repeat):
+            for variant, run in runs.items():
+                seconds = timeit.timeit(run, number=args.number) / args.number
+                timings[variant] = min(timings.get(variant, seconds), seconds)
+        print(name)
+        for variant, seconds in timings.items():
+            print(f"  {variant:<20} {seconds * 1e6:>10.1f}µs")
+        speedup = timings["default"] / timings["profile-guided"]
+        print(f"  speedup with the profile: {speedup:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
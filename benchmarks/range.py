@@ -0,0 +1,103 @@
+"""Benchmark counting through `range()` in desugared `for` loops.
+
+Each case is a function with nested `for` loops over `range()`, desugared with
+the default rules (which call `next()` on an iterator and catch
+`StopIteration`) and with "range" added (which counts through the range in
+the `while` loop), with and without "flags". Each is also timed without
+desugaring for reference. Runs of each variant alternate so drift does not
+favour any of them, and the fastest run is reported.
+
+    python -m benchmarks.range [--repeat N] [--number N] [case ...]
+
+"""
+
+from __future__ import annotations
+import argparse
+import textwrap
+import timeit
+from typing import Any, Callable, Dict, FrozenSet, List, Optional
+
+from desugar import transform
+
+# Each case defines `run()`.
+CASES: Dict[str, str] = {
+    "empty nested loops": """
+        def run():
+            for i in range(30):
+                for j in range(30):
+                    pass
+        """,
+    "matrix product": """
+        A = [[float(i + j) for j in range(12)] for i in range(12)]
+        def run():
+            n = len(A)
+            product = [[0.0] * n for _ in range(n)]
+            for i in range(n):
+                row = A[i]
+                for j in range(n):
+                    total = 0.0
+                    for k in range(n):
+                        total += row[k] * A[k][j]
+                    product[i][j] = total
+            return product
+        """,
+    "triangle with break": """
+        def run():
+            count = 0
+            for i in range(60):
+                for j in range(i, 60, 2):
+                    if j > 50:
+                        break
+                    count += 1
+            return count
+        """,
+}
+
+
+def compile_case(source: str, rules: Optional[FrozenSet[str]]) -> Callable[[], Any]:
+    source = textwrap.dedent(source)
+    if rules is not None:
+        source = transform.transform(source, rules)
+    namespace: Dict[str, Any] = {"__name__": "case"}
+    exec(compile(source, "<case>", "exec"), namespace)
+    return namespace["run"]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.partition("\n")[0])
+    parser.add_argument("cases", nargs="*", choices=[[], *CASES], default=[])
+    parser.add_argument("--repeat", type=int, default=15)
+    parser.add_argument("--number", type=int, default=20)
+    args = parser.parse_args(argv)
+    if args.repeat < 1 or args.number < 1:
+        parser.error("--repeat and --number must be positive")
+
+    variants: Dict[str, Optional[FrozenSet[str]]] = {
+        "native": None,
+        "default": transform.DEFAULT_RULES,
+        "default+range": transform.DEFAULT_RULES | {"range"},
+        "default+flags": transform.DEFAULT_RULES | {"flags"},
+        "default+flags+range": transform.DEFAULT_RULES | {"flags", "range"},
+    }
+    for name in args.cases or CASES:
+        runs = {
+            variant: compile_case(CASES[name], rules)
+            for variant, rules in variants.items()
+        }
+        results = [run() for run in runs.values()]
+        assert all(result == results[0] for result in results), results
+        timings: Dict[str, float] = {}
+        for _ in range(args.repeat):
+            for variant, run in runs.items():
+                seconds = timeit.timeit(run, number=args.number) / args.number
+                timings[variant] = min(timings.get(variant, seconds), seconds)
+        print(name)
+        for variant, seconds in timings.items():
+            print(f"  {variant:<20} {seconds * 1e6:>10.1f}µs")
+        for base in ("default", "default+flags"):
+            speedup = timings[base] / timings[f"{base}+range"]
+            print(f"  {base} speedup with range: {speedup:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
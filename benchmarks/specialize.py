@@ -0,0 +1,130 @@
+"""Benchmark specializing operators on annotated operands.
+
+Each kernel is a function doing arithmetic on annotated `int`, `float` or
+`str` values, desugared with the default rules and with "specialize" added,
+which calls e.g. `float.__mul__()` directly behind a type check instead of
+going through `desugar.operator`. Each is also timed without desugaring for
+reference. Runs of each variant alternate so drift does not favour any of
+them, and the fastest run is reported.
+
+    python -m benchmarks.specialize [--repeat N] [--number N] [kernel ...]
+
+"""
+
+from __future__ import annotations
+import argparse
+import textwrap
+import timeit
+from typing import Any, Callable, Dict, FrozenSet, List, Optional
+
+from desugar import transform
+
+# Each kernel defines `run()`.
+KERNELS: Dict[str, str] = {
+    "float dot product": """
+        XS = [float(i) for i in range(200)]
+        YS = [float(i) / 3 for i in range(200)]
+        def dot(xs, ys):
+            total: float = 0.0
+            for i in range(len(xs)):
+                x: float = xs[i]
+                y: float = ys[i]
+                total += x * y
+            return total
+        def run():
+            return dot(XS, YS)
+        """,
+    "polynomial": """
+        COEFFICIENTS = [1.5, -2.0, 0.5, 3.0, -1.0, 2.5]
+        def horner(x: float) -> float:
+            result: float = 0.0
+            for coefficient in COEFFICIENTS:
+                c: float = coefficient
+                result = result * x + c
+            return result
+        def run():
+            return [horner(i / 10) for i in range(40)]
+        """,
+    "int loop": """
+        def collatz(n: int) -> int:
+            steps: int = 0
+            while n != 1:
+                if n % 2 == 0:
+                    n = n // 2
+                else:
+                    n = 3 * n + 1
+                steps += 1
+            return steps
+        def run():
+            return collatz(871)
+        """,
+    "str concatenation": """
+        def join(words):
+            text: str = ""
+            for word in words:
+                w: str = word
+                text = text + w + ","
+            return text
+        WORDS = [str(i) for i in range(100)]
+        def run():
+            return join(WORDS)
+        """,
+    "mandelbrot": """
+        def escape(cr: float, ci: float) -> int:
+            zr: float = 0.0
+            zi: float = 0.0
+            n: int = 0
+            while n < 50 and zr * zr + zi * zi <= 4.0:
+                zr, zi = zr * zr - zi * zi + cr, 2.0 * zr * zi + ci
+                n += 1
+            return n
+        def run():
+            return [escape(x / 10 - 2.0, 0.5) for x in range(30)]
+        """,
+}
+
+
+def compile_kernel(source: str, rules: Optional[FrozenSet[str]]) -> Callable[[], Any]:
+    source = textwrap.dedent(source)
+    if rules is not None:
+        source = transform.transform(source, rules)
+    namespace: Dict[str, Any] = {"__name__": "kernel"}
+    exec(compile(source, "<kernel>", "exec"), namespace)
+    return namespace["run"]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.partition("\n")[0])
+    parser.add_argument("kernels", nargs="*", choices=[[], *KERNELS], default=[])
+    parser.add_argument("--repeat", type=int, default=15)
+    parser.add_argument("--number", type=int, default=20)
+    args = parser.parse_args(argv)
+    if args.repeat < 1 or args.number < 1:
+        parser.error("--repeat and --number must be positive")
+
+    variants: Dict[str, Optional[FrozenSet[str]]] = {
+        "native": None,
+        "default": transform.DEFAULT_RULES,
+        "default+specialize": transform.DEFAULT_RULES | {"specialize"},
+    }
+    for name in args.kernels or KERNELS:
+        runs = {
+            variant: compile_kernel(KERNELS[name], rules)
+            for variant, rules in variants.items()
+        }
+        results = [run() for run in runs.values()]
+        assert all(result == results[0] for result in results), results
+        timings: Dict[str, float] = {}
+        for _ in range(args.repeat):
+            for variant, run in runs.items():
+                seconds = timeit.timeit(run, number=args.number) / args.number
+                timings[variant] = min(timings.get(variant, seconds), seconds)
+        print(name)
+        for variant, seconds in timings.items():
+            print(f"  {variant:<20} {seconds * 1e6:>10.1f}µs")
+        speedup = timings["default"] / timings["default+specialize"]
+        print(f"  speedup with specialize: {speedup:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Benchmark batch subscription with `getitem_many()` and friends.
+
+Each case gathers, scatters or deletes a batch of indices of a container,
+once with the batch function of `desugar.operator` and once with a call of
+`__getitem__()`, `__setitem__()` or `__delitem__()` per index, which looks up
+the method on the container's type every time (deleting from the last index
+to the first so the others stay valid). Runs of each variant alternate so
+drift does not favour either of them, and the fastest run is reported.
+
+    python -m benchmarks.subscription [--size N] [--indices N] [--repeat N]
+
+"""
+from __future__ import annotations
+import argparse
+import random
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from desugar import operator
+
+# Each case creates a fresh container, then is timed per index and in a batch.
+Case = Tuple[
+    Callable[[], Any], Callable[[Any, List[int]], Any], Callable[[Any, List[int]], Any]
+]
+
+
+def get_each(container: Any, indices: List[int]) -> List[Any]:
+    return [operator.__getitem__(container, index) for index in indices]
+
+
+def set_each(container: Any, indices: List[int]) -> None:
+    for index in indices:
+        operator.__setitem__(container, index, 0)
+
+
+def set_many(container: Any, indices: List[int]) -> None:
+    operator.setitem_many(container, indices, [0] * len(indices))
+
+
+def delete_each(container: Any, indices: List[int]) -> None:
+    for index in sorted(set(indices), reverse=True):
+        operator.__delitem__(container, index)
+
+
+def cases(size: int) -> Dict[str, Case]:
+    data = bytes(range(256)) * (size // 256 + 1)
+    return {
+        "gather list": (lambda: list(range(size)), get_each, operator.getitem_many),
+        "gather dict": (
+            lambda: dict.fromkeys(range(size)),
+            get_each,
+            operator.getitem_many,
+        ),
+        "gather memoryview": (
+            lambda: memoryview(data[:size]),
+            get_each,
+            operator.getitem_many,
+        ),
+        "scatter list": (lambda: list(range(size)), set_each, set_many),
+        "delete list": (lambda: list(range(size)), delete_each, operator.delitem_many),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.partition("\n")[0])
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--indices", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=15)
+    args = parser.parse_args(argv)
+    if min(args.size, args.indices, args.repeat) < 1:
+        parser.error("--size, --indices and --repeat must be positive")
+
+    indices = random.Random(0).choices(range(args.size), k=args.indices)
+    print(f"{len(indices):,} indices into {args.size:,} items")
+    for name, (create, each, many) in cases(args.size).items():
+        timings: Dict[str, float] = {}
+        results = {}
+        for _ in range(args.repeat):
+            for variant, function in (("per index", each), ("batch", many)):
+                container = create()
+                start = time.perf_counter()
+                result = function(container, indices)
+                seconds = time.perf_counter() - start
+                timings[variant] = min(timings.get(variant, seconds), seconds)
+                results[variant] = result, list(container)
+        assert results["per index"] == results["batch"]
+        speedup = timings["per index"] / timings["batch"]
+        print(
+            f"  {name:<18} per index {timings['per index'] * 1e3:>8.2f}ms"
+            f"  batch {timings['batch'] * 1e3:>8.2f}ms ({speedup:.2f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Benchmark iterating over a blocking iterator with `aiter_from_sync()`.
+
+A blocking iterator is consumed from an asyncio task through
+`desugar.builtins.aiter_from_sync()` for each `--batch`, and through a naive
+bridge which hands every call of `next()` to the event loop's default executor
+on its own. Runs alternate, and the fastest is reported as items per second.
+
+    python -m benchmarks.sync_bridge [--items N] [--batch N ...] [--repeat N]
+
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional
+
+from desugar import builtins as debuiltins
+
+_DONE = object()
+
+Bridge = Callable[[Iterable[int]], AsyncIterator[int]]
+
+
+async def naive_bridge(iterable: Iterable[Any]) -> AsyncIterator[Any]:
+    """Advance the iterator in the default executor, one item per trip."""
+    loop = asyncio.get_running_loop()
+    iterator = iter(iterable)
+    while True:
+        item = await loop.run_in_executor(None, next, iterator, _DONE)
+        if item is _DONE:
+            break
+        yield item
+
+
+async def consume(bridge: Bridge, items: int) -> int:
+    count = 0
+    async for _ in bridge(range(items)):
+        count += 1
+    return count
+
+
+def with_batch(batch: int) -> Bridge:
+    return lambda iterable: debuiltins.aiter_from_sync(iterable, batch=batch)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.partition("\n")[0])
+    parser.add_argument("--items", type=int, default=20_000)
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 16, 256])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+    if min(args.items, args.repeat, *args.batch) < 1:
+        parser.error("--items, --batch and --repeat must be positive")
+
+    variants: Dict[str, Bridge] = {"naive": naive_bridge}
+    for batch in args.batch:
+        variants[f"batch {batch}"] = with_batch(batch)
+    timings: Dict[str, float] = {}
+    for _ in range(args.repeat):
+        for name, bridge in variants.items():
+            start = time.perf_counter()
+            count = asyncio.run(consume(bridge, args.items))
+            seconds = time.perf_counter() - start
+            assert count == args.items, name
+            timings[name] = min(timings.get(name, seconds), seconds)
+    print(f"{args.items:,} items")
+    for name, seconds in timings.items():
+        speedup = timings["naive"] / seconds
+        print(f"  {name:<10} {args.items / seconds:>12,.0f}/s ({speedup:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
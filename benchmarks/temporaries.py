@@ -0,0 +1,134 @@
+"""Benchmark eliminating temporaries from desugared code.
+
+A corpus of source files (the `asyncio` package by default) is desugared with
+and without the "temporaries" rule, and the number of temporaries assigned and
+the size of the compiled bytecode are compared. Then each case below is
+desugared both ways and timed, reporting the fastest of the repeats (as
+`timeit` suggests, since slower runs are slowed by other processes).
+
+    python -m benchmarks.temporaries [--repeat N] [--number N] [PATH ...]
+
+"""
+
+from __future__ import annotations
+import argparse
+import ast
+import asyncio
+import marshal
+import pathlib
+import textwrap
+import timeit
+from typing import Any, Dict, FrozenSet, Iterator, List, Optional, Tuple
+
+from desugar import transform
+
+WITHOUT = transform.DEFAULT_RULES
+WITH = transform.DEFAULT_RULES | {"temporaries"}
+
+# Each case defines `run()`. The first two use temporaries which can be
+# eliminated, the rest are controls which should be unaffected.
+CASES: Dict[str, str] = {
+    "import in function": """
+        def run():
+            from os import path
+            return path
+        """,
+    "coroutine factory": """
+        def run():
+            async def coroutine():
+                return 1
+            return coroutine
+        """,
+    "for loop": """
+        def run():
+            total = 0
+            for value in range(10):
+                total += value
+            return total
+        """,
+    "with": """
+        import contextlib
+        def run():
+            with contextlib.nullcontext(1) as value:
+                return value
+        """,
+}
+
+
+def python_files(paths: List[pathlib.Path]) -> Iterator[pathlib.Path]:
+    for path in paths:
+        if path.is_dir():
+            yield from sorted(path.rglob("*.py"))
+        else:
+            yield path
+
+
+def measure(source: bytes, rules: FrozenSet[str]) -> Tuple[int, int]:
+    """Count the temporaries assigned in the desugared code and the size of its
+    bytecode."""
+    module = transform.transform_ast(source, rules)
+    assigned = sum(
+        isinstance(node, ast.Name)
+        and isinstance(node.ctx, ast.Store)
+        and node.id.startswith("_")
+        and node.id.rpartition("_")[2].isdigit()
+        for node in ast.walk(module)
+    )
+    return assigned, len(marshal.dumps(compile(module, "<corpus>", "exec")))
+
+
+def time_case(source: str, repeat: int, number: int) -> Tuple[float, float]:
+    """Return the time of a call of the case's `run()`, desugared without and
+    with the rule."""
+    runs = []
+    for rules in (WITHOUT, WITH):
+        namespace: Dict[str, Any] = {"__name__": "case"}
+        desugared = transform.transform(textwrap.dedent(source), rules)
+        exec(compile(desugared, "<case>", "exec"), namespace)
+        runs.append(namespace["run"])
+    # Alternating between the two keeps drift (e.g. in clock speed) from
+    # favouring either.
+    timings: Tuple[List[float], List[float]] = ([], [])
+    for _ in range(repeat):
+        for run, times in zip(runs, timings):
+            times.append(timeit.timeit(run, number=number) / number)
+    return min(timings[0]), min(timings[1])
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.partition("\n")[0])
+    parser.add_argument("paths", nargs="*", type=pathlib.Path)
+    parser.add_argument("--repeat", type=int, default=15)
+    parser.add_argument("--number", type=int, default=100_000)
+    args = parser.parse_args(argv)
+    if args.repeat < 1 or args.number < 1:
+        parser.error("--repeat and --number must be positive")
+    paths = args.paths or [pathlib.Path(asyncio.__file__).parent]
+
+    files = 0
+    totals = {WITHOUT: [0, 0], WITH: [0, 0]}
+    for path in python_files(paths):
+        source = path.read_bytes()
+        for rules, total in totals.items():
+            assigned, size = measure(source, rules)
+            total[0] += assigned
+            total[1] += size
+        files += 1
+    (before, before_size), (after, after_size) = totals[WITHOUT], totals[WITH]
+    print(
+        f"{files:,} files: {before:,} ➠ {after:,} temporaries assigned"
+        f" ({1 - after / max(before, 1):.1%} fewer);"
+        f" {before_size:,} ➠ {after_size:,} bytes of bytecode"
+        f" ({1 - after_size / max(before_size, 1):.1%} smaller)"
+    )
+
+    for name, source in CASES.items():
+        without, with_ = time_case(source, args.repeat, args.number)
+        print(
+            f"{name:<20} {without * 1e9:>8.1f}ns ➠ {with_ * 1e9:>8.1f}ns"
+            f" ({without / with_:.2f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Benchmark resuming deeply nested coroutines with `trampoline()`.
+
+A chain of coroutines `--depth` levels deep awaits a leaf which suspends
+`--resumes` times, and the chain is driven by hand to measure the cost of each
+resumption. Every level awaits the next natively, with
+`desugar.builtins._await()` (delegating with `yield from`, as desugared code
+does), and with `desugar.builtins._await_flat()` under
+`desugar.builtins.trampoline()`, whose cost should not grow with the depth.
+Runs alternate, and the fastest is reported.
+
+    python -m benchmarks.trampoline [--depth N ...] [--resumes N] [--repeat N]
+
+"""
+from __future__ import annotations
+import argparse
+import time
+import types
+from typing import Any, Callable, Dict, List, Optional
+
+from desugar import builtins as debuiltins
+
+
+@types.coroutine
+def leaf(resumes: int) -> Any:
+    for _ in range(resumes):
+        yield
+    return resumes
+
+
+async def native(depth: int, resumes: int) -> int:
+    if depth:
+        return await native(depth - 1, resumes)
+    return await leaf(resumes)
+
+
+@types.coroutine
+def delegated(depth: int, resumes: int) -> Any:
+    awaitable = delegated(depth - 1, resumes) if depth else leaf(resumes)
+    return (yield from debuiltins._await(awaitable))
+
+
+@types.coroutine
+def flat(depth: int, resumes: int) -> Any:
+    awaitable = flat(depth - 1, resumes) if depth else leaf(resumes)
+    return (yield from debuiltins._await_flat(awaitable))
+
+
+VARIANTS: Dict[str, Callable[[int, int], Any]] = {
+    "native": native,
+    "_await": delegated,
+    "trampoline": lambda depth, resumes: debuiltins.trampoline(flat(depth, resumes)),
+}
+
+
+def drive(coroutine: Any) -> Any:
+    """Resume the coroutine until it returns, as an event loop would."""
+    try:
+        while True:
+            coroutine.send(None)
+    except StopIteration as exc:
+        return exc.value
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.partition("\n")[0])
+    parser.add_argument("--depth", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--resumes", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=15)
+    args = parser.parse_args(argv)
+    if min(args.resumes, args.repeat, *args.depth) < 1:
+        parser.error("--depth, --resumes and --repeat must be positive")
+
+    print(f"{args.resumes:,} resumptions, per resumption")
+    for depth in args.depth:
+        timings: Dict[str, float] = {}
+        for _ in range(args.repeat):
+            for name, create in VARIANTS.items():
+                coroutine = create(depth, args.resumes)
+                start = time.perf_counter()
+                result = drive(coroutine)
+                seconds = (time.perf_counter() - start) / args.resumes
+                assert result == args.resumes, name
+                timings[name] = min(timings.get(name, seconds), seconds)
+        print(
+            f"  depth {depth:<4}",
+            *(f"{name} {seconds * 1e9:>7.0f}ns" for name, seconds in timings.items()),
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""Desugar a source tree in parallel.
+
+    python -m desugar [--jobs N] [--rules RULE,...] [--cache DIR] SOURCE OUTPUT
+
+Every `.py` file under SOURCE is desugared into the same relative path under
+OUTPUT. Files are handed to a pool of worker processes largest first, so the
+files which take the longest start early instead of finishing last. Each
+worker reads, desugars and writes its file itself, streaming the output into a
+temporary file which is then atomically renamed into place; only the timing of
+each file is sent back to be reported.
+
+With `--cache`, output is looked up in (and added to) a `desugar.cache.Cache`
+so unchanged files are copied instead of desugared again.
+
+"""
+
+from __future__ import annotations
+
+import argparse
+import concurrent.futures
+import os
+import pathlib
+import shutil
+import sys
+import time
+from typing import FrozenSet, List, NamedTuple, Optional, Tuple
+
+from . import cache, transform
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None  # type: ignore
+
+
+class Result(NamedTuple):
+
+    """The outcome of desugaring a file."""
+
+    path: str
+    seconds: float
+    # The peak resident set size of the worker process so far, in KiB.
+    peak_rss: Optional[int]
+    error: Optional[str]
+    # Whether the output came from the cache, and the entry to record for it.
+    cached: Optional[bool] = None
+    entry: Optional[cache.Entry] = None
+
+
+def _peak_rss() -> Optional[int]:
+    """Return the peak RSS of the current process in KiB (if known)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes instead of KiB.
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def desugar_file(
+    source: pathlib.Path,
+    output: pathlib.Path,
+    rules: FrozenSet[str],
+    cache_directory: Optional[str] = None,
+    cache_size: int = cache.DEFAULT_MAX_SIZE,
+) -> Result:
+    """Desugar a single file, via the cache in `cache_directory` if specified."""
+    start = time.perf_counter()
+    error = cached = entry = None
+    try:
+        with cache.atomic_path(output) as temp_path:
+            if cache_directory is None:
+                # Passing bytes lets the parser handle any encoding declaration.
+                chunks = transform.iter_transform(source.read_bytes(), rules)
+                with open(temp_path, "w", encoding="utf-8") as file:
+                    file.writelines(chunks)
+            else:
+                shared = cache.cached(cache_directory, cache_size)
+                cached_path, entry, cached = shared.lookup(source, rules)
+                shutil.copyfile(cached_path, temp_path)
+    except Exception as exc:
+        # One bad file (e.g. a syntax error) should not stop the others.
+        error = f"{type(exc).__name__}: {exc}"
+    seconds = time.perf_counter() - start
+    return Result(str(source), seconds, _peak_rss(), error, cached, entry)
+
+
+def find_files(root: pathlib.Path) -> List[Tuple[int, pathlib.Path]]:
+    """Find the `.py` files under `root`, largest first, along with their size."""
+    if root.is_file():
+        paths = [root]
+    else:
+        paths = [path for path in root.rglob("*.py") if path.is_file()]
+    files = [(path.stat().st_size, path) for path in paths]
+    files.sort(key=lambda file: file[0], reverse=True)
+    return files
+
+
+def default_jobs() -> int:
+    """Count the CPUs this process may run on."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # pragma: no cover
+        return os.cpu_count() or 1
+
+
+def _rules(value: str) -> FrozenSet[str]:
+    try:
+        return transform._check_rules(filter(None, value.split(",")))
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError(str(exc))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m desugar", description=__doc__.partition("\n")[0]
+    )
+    parser.add_argument("source", type=pathlib.Path)
+    parser.add_argument("output", type=pathlib.Path)
+    parser.add_argument(
+        "--jobs", type=int, default=default_jobs(), help="number of worker processes"
+    )
+    parser.add_argument(
+        "--rules",
+        type=_rules,
+        default=transform.DEFAULT_RULES,
+        help="comma-separated rules to apply (default: all but the optional ones)",
+    )
+    parser.add_argument("--cache", metavar="DIR", help="directory to cache output in")
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=cache.DEFAULT_MAX_SIZE,
+        help="bytes of output to keep in the cache (default: 1 GiB)",
+    )
+    parser.add_argument(
+        "--cache-stats", action="store_true", help="report how the cache was used"
+    )
+    parser.add_argument(
+        "--quiet", action="store_true", help="only report errors and the summary"
+    )
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if not args.source.exists():
+        parser.error(f"{args.source} does not exist")
+    if args.cache_stats and args.cache is None:
+        parser.error("--cache-stats requires --cache")
+
+    files = find_files(args.source)
+    root = args.source.parent if args.source.is_file() else args.source
+    start = time.perf_counter()
+    failures = 0
+    peak_rss = 0
+    shared_cache = None
+    if args.cache is not None:
+        # Workers only read the index; it is updated here once they are done.
+        shared_cache = cache.Cache(args.cache, args.cache_size)
+    with concurrent.futures.ProcessPoolExecutor(args.jobs) as executor:
+        # The pool starts work in submission order, hence largest first.
+        futures = [
+            executor.submit(
+                desugar_file,
+                path,
+                args.output / path.relative_to(root),
+                args.rules,
+                args.cache,
+                args.cache_size,
+            )
+            for _, path in files
+        ]
+        for future in concurrent.futures.as_completed(futures):
+            result = future.result()
+            peak_rss = max(peak_rss, result.peak_rss or 0)
+            if shared_cache is not None and result.entry is not None:
+                shared_cache.record(result.entry, bool(result.cached))
+            if result.error is not None:
+                failures += 1
+                print(f"{result.path}: {result.error}", file=sys.stderr)
+            elif not args.quiet:
+                rss = "?" if result.peak_rss is None else f"{result.peak_rss:,}KiB"
+                print(f"{result.seconds:9.3f}s {rss:>12} {result.path}")
+    if shared_cache is not None:
+        with shared_cache:
+            shared_cache.save()
+        if args.cache_stats:
+            print(f"cache: {shared_cache.stats}", file=sys.stderr)
+    elapsed = time.perf_counter() - start
+    total_size = sum(size for size, _ in files)
+    print(
+        f"{len(files) - failures}/{len(files)} files ({total_size:,} bytes)"
+        f" in {elapsed:.2f}s with {args.jobs} job(s);"
+        f" peak worker RSS {peak_rss:,}KiB",
+        file=sys.stderr,
+    )
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,16 +6,24 @@
 # https://docs.python.org/3.8/library/builtins.html
 from __future__ import annotations
 import builtins
-
+import collections
+import collections.abc
+import functools
 import inspect
+import sys
+import threading
+import types
 import typing
+import weakref
 from typing import (
     Any,
     AsyncIterable,
     AsyncIterator,
     Callable,
+    Generator,
     Iterable,
     Iterator,
+    List,
     Literal,
     Sequence,
     Tuple,
@@ -23,6 +31,12 @@ from typing import (
     Union,
 )
 
+if typing.TYPE_CHECKING:
+    # Imported when needed at runtime, as importing asyncio is slow and would
+    # otherwise be paid for by every desugared module.
+    import asyncio
+    import concurrent.futures
+
 T = typing.TypeVar("T")
 
 # TODO:
@@ -81,6 +95,153 @@ def getattr(obj: object, attr: str, default: Any = _NOTHING, /) -> Any:
         raise attr_exc
 
 
+def _import_from(module: types.ModuleType, name: str, /) -> Any:
+    """Simulate fetching `name` for `from module import name`.
+
+    If the module lacks the attribute, fall back to a submodule of that name in
+    `sys.modules` (which handles circular imports) before raising ImportError.
+    """
+    # Python/ceval.c:import_from
+    try:
+        return getattr(module, name)
+    except AttributeError:
+        pass
+    try:
+        module_name = getattr(module, "__name__")
+    except AttributeError:
+        module_name = "<unknown module name>"
+    else:
+        try:
+            return sys.modules[f"{module_name}.{name}"]
+        except KeyError:
+            pass
+    raise ImportError(f"cannot import name {name!r} from {module_name!r}")
+
+
+def _chain_pending(exception: BaseException, pending: BaseException, /) -> None:
+    """Simulate chaining an exception raised by a `finally` block to the
+    exception which was pending when the block was entered.
+
+    When `finally` is desugared to run its block outside of an exception
+    handler, the exceptions raised there are chained to whatever was being
+    handled when the pending exception was raised. The first of those in the
+    chain of `exception` is chained to the pending exception instead.
+    """
+    # Python/errors.c:_PyErr_SetObject
+    context = pending.__context__
+    seen = builtins.set()
+    link = exception
+    while link is not pending and builtins.id(link) not in seen:
+        seen.add(builtins.id(link))
+        if link.__context__ is context:
+            link.__context__ = pending
+            break
+        elif link.__context__ is None:
+            break
+        link = link.__context__
+
+
+# Include/object.h
+_TPFLAGS_SEQUENCE = 1 << 5
+_TPFLAGS_MAPPING = 1 << 6
+_TPFLAGS_MATCH_SELF = 1 << 22
+
+
+def _match_sequence(obj: object, /) -> bool:
+    """Check if a sequence pattern may match an object."""
+    # Python/ceval.c:MATCH_SEQUENCE
+    return builtins.bool(builtins.type(obj).__flags__ & _TPFLAGS_SEQUENCE)
+
+
+def _match_mapping(obj: object, /) -> bool:
+    """Check if a mapping pattern may match an object."""
+    # Python/ceval.c:MATCH_MAPPING
+    return builtins.bool(builtins.type(obj).__flags__ & _TPFLAGS_MAPPING)
+
+
+def _match_class(cls: Any, obj: object, /) -> bool:
+    """Check if a class pattern's class may match an object."""
+    # Python/ceval.c:match_class
+    if not isinstance(cls, builtins.type):
+        raise TypeError("called match pattern must be a type")
+    return isinstance(obj, cls)
+
+
+def _match_args(
+    cls: Type, count: int, keywords: Tuple[str, ...], /
+) -> Union[Tuple[str, ...], None]:
+    """Find the attributes matched by the positional sub-patterns of a class
+    pattern, or return None if its single positional sub-pattern matches the
+    object itself (e.g. `int(x)`).
+
+    The keyword sub-patterns' attributes are checked for duplicates too.
+    """
+    # Python/ceval.c:match_class
+    try:
+        match_args = builtins.getattr(cls, "__match_args__")
+    except AttributeError:
+        match_args = ()
+        match_self = builtins.bool(cls.__flags__ & _TPFLAGS_MATCH_SELF)
+    else:
+        if builtins.type(match_args) is not builtins.tuple:
+            raise TypeError(
+                f"{cls.__name__}.__match_args__ must be a tuple "
+                f"(got {builtins.type(match_args).__name__})"
+            )
+        match_self = False
+    allowed = 1 if match_self else builtins.len(match_args)
+    if allowed < count:
+        plural = "" if allowed == 1 else "s"
+        raise TypeError(
+            f"{cls.__name__}() accepts {allowed} positional sub-pattern{plural} "
+            f"({count} given)"
+        )
+    if match_self and count:
+        return None
+    names = match_args[:count]
+    seen = builtins.set()
+    for name in (*names, *keywords):
+        if builtins.type(name) is not builtins.str:
+            raise TypeError(
+                "__match_args__ elements must be strings "
+                f"(got {builtins.type(name).__name__})"
+            )
+        elif name in seen:
+            raise TypeError(
+                f"{cls.__name__}() got multiple sub-patterns for attribute {name!r}"
+            )
+        seen.add(name)
+    return names
+
+
+def _match_keys(obj: Any, keys: Tuple[Any, ...], /) -> Union[Tuple[Any, ...], None]:
+    """Look up the keys of a mapping pattern, returning None if one is
+    missing."""
+    # Python/ceval.c:match_keys
+    get = builtins.getattr(obj, "get")
+    missing = builtins.object()
+    seen = builtins.set()
+    values = []
+    for key in keys:
+        if key in seen:
+            raise ValueError(f"mapping pattern checks duplicate key ({key!r})")
+        seen.add(key)
+        value = get(key, missing)
+        if value is missing:
+            return None
+        values.append(value)
+    return builtins.tuple(values)
+
+
+def _match_rest(obj: Any, keys: Tuple[Any, ...], /) -> builtins.dict:
+    """Copy a mapping without the keys of a mapping pattern, for `**rest`."""
+    # Python/ceval.c:COPY_DICT_WITHOUT_KEYS
+    rest = builtins.dict(obj)
+    for key in keys:
+        del rest[key]
+    return rest
+
+
 def _index(obj: object, /) -> int:
     """Losslessly convert an object to an integer object.
 
@@ -241,7 +402,7 @@ def iter(
                     f"{obj_type.__name__!r}.__iter__() returned a non-iterator of type {builtins.type(__iter__)!r}"
                 )
             else:
-                return __iter__(obj)
+                return iterator
     else:
         # Python/object.c:PyCallable_Check
         try:
@@ -274,6 +435,36 @@ def next(iterator: Iterator[Any], /, default: Any = _NOTHING) -> Any:
                 return default
 
 
+# Async iterator types whose `__anext__` passed validation in aiter(), keyed by
+# id(). Both the type and `__anext__` are weakly referenced as methods can refer
+# to their class.
+_validated_anext: dict[int, tuple[weakref.ref, weakref.ref]] = {}
+_dead_ref = weakref.ref(builtins.type("_Dead", (), {})())  # Always returns None.
+
+
+def _validate_anext(iterator_type: type, __anext__: Any, /) -> None:
+    """Record that the `__anext__` of an async iterator type is a coroutine."""
+    key = id(iterator_type)
+
+    def forget(_: weakref.ref, /) -> None:
+        _validated_anext.pop(key, None)
+
+    try:
+        anext_ref = weakref.ref(__anext__)
+    except TypeError:
+        return  # Not weakly referenceable, so validate every time.
+    _validated_anext[key] = weakref.ref(iterator_type, forget), anext_ref
+
+
+def _is_iterable_coroutine_function(func: Any, /) -> bool:
+    """Check if `func` is a generator function decorated by `types.coroutine()`
+    or a desugared `async def` (see `_coroutine()`)."""
+    code = builtins.getattr(func, "__code__", None)
+    return code is not None and (
+        code is _COROUTINE_CODE or bool(code.co_flags & inspect.CO_ITERABLE_COROUTINE)
+    )
+
+
 # TODO: technically the return type is wrong as only `__anext__` is required;
 # `__aiter__` is optional.
 def aiter(iterable: AsyncIterable[T], /) -> AsyncIterator[T]:
@@ -294,11 +485,141 @@ def aiter(iterable: AsyncIterable[T], /) -> AsyncIterator[T]:
             __anext__ = _mro_getattr(iterator_type, "__anext__")
         except AttributeError:
             raise TypeError(f"{iterator_type.__name__!r} is not an async iterator")
-        if not inspect.iscoroutinefunction(__anext__):
-            raise TypeError(f"{iterator_type.__name__!r} is not an async iterator")
+        # Cheating as CPython doesn't use the inspect module, but introspection is
+        # slow enough that caching the result per type is worth it. The cached
+        # `__anext__` is compared to catch classes being modified after the fact.
+        try:
+            type_ref, anext_ref = _validated_anext[id(iterator_type)]
+        except KeyError:
+            type_ref = anext_ref = _dead_ref
+        if type_ref() is not iterator_type or anext_ref() is not __anext__:
+            # Async generators implement `__anext__` in C, and a desugared
+            # `async def` wraps a generator function.
+            if not (
+                inspect.iscoroutinefunction(__anext__)
+                or _is_iterable_coroutine_function(__anext__)
+                or issubclass(iterator_type, types.AsyncGeneratorType)
+            ):
+                raise TypeError(f"{iterator_type.__name__!r} is not an async iterator")
+            _validate_anext(iterator_type, __anext__)
         return iterator
 
 
+class _SyncIteratorBridge:
+
+    """An async iterator over a blocking iterator advanced in an executor."""
+
+    def __init__(
+        self,
+        iterator: Iterator[T],
+        executor: typing.Optional[concurrent.futures.Executor],
+        batch: int,
+    ) -> None:
+        self._iterator = iterator
+        self._executor = executor
+        self._batch = batch
+        self._buffer: typing.Deque[T] = collections.deque()
+        self._error: typing.Optional[BaseException] = None
+        self._exhausted = False
+        self._closed = False
+        # Held by whichever thread is using the iterator.
+        self._lock = threading.Lock()
+
+    def _take(self) -> None:
+        """Pull the next batch of items from the iterator (in a worker thread)."""
+        with self._lock:
+            if self._exhausted:
+                return
+            for _ in range(self._batch):
+                try:
+                    self._buffer.append(builtins.next(self._iterator))
+                except StopIteration:
+                    self._exhausted = True
+                    break
+                except BaseException as exc:
+                    self._error = exc
+                    self._exhausted = True
+                    break
+
+    def _close(self) -> None:
+        """Close the iterator once no thread is using it."""
+        with self._lock:
+            self._exhausted = True
+            self._buffer.clear()
+            try:
+                close = builtins.getattr(self._iterator, "close")
+            except AttributeError:
+                pass
+            else:
+                close()
+
+    @staticmethod
+    def _closed_callback(future: asyncio.Future[None]) -> None:
+        """Report an error raised by closing the iterator after cancellation."""
+        if future.cancelled() or future.exception() is None:
+            return
+        future.get_loop().call_exception_handler(
+            {
+                "message": "Error closing the iterator of aiter_from_sync()",
+                "exception": future.exception(),
+                "future": future,
+            }
+        )
+
+    def __aiter__(self) -> _SyncIteratorBridge:
+        return self
+
+    async def __anext__(self) -> T:
+        if self._closed:
+            raise StopAsyncIteration
+        elif not self._buffer and not self._exhausted:
+            import asyncio
+
+            loop = asyncio.get_running_loop()
+            try:
+                await loop.run_in_executor(self._executor, self._take)
+            except asyncio.CancelledError:
+                # The worker thread cannot be interrupted, so close the
+                # iterator after it finishes with it.
+                self._closed = True
+                closing = loop.run_in_executor(self._executor, self._close)
+                closing.add_done_callback(self._closed_callback)
+                raise
+        if self._buffer:
+            return self._buffer.popleft()
+        elif self._error is not None:
+            error, self._error = self._error, None
+            raise error
+        else:
+            raise StopAsyncIteration
+
+    async def aclose(self) -> None:
+        """Close the underlying iterator."""
+        import asyncio
+
+        self._closed = True
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._close)
+
+
+def aiter_from_sync(
+    iterable: Iterable[T],
+    /,
+    executor: typing.Optional[concurrent.futures.Executor] = None,
+    batch: int = 1,
+) -> AsyncIterator[T]:
+    """Return an async iterator over a blocking iterable.
+
+    The iterable's iterator is advanced in `executor` (the event loop's default
+    executor if None) so the event loop is not blocked. Each trip to the
+    executor pulls up to `batch` items to amortize the cost of handing work to
+    another thread. If `__anext__()` is cancelled or `aclose()` is called, the
+    iterator is closed as soon as no worker thread is using it.
+    """
+    if batch < 1:
+        raise ValueError(f"batch must be at least 1, not {batch!r}")
+    return _SyncIteratorBridge(iter(iterable), executor, batch)
+
+
 async def anext(iterator: AsyncIterator[Any], default: Any = _NOTHING, /) -> Any:
     """Return the next item from the async iterator by calling __anext__().
 
@@ -319,8 +640,98 @@ async def anext(iterator: AsyncIterator[Any], default: Any = _NOTHING, /) -> Any
             raise
 
 
-def _await(coroutine):
-    """Simulate `await coroutine`."""
+async def anext_many(
+    iterator: AsyncIterator[T], n: int, default: Any = _NOTHING, /
+) -> Union[List[T], Any]:
+    """Return a list of up to `n` items from the async iterator.
+
+    `__anext__` is looked up once for the whole batch. The list is shorter
+    than `n` if the iterator is exhausted part way through. If the iterator is
+    exhausted before any item is returned then `default` is returned if
+    provided, otherwise `StopAsyncIteration` is raised.
+    """
+    iterator_type = builtins.type(iterator)
+    try:
+        __anext__ = _mro_getattr(iterator_type, "__anext__")
+    except AttributeError:
+        raise TypeError(f"{iterator_type.__name__!r} is not an async iterator")
+    items = []
+    for _ in range(n):
+        try:
+            items.append(await __anext__(iterator))
+        except StopAsyncIteration:
+            break
+    if items or n <= 0:
+        return items
+    elif default is not _NOTHING:
+        return default
+    else:
+        raise StopAsyncIteration
+
+
+async def aprefetch(
+    iterable: AsyncIterable[T], depth: int, /, concurrent: bool = False
+) -> AsyncIterator[T]:
+    """Iterate over the async iterable while reading up to `depth` items ahead.
+
+    Calls to `__anext__` are scheduled as asyncio tasks so they can make
+    progress while the caller works on the current item. Items are still
+    produced in order. Each call only starts once the previous one has
+    finished, unless `concurrent` is true, in which case up to `depth` calls
+    are in flight at once; only pass it for an iterator which is safe to
+    advance concurrently, i.e. one whose `__anext__` claims its item before
+    awaiting anything. Async generators cannot be advanced concurrently, so
+    `concurrent` is ignored for them.
+    """
+    import asyncio
+
+    if depth < 1:
+        raise ValueError(f"depth must be at least 1, not {depth!r}")
+    iterator = aiter(iterable)
+    __anext__ = _mro_getattr(builtins.type(iterator), "__anext__")
+    if isinstance(iterator, types.AsyncGeneratorType):
+        concurrent = False
+    pending: typing.Deque[asyncio.Future] = collections.deque()
+
+    async def read_after(previous: asyncio.Future) -> T:
+        await asyncio.wait((previous,))
+        if previous.cancelled() or previous.exception() is not None:
+            # The iteration stops at `previous`, so never reaches this item.
+            raise StopAsyncIteration
+        return await __anext__(iterator)
+
+    def read_ahead() -> None:
+        while builtins.len(pending) < depth:
+            if concurrent or not pending:
+                read = __anext__(iterator)
+            else:
+                read = read_after(pending[-1])
+            pending.append(asyncio.ensure_future(read))
+
+    try:
+        read_ahead()
+        while True:
+            try:
+                item = await pending[0]
+            except StopAsyncIteration:
+                return
+            pending.popleft()
+            # Read ahead again before handing the item over.
+            read_ahead()
+            yield item
+    finally:
+        for task in pending:
+            _discard_task(task)
+
+
+def _discard_task(task: asyncio.Future, /) -> None:
+    """Cancel a task whose outcome is no longer wanted."""
+    if not task.cancel() and not task.cancelled():
+        task.exception()  # Keep asyncio from reporting an unretrieved exception.
+
+
+def _await_iterator(coroutine: Any, /) -> Any:
+    """Return the iterator that `await coroutine` delegates to."""
     if not inspect.isawaitable(coroutine):
         msg = f"object {builtins.type(coroutine)} can't be used in 'await' expression"
         raise TypeError(msg)
@@ -328,10 +739,240 @@ def _await(coroutine):
     try:
         __await__ = _mro_getattr(coroutine_type, "__await__")
     except AttributeError:
-        awaitable = coroutine
+        return coroutine
     else:
-        awaitable = __await__(coroutine)
-    yield from awaitable
+        return __await__(coroutine)
+
+
+def _await(coroutine):
+    """Simulate `await coroutine`."""
+    return (yield from _await_iterator(coroutine))
+
+
+class _Coroutine(collections.abc.Coroutine):
+
+    """The coroutine returned by calling a desugared `async def` function.
+
+    The function is desugared into a generator function, and asyncio stops
+    accepting generators as coroutines (even via `types.coroutine()`) in
+    Python 3.12, so calls return the generator wrapped in this instead.
+    Awaiting it delegates straight to the generator.
+    """
+
+    __slots__ = ("_generator",)
+
+    def __init__(self, generator: Generator[Any, Any, Any], /) -> None:
+        self._generator = generator
+
+    def __await__(self) -> Generator[Any, Any, Any]:
+        return self._generator
+
+    def send(self, value: Any, /) -> Any:
+        return self._generator.send(value)
+
+    def throw(self, *args: Any) -> Any:
+        return self._generator.throw(*args)
+
+    def close(self) -> None:
+        self._generator.close()
+
+
+def _coroutine(function: Callable[..., Any], /) -> Callable[..., _Coroutine]:
+    """Simulate `async def` for a generator function."""
+
+    @functools.wraps(function)
+    def coroutine(*args: Any, **kwargs: Any) -> _Coroutine:
+        return _Coroutine(function(*args, **kwargs))
+
+    return coroutine
+
+
+# The code of every function returned by `_coroutine()`.
+_COROUTINE_CODE = _coroutine(_await).__code__
+
+
+class _Delegate:
+
+    """A request for trampoline() to drive an awaitable."""
+
+    __slots__ = ("awaitable",)
+
+    def __init__(self, awaitable: Any, /) -> None:
+        self.awaitable = awaitable
+
+
+# The code flags of the frames which `yield from` can delegate through.
+_GENERATOR_FLAGS = (
+    inspect.CO_GENERATOR
+    | inspect.CO_COROUTINE
+    | inspect.CO_ITERABLE_COROUTINE
+    | inspect.CO_ASYNC_GENERATOR
+)
+
+
+def _trampolined(frame: typing.Optional[types.FrameType], /) -> bool:
+    """Check if trampoline() is resuming the frame (through `yield from`)."""
+    while frame is not None and frame.f_code.co_flags & _GENERATOR_FLAGS:
+        if frame.f_code is trampoline.__code__:
+            return True
+        frame = frame.f_back
+    return False
+
+
+def _await_flat(coroutine):
+    """Simulate `await coroutine` for a coroutine run by trampoline().
+
+    Rather than delegating with `yield from`, which has every resumption of
+    the innermost coroutine pass through each level of awaiting coroutines,
+    the awaitable is handed to the trampoline to drive directly. When not run
+    by trampoline() (e.g. by an event loop), it delegates like `_await()`.
+    """
+    if _trampolined(sys._getframe()):
+        return (yield _Delegate(coroutine))
+    return (yield from _await_iterator(coroutine))
+
+
+@types.coroutine
+def trampoline(coroutine):
+    """Run a coroutine, flattening the awaits made through `_await_flat()`.
+
+    The trampoline keeps the chain of awaiting coroutines on an explicit stack
+    and only ever resumes the top of it, so resuming a suspended coroutine
+    costs the same no matter how deeply it is nested. Anything else the top of
+    the stack yields is passed out to whatever is running the trampoline
+    (e.g. an event loop), just like `yield from` would.
+
+    Only awaits made through `_await_flat()` (as desugared with the
+    "flat_await" rule) are flattened; those made through `_await()` or natively
+    still delegate with `yield from` below the top of the stack.
+    """
+    stack = [_await_iterator(coroutine)]
+    value = error = None
+    while True:
+        top = stack[-1]
+        throw = builtins.getattr(top, "throw", None) if error is not None else None
+        if error is not None and throw is None:
+            # Like `yield from`, pass the exception on to the awaiting coroutine.
+            stack.pop()
+            if not stack:
+                raise error
+            continue
+        try:
+            if throw is not None:
+                exc, error = error, None
+                yielded = throw(exc)
+            elif value is None:
+                yielded = builtins.next(top)
+            else:
+                yielded = top.send(value)
+        except StopIteration as exc:
+            stack.pop()
+            if not stack:
+                return exc.value
+            value = exc.value
+            continue
+        except BaseException as exc:
+            stack.pop()
+            if not stack:
+                raise
+            error = exc
+            continue
+        if builtins.type(yielded) is _Delegate:
+            stack.append(_await_iterator(yielded.awaitable))
+            value = None
+            continue
+        try:
+            value = yield yielded
+        except GeneratorExit:
+            for awaitable in reversed(stack):
+                try:
+                    close = awaitable.close
+                except AttributeError:
+                    pass
+                else:
+                    close()
+            raise
+        except BaseException as exc:
+            error = exc
+            value = None
+
+
+@types.coroutine
+def _await_call(func: Callable[[Any], Any], arg: Any, /):
+    """Simulate `await func(arg)`."""
+    return (yield from _await(func(arg)))
+
+
+async def amap(
+    func: Callable[[Any], Any],
+    iterable: AsyncIterable[Any],
+    /,
+    concurrency: int = 1,
+    ordered: bool = True,
+) -> AsyncIterator[Any]:
+    """Yield the results of awaiting `func(item)` for each item of the iterable.
+
+    At most `concurrency` calls run at once as asyncio tasks, and the next item
+    is only requested from the iterable when a call finishes, so a fast source
+    is never drained ahead of the calls. Results are yielded in the order of
+    the items when `ordered` is true (keeping the results of calls which
+    finish ahead of an earlier one until it does), otherwise in the order the
+    calls finish. In order, a call finishing ahead of an earlier one frees its
+    slot, but no more than `2 * concurrency` results are ever outstanding, so a
+    slow call at the head still holds back reading from the iterable. The
+    exception of the first call to fail, or of the iterable, is raised, and
+    any calls still running when iteration stops are cancelled.
+    """
+    import asyncio
+
+    if concurrency < 1:
+        raise ValueError(f"concurrency must be at least 1, not {concurrency!r}")
+    iterator = aiter(iterable)
+    exhausted = False
+    window = 2 * concurrency if ordered else concurrency
+    # Calls whose results are yet to be yielded, in the order of the items.
+    pending: typing.Deque[asyncio.Future] = collections.deque()
+    # Calls which have finished but not been looked at, in the order they did.
+    finished: typing.Deque[asyncio.Future] = collections.deque()
+    # A call gives up its slot as soon as it finishes.
+    running: typing.Set[asyncio.Future] = builtins.set()
+
+    def finish(task: asyncio.Future) -> None:
+        running.discard(task)
+        finished.append(task)
+
+    try:
+        while True:
+            while (
+                not exhausted
+                and builtins.len(running) < concurrency
+                and builtins.len(pending) < window
+            ):
+                try:
+                    item = await anext(iterator)
+                except StopAsyncIteration:
+                    exhausted = True
+                else:
+                    task = asyncio.ensure_future(_await_call(func, item))
+                    task.add_done_callback(finish)
+                    running.add(task)
+                    pending.append(task)
+            if finished:
+                task = finished.popleft()
+                if not ordered:
+                    pending.remove(task)
+                    yield task.result()
+                elif task.cancelled() or task.exception() is not None:
+                    task.result()
+            elif ordered and pending and pending[0].done():
+                yield pending.popleft().result()
+            elif not running:
+                return
+            else:
+                await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in pending:
+            _discard_task(task)
 
 
 class type(typing.Type):
@@ -0,0 +1,347 @@
+"""A content-addressed on-disk cache of desugared source code.
+
+Desugared output is stored under `objects/` in a file named after a hash of
+the source code, the version of desugar and the rules applied, so identical
+inputs share a single entry no matter where they come from.
+
+To avoid even reading (let alone hashing) unchanged files, an index maps the
+path of a source file (and the rules) to the modification time and size it
+had when it was cached and to its entry. The index is a sorted array of
+fixed-size records which is memory-mapped and binary searched, so checking a
+file which has not changed costs a `stat()` call.
+
+The index also records when each entry was last used so that the cache can be
+kept below a maximum size by evicting the least recently used entries.
+
+"""
+
+from __future__ import annotations
+
+import contextlib
+import functools
+import hashlib
+import mmap
+import os
+import pathlib
+import struct
+import tempfile
+import time
+from typing import Dict, FrozenSet, Iterator, NamedTuple, Optional, Tuple
+
+import desugar
+
+from . import transform
+
+DEFAULT_MAX_SIZE = 1024 ** 3
+
+# Bump when the layout of the cache changes.
+_FORMAT = 1
+_HEADER = struct.Struct("<4sIQ")  # Magic number, format, record count.
+_MAGIC = b"DSGR"
+# Path digest, mtime (ns), size, key, output size, last used (ns).
+_RECORD = struct.Struct("<16sqq16sqq")
+_DIGEST_SIZE = 16
+
+
+def _version_tag() -> bytes:
+    """Identify the version of the desugaring code."""
+    tag = f"{_FORMAT}:{desugar.__version__}:".encode()
+    try:
+        # Cached output goes stale when the rules are changed during development
+        # even if the version is not bumped.
+        return (
+            tag
+            + hashlib.blake2b(
+                pathlib.Path(transform.__file__).read_bytes(), digest_size=_DIGEST_SIZE
+            ).digest()
+        )
+    except OSError:  # pragma: no cover
+        return tag
+
+
+_VERSION_TAG = _version_tag()
+
+
+class Entry(NamedTuple):
+
+    """A record of the index."""
+
+    path_digest: bytes
+    mtime_ns: int
+    size: int
+    key: bytes
+    output_size: int
+    last_used: int
+
+
+class Stats:
+
+    """Counts of how the cache was used."""
+
+    __slots__ = ("hits", "misses", "bytes_read", "bytes_written", "evicted")
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.evicted = 0
+
+    def __str__(self) -> str:
+        lookups = self.hits + self.misses
+        ratio = self.hits / lookups if lookups else 0
+        return (
+            f"{self.hits:,} hits, {self.misses:,} misses ({ratio:.1%} hit rate); "
+            f"{self.bytes_read:,} bytes read, {self.bytes_written:,} bytes written; "
+            f"{self.evicted:,} entries evicted"
+        )
+
+
+@functools.lru_cache(maxsize=None)
+def _file_mode() -> int:
+    """Return the mode a file is created with by default.
+
+    Files created by `mkstemp()` are only readable by their owner. The umask
+    is read from `/proc` where possible, as changing it to find out what it is
+    affects files being created by other threads.
+
+    """
+    try:
+        with open("/proc/self/status", encoding="ascii") as status:
+            for line in status:
+                if line.startswith("Umask:"):
+                    return 0o666 & ~int(line.split()[1], 8)
+    except (OSError, ValueError):
+        pass
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+@contextlib.contextmanager
+def atomic_path(path: pathlib.Path, /) -> Iterator[pathlib.Path]:
+    """Provide a temporary path which replaces `path` if the block succeeds.
+
+    Readers of `path` never see a partially written file, and a failure part
+    way through leaves any previous version in place.
+
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(
+        dir=path.parent, prefix=f".{path.name}.", suffix=".tmp"
+    )
+    os.close(fd)
+    try:
+        os.chmod(temp_path, _file_mode())
+        yield pathlib.Path(temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def _rules_digest(rules: FrozenSet[str]) -> bytes:
+    return ",".join(sorted(rules)).encode()
+
+
+class _Index:
+
+    """A read-only view of the index file."""
+
+    def __init__(self, path: pathlib.Path) -> None:
+        self._map: Optional[mmap.mmap] = None
+        self.count = 0
+        try:
+            with open(path, "rb") as file:
+                self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):  # Missing or empty.
+            return
+        try:
+            magic, version, count = _HEADER.unpack_from(self._map)
+        except struct.error:
+            magic = None
+        if (
+            magic != _MAGIC
+            or version != _FORMAT
+            or len(self._map) != _HEADER.size + count * _RECORD.size
+        ):
+            self.close()  # Treat as empty so it is rebuilt.
+        else:
+            self.count = count
+
+    def _digest_at(self, position: int) -> bytes:
+        offset = _HEADER.size + position * _RECORD.size
+        assert self._map is not None
+        return self._map[offset : offset + _DIGEST_SIZE]
+
+    def get(self, path_digest: bytes) -> Optional[Entry]:
+        """Binary search for the entry of a path."""
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._digest_at(middle) < path_digest:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count and self._digest_at(low) == path_digest:
+            offset = _HEADER.size + low * _RECORD.size
+            return Entry(*_RECORD.unpack_from(self._map, offset))  # type: ignore
+        return None
+
+    def __iter__(self) -> Iterator[Entry]:
+        for position in range(self.count):
+            offset = _HEADER.size + position * _RECORD.size
+            yield Entry(*_RECORD.unpack_from(self._map, offset))  # type: ignore
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self.count = 0
+
+
+class Cache:
+
+    """A cache of desugared source code stored in a directory.
+
+    Lookups only read the index as it was when the cache was opened; new and
+    used entries are recorded in memory and written out by `save()`. That
+    lets separate processes share a cache by passing the entries from
+    `lookup()` to a single process which calls `record()` and `save()`.
+
+    """
+
+    def __init__(
+        self, directory: os.PathLike[str] | str, /, max_size: int = DEFAULT_MAX_SIZE
+    ) -> None:
+        self.directory = pathlib.Path(directory)
+        self.max_size = max_size
+        self.stats = Stats()
+        self._index = _Index(self.directory / "index")
+        self._updates: Dict[bytes, Entry] = {}
+
+    def __enter__(self) -> Cache:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def _object_path(self, key: bytes) -> pathlib.Path:
+        name = key.hex()
+        return self.directory / "objects" / name[:2] / f"{name[2:]}.py"
+
+    def lookup(
+        self, source: pathlib.Path, /, rules: FrozenSet[str] = transform.DEFAULT_RULES
+    ) -> Tuple[pathlib.Path, Entry, bool]:
+        """Return the path to the desugared source, desugaring it on a miss.
+
+        Along with the path, the index entry for the source and whether the
+        lookup was a hit are returned.
+
+        """
+        rules = transform._check_rules(rules)
+        rules_digest = _rules_digest(rules)
+        path_digest = hashlib.blake2b(
+            os.fsencode(os.path.abspath(source)) + b"\0" + rules_digest,
+            digest_size=_DIGEST_SIZE,
+        ).digest()
+        stat = os.stat(source)
+        now = time.time_ns()
+        entry = self._updates.get(path_digest) or self._index.get(path_digest)
+        if (
+            entry is not None
+            and entry.mtime_ns == stat.st_mtime_ns
+            and entry.size == stat.st_size
+        ):
+            object_path = self._object_path(entry.key)
+            # The entry may have been evicted by another process.
+            if object_path.exists():
+                entry = entry._replace(last_used=now)
+                self.record(entry, True)
+                return object_path, entry, True
+
+        # The file has changed (or is new), but its contents may still be cached.
+        source_bytes = source.read_bytes()
+        key = hashlib.blake2b(
+            b"\0".join([_VERSION_TAG, rules_digest, source_bytes]),
+            digest_size=_DIGEST_SIZE,
+        ).digest()
+        object_path = self._object_path(key)
+        try:
+            output_size = object_path.stat().st_size
+        except FileNotFoundError:
+            hit = False
+            with atomic_path(object_path) as temp_path:
+                with open(temp_path, "w", encoding="utf-8") as file:
+                    file.writelines(transform.iter_transform(source_bytes, rules))
+            output_size = object_path.stat().st_size
+        else:
+            hit = True
+        entry = Entry(
+            path_digest, stat.st_mtime_ns, stat.st_size, key, output_size, now
+        )
+        self.record(entry, hit)
+        return object_path, entry, hit
+
+    def record(self, entry: Entry, hit: bool) -> None:
+        """Record the use of an entry, to be written to the index by `save()`."""
+        previous = self._updates.get(entry.path_digest)
+        if previous is None or previous.last_used <= entry.last_used:
+            self._updates[entry.path_digest] = entry
+        if hit:
+            self.stats.hits += 1
+            self.stats.bytes_read += entry.output_size
+        else:
+            self.stats.misses += 1
+            self.stats.bytes_written += entry.output_size
+
+    def save(self) -> None:
+        """Write the index, evicting the least recently used entries first if
+        the cache is larger than its maximum size."""
+        entries = {entry.path_digest: entry for entry in self._index}
+        entries.update(self._updates)
+        # Entries for different paths may share an object.
+        sizes: Dict[bytes, int] = {}
+        last_used: Dict[bytes, int] = {}
+        for entry in entries.values():
+            sizes[entry.key] = entry.output_size
+            last_used[entry.key] = max(last_used.get(entry.key, 0), entry.last_used)
+        total = sum(sizes.values())
+        evicted = set()
+        for key in sorted(last_used, key=last_used.__getitem__):
+            if total <= self.max_size:
+                break
+            evicted.add(key)
+            total -= sizes[key]
+            with contextlib.suppress(FileNotFoundError):
+                self._object_path(key).unlink()
+        self.stats.evicted += len(evicted)
+
+        records = sorted(
+            entry for entry in entries.values() if entry.key not in evicted
+        )
+        self._index.close()
+        index_path = self.directory / "index"
+        with atomic_path(index_path) as temp_path:
+            with open(temp_path, "wb") as file:
+                file.write(_HEADER.pack(_MAGIC, _FORMAT, len(records)))
+                for record in records:
+                    file.write(_RECORD.pack(*record))
+        self._index = _Index(index_path)
+        self._updates.clear()
+
+    def close(self) -> None:
+        """Release the index (without saving it)."""
+        self._index.close()
+
+
+_caches: Dict[Tuple[str, int], Cache] = {}
+
+
+def cached(directory: str, max_size: int = DEFAULT_MAX_SIZE) -> Cache:
+    """Return a cache for the directory which is shared within the process."""
+    try:
+        return _caches[directory, max_size]
+    except KeyError:
+        cache = _caches[directory, max_size] = Cache(directory, max_size)
+        return cache
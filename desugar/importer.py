@@ -0,0 +1,209 @@
+"""Import modules with their syntax desugared.
+
+    import desugar.importer
+    desugar.importer.install("myapp")
+    import myapp  # `myapp` and its submodules are desugared.
+
+Compiled bytecode is cached next to the regular `.pyc` files in `__pycache__`,
+but under an optimization tag which identifies the version of desugar and the
+rules applied (e.g. `mod.cpython-39.opt-desugar1a2b3c4d5e6f.pyc`). The files
+use the same layout as `.pyc` files, validated either by the modification
+time and size of the source or by a hash of it, so once the cache is warm an
+import costs about the same as loading a regular `.pyc` file.
+
+"""
+
+from __future__ import annotations
+
+import hashlib
+import importlib.abc
+import importlib.machinery
+import importlib.util
+import marshal
+import sys
+import types
+from typing import FrozenSet, Iterable, Optional, Sequence
+
+from . import cache, transform
+
+_FLAGS_TIMESTAMP = 0b00
+_FLAGS_CHECKED_HASH = 0b11
+
+
+def _cache_tag(rules: FrozenSet[str]) -> str:
+    """Create the optimization tag for the bytecode of desugared modules."""
+    digest = hashlib.blake2b(digest_size=6)
+    digest.update(cache._VERSION_TAG)
+    digest.update(cache._rules_digest(rules))
+    # Like `-O`, assertions and docstrings change the bytecode.
+    return f"desugar{digest.hexdigest()}{sys.flags.optimize or ''}"
+
+
+class DesugarLoader(importlib.machinery.SourceFileLoader):
+
+    """Load a source file after desugaring it."""
+
+    def __init__(
+        self,
+        fullname: str,
+        path: str,
+        rules: Iterable[str] = transform.DEFAULT_RULES,
+        *,
+        hash_based: bool = False,
+    ) -> None:
+        super().__init__(fullname, path)
+        self.rules = transform._check_rules(rules)
+        self.hash_based = hash_based
+        self.cache_tag = _cache_tag(self.rules)
+
+    def cache_path(self, source_path: str) -> Optional[str]:
+        """Return the path of the bytecode for the source file."""
+        try:
+            return importlib.util.cache_from_source(
+                source_path, optimization=self.cache_tag
+            )
+        except NotImplementedError:  # pragma: no cover
+            return None  # `sys.implementation.cache_tag` is None.
+
+    def source_to_code(  # type: ignore[override]
+        self, data: bytes, path: str, *, _optimize: int = -1
+    ) -> types.CodeType:
+        # Compiling the AST keeps the line numbers of the original source.
+        desugared = transform.transform_ast(data, self.rules)
+        return compile(desugared, path, "exec", dont_inherit=True, optimize=_optimize)
+
+    def _load_bytecode(
+        self, data: bytes, source_path: str, mtime: int, size: int
+    ) -> Optional[types.CodeType]:
+        """Return the code from cached bytecode, unless it is out of date."""
+        if len(data) < 16 or data[:4] != importlib.util.MAGIC_NUMBER:
+            return None
+        flags = int.from_bytes(data[4:8], "little")
+        if flags == _FLAGS_TIMESTAMP and not self.hash_based:
+            if (
+                int.from_bytes(data[8:12], "little") != mtime & 0xFFFFFFFF
+                or int.from_bytes(data[12:16], "little") != size & 0xFFFFFFFF
+            ):
+                return None
+        elif flags == _FLAGS_CHECKED_HASH and self.hash_based:
+            source_hash = importlib.util.source_hash(self.get_data(source_path))
+            if data[8:16] != source_hash:
+                return None
+        else:
+            return None
+        try:
+            code = marshal.loads(memoryview(data)[16:])
+        except (EOFError, ValueError, TypeError):
+            return None
+        return code if isinstance(code, types.CodeType) else None
+
+    def get_code(self, fullname: str) -> types.CodeType:
+        # Lib/importlib/_bootstrap_external.py:SourceLoader.get_code
+        source_path = self.get_filename(fullname)
+        bytecode_path = self.cache_path(source_path)
+        mtime = size = None
+        if bytecode_path is not None:
+            try:
+                stats = self.path_stats(source_path)
+            except OSError:
+                pass
+            else:
+                mtime, size = int(stats["mtime"]), stats["size"]
+                try:
+                    data = self.get_data(bytecode_path)
+                except OSError:
+                    pass
+                else:
+                    code = self._load_bytecode(data, source_path, mtime, size)
+                    if code is not None:
+                        return code
+        source = self.get_data(source_path)
+        code = self.source_to_code(source, source_path)
+        if (
+            not sys.dont_write_bytecode
+            and bytecode_path is not None
+            and mtime is not None
+        ):
+            if self.hash_based:
+                header = _FLAGS_CHECKED_HASH.to_bytes(4, "little")
+                header += importlib.util.source_hash(source)
+            else:
+                header = _FLAGS_TIMESTAMP.to_bytes(4, "little")
+                header += (mtime & 0xFFFFFFFF).to_bytes(4, "little")
+                header += (size & 0xFFFFFFFF).to_bytes(4, "little")
+            data = importlib.util.MAGIC_NUMBER + header + marshal.dumps(code)
+            try:
+                # Writes atomically, creating `__pycache__` if necessary.
+                self.set_data(bytecode_path, data)
+            except NotImplementedError:  # pragma: no cover
+                pass
+        return code
+
+
+class DesugarFinder(importlib.abc.MetaPathFinder):
+
+    """Find the source files of modules to be desugared.
+
+    Only the specified modules and their submodules are desugared; desugar
+    itself never is, as desugared code depends on it.
+
+    """
+
+    def __init__(
+        self,
+        names: Iterable[str],
+        rules: Iterable[str] = transform.DEFAULT_RULES,
+        *,
+        hash_based: bool = False,
+    ) -> None:
+        self.names = frozenset(names)
+        self.rules = transform._check_rules(rules)
+        self.hash_based = hash_based
+
+    def _applies_to(self, fullname: str) -> bool:
+        package = fullname.partition(".")[0]
+        return package != "desugar" and (
+            fullname in self.names
+            or any(fullname.startswith(f"{name}.") for name in self.names)
+        )
+
+    def find_spec(
+        self,
+        fullname: str,
+        path: Optional[Sequence[str]],
+        target: Optional[types.ModuleType] = None,
+    ) -> Optional[importlib.machinery.ModuleSpec]:
+        if not self._applies_to(fullname):
+            return None
+        spec = importlib.machinery.PathFinder.find_spec(fullname, path, target)
+        if (
+            spec is None
+            or type(spec.loader) is not importlib.machinery.SourceFileLoader
+        ):
+            return None  # E.g. extension modules, which have no syntax to desugar.
+        loader = DesugarLoader(
+            fullname, spec.loader.path, self.rules, hash_based=self.hash_based
+        )
+        spec.loader = loader
+        spec.cached = loader.cache_path(spec.loader.path)
+        return spec
+
+
+def install(
+    *names: str,
+    rules: Iterable[str] = transform.DEFAULT_RULES,
+    hash_based: bool = False,
+) -> DesugarFinder:
+    """Desugar the named modules (and their submodules) when imported.
+
+    Modules which have already been imported are unaffected.
+
+    """
+    finder = DesugarFinder(names, rules, hash_based=hash_based)
+    sys.meta_path.insert(0, finder)
+    return finder
+
+
+def uninstall(finder: DesugarFinder) -> None:
+    """Stop desugaring the modules of a finder returned by `install()`."""
+    sys.meta_path.remove(finder)
@@ -0,0 +1,299 @@
+"""A minimal event loop for running desugared coroutines.
+
+Since `desugar.builtins._await()` turns `await` into `yield from`, a desugared
+coroutine is a plain generator which suspends by yielding to whatever is
+running it. This loop runs such generators (as well as native coroutines which
+await the functions in this module) directly: the coroutines yield the
+requests made by `sleep()`, `wait_readable()`, etc. and the loop resumes them
+once the request is satisfied.
+
+"""
+
+from __future__ import annotations
+
+import collections
+import heapq
+import itertools
+import selectors
+import socket
+import time
+import types
+import typing
+from typing import Any, Generator, Optional, Tuple
+
+
+class Task:
+
+    """A coroutine scheduled to run on a loop."""
+
+    __slots__ = ("coroutine", "done", "result", "exception", "_waiters")
+
+    def __init__(self, coroutine: Any, /) -> None:
+        self.coroutine = coroutine
+        self.done = False
+        self.result: Any = None
+        self.exception: Optional[BaseException] = None
+        self._waiters: list[Task] = []
+
+
+class _Sleep:
+
+    """Request to be resumed after a delay."""
+
+    __slots__ = ("delay",)
+
+    def __init__(self, delay: float, /) -> None:
+        self.delay = delay
+
+
+class _WaitIO:
+
+    """Request to be resumed once a file object is ready for reading or writing."""
+
+    __slots__ = ("fileobj", "event")
+
+    def __init__(self, fileobj: Any, event: int, /) -> None:
+        self.fileobj = fileobj
+        self.event = event
+
+
+class _Spawn:
+
+    """Request to schedule a new task."""
+
+    __slots__ = ("coroutine",)
+
+    def __init__(self, coroutine: Any, /) -> None:
+        self.coroutine = coroutine
+
+
+class _Join:
+
+    """Request to be resumed with the outcome of a task."""
+
+    __slots__ = ("task",)
+
+    def __init__(self, task: Task, /) -> None:
+        self.task = task
+
+
+@types.coroutine
+def sleep(delay: float = 0, /) -> Generator[Any, Any, None]:
+    """Suspend for `delay` seconds; a delay of 0 lets other ready tasks run."""
+    if delay <= 0:
+        yield None
+    else:
+        yield _Sleep(delay)
+
+
+@types.coroutine
+def wait_readable(fileobj: Any, /) -> Generator[Any, Any, None]:
+    """Suspend until the file object is ready for reading."""
+    yield _WaitIO(fileobj, selectors.EVENT_READ)
+
+
+@types.coroutine
+def wait_writable(fileobj: Any, /) -> Generator[Any, Any, None]:
+    """Suspend until the file object is ready for writing."""
+    yield _WaitIO(fileobj, selectors.EVENT_WRITE)
+
+
+@types.coroutine
+def spawn(coroutine: Any, /) -> Generator[Any, Any, Task]:
+    """Schedule a coroutine to run concurrently and return its task."""
+    return (yield _Spawn(coroutine))
+
+
+@types.coroutine
+def join(task: Task, /) -> Generator[Any, Any, Any]:
+    """Wait for a task to finish and return its result (or raise its exception)."""
+    return (yield _Join(task))
+
+
+@types.coroutine
+def sock_recv(sock: socket.socket, size: int, /) -> Generator[Any, Any, bytes]:
+    """Receive up to `size` bytes from a non-blocking socket."""
+    while True:
+        try:
+            return sock.recv(size)
+        except BlockingIOError:
+            yield _WaitIO(sock, selectors.EVENT_READ)
+
+
+@types.coroutine
+def sock_sendall(sock: socket.socket, data: bytes, /) -> Generator[Any, Any, None]:
+    """Send all of the data over a non-blocking socket."""
+    view = memoryview(data)
+    while view:
+        try:
+            sent = sock.send(view)
+        except BlockingIOError:
+            yield _WaitIO(sock, selectors.EVENT_WRITE)
+        else:
+            view = view[sent:]
+
+
+class Loop:
+
+    """Run coroutines until the main one finishes.
+
+    Tasks ready to run are kept in a FIFO queue, timers in a heap and I/O
+    readiness is polled with the `selectors` module.
+
+    """
+
+    def __init__(self) -> None:
+        self._ready: typing.Deque[
+            Tuple[Task, Any, Optional[BaseException]]
+        ] = collections.deque()
+        self._timers: list[Tuple[float, int, Task]] = []
+        self._timer_order = itertools.count()
+        self._selector = selectors.DefaultSelector()
+        # fileobj -> {event: task}
+        self._io_waiters: dict[Any, dict[int, Task]] = {}
+        self._unfinished: set[Task] = set()
+
+    def spawn(self, coroutine: Any, /) -> Task:
+        """Schedule a coroutine to run and return its task."""
+        task = Task(coroutine)
+        self._unfinished.add(task)
+        self._ready.append((task, None, None))
+        return task
+
+    def run(self, coroutine: Any, /) -> Any:
+        """Run the coroutine (and any tasks it spawns) and return its result.
+
+        Tasks which have not finished by the time the coroutine does are
+        closed.
+
+        """
+        main = self.spawn(coroutine)
+        ready = self._ready
+        try:
+            while True:
+                # Only run what is ready now so I/O and timers are not starved.
+                for _ in range(len(ready)):
+                    task, value, error = ready.popleft()
+                    self._step(task, value, error)
+                if main.done:
+                    break
+                self._poll(0 if ready else self._next_timeout())
+        finally:
+            self._close_tasks()
+        if main.exception is not None:
+            raise main.exception
+        return main.result
+
+    def close(self) -> None:
+        """Release the loop's selector."""
+        self._selector.close()
+
+    def _step(self, task: Task, value: Any, error: Optional[BaseException]) -> None:
+        """Resume a task and act on the request it yields."""
+        try:
+            if error is not None:
+                request = task.coroutine.throw(error)
+            else:
+                request = task.coroutine.send(value)
+        except StopIteration as exc:
+            self._finish(task, exc.value, None)
+        except BaseException as exc:
+            self._finish(task, None, exc)
+        else:
+            request_type = type(request)
+            if request is None:
+                self._ready.append((task, None, None))
+            elif request_type is _Sleep:
+                deadline = time.monotonic() + request.delay
+                entry = deadline, next(self._timer_order), task
+                heapq.heappush(self._timers, entry)
+            elif request_type is _WaitIO:
+                self._wait_io(task, request.fileobj, request.event)
+            elif request_type is _Spawn:
+                new_task = self.spawn(request.coroutine)
+                self._ready.append((task, new_task, None))
+            elif request_type is _Join:
+                other = request.task
+                if other.done:
+                    self._ready.append((task, other.result, other.exception))
+                else:
+                    other._waiters.append(task)
+            else:
+                exc = TypeError(f"unsupported request to the loop: {request!r}")
+                self._ready.append((task, None, exc))
+
+    def _finish(
+        self, task: Task, result: Any, exception: Optional[BaseException]
+    ) -> None:
+        """Record the outcome of a task and wake anything joining it."""
+        self._unfinished.discard(task)
+        task.done = True
+        task.result = result
+        task.exception = exception
+        for waiter in task._waiters:
+            self._ready.append((waiter, result, exception))
+        task._waiters.clear()
+
+    def _wait_io(self, task: Task, fileobj: Any, event: int) -> None:
+        """Register a task to be resumed when the file object is ready."""
+        waiters = self._io_waiters.get(fileobj)
+        if waiters is None:
+            self._io_waiters[fileobj] = {event: task}
+            self._selector.register(fileobj, event)
+        elif event in waiters:
+            exc = RuntimeError(f"another task is already waiting on {fileobj!r}")
+            self._ready.append((task, None, exc))
+        else:
+            waiters[event] = task
+            self._selector.modify(fileobj, selectors.EVENT_READ | selectors.EVENT_WRITE)
+
+    def _next_timeout(self) -> Optional[float]:
+        """Calculate how long polling may block for."""
+        if self._timers:
+            return max(0, self._timers[0][0] - time.monotonic())
+        elif self._io_waiters:
+            return None
+        else:
+            raise RuntimeError("every task is blocked; the loop would never finish")
+
+    def _poll(self, timeout: Optional[float]) -> None:
+        """Wait for I/O or the next timer and queue up the tasks it unblocks."""
+        if self._io_waiters:
+            for key, mask in self._selector.select(timeout):
+                fileobj = key.fileobj
+                waiters = self._io_waiters[fileobj]
+                for event in (selectors.EVENT_READ, selectors.EVENT_WRITE):
+                    if mask & event and event in waiters:
+                        self._ready.append((waiters.pop(event), None, None))
+                if waiters:
+                    self._selector.modify(fileobj, next(iter(waiters)))
+                else:
+                    del self._io_waiters[fileobj]
+                    self._selector.unregister(fileobj)
+        elif timeout:
+            time.sleep(timeout)
+        now = time.monotonic()
+        timers = self._timers
+        while timers and timers[0][0] <= now:
+            _, _, task = heapq.heappop(timers)
+            self._ready.append((task, None, None))
+
+    def _close_tasks(self) -> None:
+        """Close every task which is still suspended."""
+        for fileobj in self._io_waiters:
+            self._selector.unregister(fileobj)
+        self._ready.clear()
+        self._timers.clear()
+        self._io_waiters.clear()
+        unfinished, self._unfinished = self._unfinished, set()
+        for task in unfinished:
+            task.coroutine.close()
+
+
+def run(coroutine: Any, /) -> Any:
+    """Run the coroutine on a new loop and return its result."""
+    loop = Loop()
+    try:
+        return loop.run(coroutine)
+    finally:
+        loop.close()
@@ -4,12 +4,14 @@ pertain to syntax."""
 
 from __future__ import annotations
 
+import collections.abc
 import typing
+import weakref
 
 from . import builtins as debuiltins
 
 if typing.TYPE_CHECKING:
-    from typing import Any, Callable
+    from typing import Any, Callable, Iterable, List
 
     class _BinaryOp(typing.Protocol):
 
@@ -304,14 +306,107 @@ def not_(a: Any, /) -> bool:
 __not__ = not_
 
 
+class _MembershipIndex:
+
+    """A hash index over the items of an iterable for membership testing.
+
+    Hashable items are placed in a set while unhashable ones are kept in a list
+    which is still searched linearly. A set compares by identity and then
+    equality, matching the `x is item or x == item` check of the iteration
+    fallback for any item whose hash is consistent with its equality.
+
+    """
+
+    def __init__(self, container: Any, /) -> None:
+        self.hashed = set()
+        self.unhashable = []
+        for x in container:
+            try:
+                self.hashed.add(x)
+            except TypeError:
+                self.unhashable.append(x)
+
+    def __contains__(self, item: Any, /) -> bool:
+        try:
+            if item in self.hashed:
+                return True
+        except TypeError:
+            # An unhashable item can still be equal to a hashable one.
+            if debuiltins.any(x is item or x == item for x in self.hashed):
+                return True
+        return debuiltins.any(x is item or x == item for x in self.unhashable)
+
+
+# Keyed by id() so that containers which are unhashable or which compare equal
+# to each other can still be indexed separately; the weak reference clears the
+# entry when the container goes away.
+_membership_indexes: dict[int, tuple[weakref.ref, Any]] = {}
+
+
+def index_membership(container: Any, /) -> None:
+    """Opt a container into a hash index for membership testing.
+
+    Only containers which do not define `__contains__` are affected, and only
+    when they are iterated over by `__contains__()`. The index is built the
+    first time it is needed and reused for every later membership test, so the
+    container is expected to not change its contents; call
+    `invalidate_membership()` after mutating it.
+
+    The index is tied to the container through a weak reference, so a
+    container which cannot be weakly referenced (e.g. one whose class defines
+    `__slots__` without `__weakref__`) is left unindexed and searched linearly.
+
+    """
+    key = id(container)
+
+    def forget(_: weakref.ref, /) -> None:
+        _membership_indexes.pop(key, None)
+
+    try:
+        ref = weakref.ref(container, forget)
+    except TypeError:
+        return
+    _membership_indexes[key] = ref, None
+
+
+def invalidate_membership(container: Any, /) -> None:
+    """Discard any hash index built for the container.
+
+    The container stays opted in and a new index is built on its next
+    membership test.
+
+    """
+    try:
+        ref, _ = _membership_indexes[id(container)]
+    except KeyError:
+        return
+    if ref() is container:
+        _membership_indexes[id(container)] = ref, None
+
+
+def _iter_contains(container: Any, item: Any, /) -> bool:
+    """Search for an item by iterating over the container."""
+    try:
+        ref, index = _membership_indexes[id(container)]
+    except KeyError:
+        pass
+    else:
+        if ref() is container:
+            if index is None:
+                index = _MembershipIndex(container)
+                _membership_indexes[id(container)] = ref, index
+            return item in index
+    # Cheating until `for` is unravelled (and thus iterators).
+    return debuiltins.any(x is item or x == item for x in container)
+
+
 def __contains__(container: Any, item: Any, /) -> bool:
     """Check if the first item contains the second item: `b in a`."""
     container_type = type(container)
     try:
         contains_method = debuiltins._mro_getattr(container_type, "__contains__")
     except AttributeError:
-        # Cheating until `for` is unravelled (and thus iterators).
-        return debuiltins.any(x is item or x == item for x in container)
+        return _iter_contains(container, item)
     else:
         if contains_method is None:
             raise TypeError(f"{container_type.__name__!r} object is not a container")
@@ -322,6 +417,36 @@ def __contains__(container: Any, item: Any, /) -> bool:
 contains = __contains__
 
 
+# Containers whose `__contains__` is known to return a bool from a hash lookup.
+_HASHED_CONTAINERS = frozenset({set, frozenset, dict})
+
+
+def contains_many(container: Any, items: Iterable[Any], /) -> bytearray:
+    """Check which of the items are in the container.
+
+    The result has a byte per item which is 1 if `item in container` and 0
+    otherwise. `__contains__` is only looked up once for the whole batch.
+
+    """
+    results = bytearray()
+    container_type = type(container)
+    if container_type in _HASHED_CONTAINERS:
+        for item in items:
+            results.append(item in container)
+        return results
+    try:
+        contains_method = debuiltins._mro_getattr(container_type, "__contains__")
+    except AttributeError:
+        for item in items:
+            results.append(_iter_contains(container, item))
+    else:
+        if contains_method is None:
+            raise TypeError(f"{container_type.__name__!r} object is not a container")
+        for item in items:
+            results.append(truth(contains_method(container, item)))
+    return results
+
+
 def __getitem__(container: Any, index: Any, /) -> Any:
     """Return the item in the container at the specified index."""
     container_type = type(container)
@@ -335,6 +460,26 @@ def __getitem__(container: Any, index: Any, /) -> Any:
 getitem = __getitem__
 
 
+def getitem_view(container: Any, index: Any, /) -> Any:
+    """Return the item at the specified index, slicing buffers without copying.
+
+    When the index is a slice and the container supports the buffer protocol
+    (e.g. `bytes`, `bytearray`, `mmap`), the result is a `memoryview` of the
+    container instead of a copy. The view keeps the container's buffer
+    exported, so a `bytearray` cannot be resized while the view is alive.
+    Any other subscription is the same as `__getitem__()`.
+
+    """
+    if type(index) is slice:
+        try:
+            view = memoryview(container)
+        except TypeError:
+            pass
+        else:
+            return view[index]
+    return __getitem__(container, index)
+
+
 def __setitem__(container: Any, index: Any, value: Any, /) -> None:
     """Set the item in the container at the specified index."""
     container_type = type(container)
@@ -359,3 +504,97 @@ def __delitem__(container: Any, index: Any, /) -> None:
 
 
 delitem = __delitem__
+
+
+# Types whose subscription methods can be bound once and mapped over indices.
+_SUBSCRIPTABLE_FAST = frozenset({list, dict, memoryview})
+
+
+def _subscription_method(container: Any, name: str) -> Callable[..., Any]:
+    """Look up a subscription method on the container's type."""
+    container_type = type(container)
+    try:
+        return debuiltins._mro_getattr(container_type, name)
+    except AttributeError:
+        raise TypeError(f"{container_type.__name__!r} object is not subscriptable")
+
+
+def getitem_many(container: Any, indices: Iterable[Any], /) -> List[Any]:
+    """Return a list of the items in the container at the specified indices."""
+    if type(container) in _SUBSCRIPTABLE_FAST:
+        return list(map(container.__getitem__, indices))
+    getitem_method = _subscription_method(container, "__getitem__")
+    return [getitem_method(container, index) for index in indices]
+
+
+def setitem_many(
+    container: Any, indices: Iterable[Any], values: Iterable[Any], /
+) -> None:
+    """Set the items in the container at the specified indices.
+
+    The indices and values are paired up in order and must be of equal length.
+
+    """
+    indices = list(indices)
+    values = list(values)
+    if len(indices) != len(values):
+        raise ValueError(f"{len(indices)} indices were given for {len(values)} values")
+    if type(container) in _SUBSCRIPTABLE_FAST:
+        for _ in map(container.__setitem__, indices, values):
+            pass
+        return
+    setitem_method = _subscription_method(container, "__setitem__")
+    for index, value in zip(indices, values):
+        setitem_method(container, index, value)
+
+
+def delitem_many(container: Any, indices: Iterable[Any], /) -> None:
+    """Delete the items in the container at the specified indices.
+
+    The indices all refer to the container as it was before any deletion. For
+    a mutable sequence, integers and slices are positions, which are deleted
+    once each from the last to the first (an exact list is compacted in a
+    single pass instead), and nothing is deleted if any is out of range. For
+    any other container the indices are keys, which deleting does not shift,
+    so they are deleted in order as if by consecutive `del` statements.
+
+    """
+    indices = list(indices)
+    if not isinstance(container, collections.abc.MutableSequence):
+        if type(container) in _SUBSCRIPTABLE_FAST:
+            for _ in map(container.__delitem__, indices):
+                pass
+            return
+        delitem_method = _subscription_method(container, "__delitem__")
+        for index in indices:
+            delitem_method(container, index)
+        return
+    container_name = type(container).__name__
+    length = len(container)
+    positions = set()
+    for index in indices:
+        if type(index) is slice:
+            positions.update(range(*index.indices(length)))
+            continue
+        try:
+            position = debuiltins._index(index)
+        except TypeError:
+            raise TypeError(
+                f"{container_name} indices must be integers or slices, "
+                f"not {type(index).__name__}"
+            )
+        if position < 0:
+            position += length
+        if not 0 <= position < length:
+            raise IndexError(f"{container_name} assignment index out of range")
+        positions.add(position)
+    if not positions:
+        return
+    elif type(container) is list:
+        container[:] = [
+            item for position, item in enumerate(container) if position not in positions
+        ]
+    else:
+        delitem_method = _subscription_method(container, "__delitem__")
+        for position in sorted(positions, reverse=True):
+            delitem_method(container, position)
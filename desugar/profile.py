@@ -0,0 +1,156 @@
+"""Specialize desugared code for the types of operands observed at run time.
+
+Profiling takes two passes over the source of a module (identified by a name
+of your choosing, e.g. its module name, which must be the same in both):
+
+    import desugar.profile
+    exec(desugar.profile.instrument(source, "app"))
+    desugar.profile.recorded().dump("app.json")
+    ...
+    profile = desugar.profile.Profile.load("app.json")
+    desugared = desugar.profile.specialize(source, "app", profile)
+
+The instrumented code records the types of the operands at every *site*: each
+binary operator, comparison, augmented assignment to a name and attribute
+lookup which the rules desugar. Desugaring with the profile then gives every
+site where only one combination of types was observed a fast path guarded by
+checking the operands are of those types: operators on `int`, `float` and
+`str` call the type's method directly (as the "specialize" rule does for
+annotated operands), and attributes of built-in types are looked up natively.
+
+A profile is stored as JSON mapping each site (the name of its module and its
+location in the source) to how many times each combination of types was
+observed there:
+
+    {"sites":{"app:3:11:3:16":{"int,float":1000}},"version":1}
+
+Counts from different runs or worker processes add up, so the profiles each
+one dumps can be merged with `merge()` (or `Profile.update()`).
+
+"""
+
+from __future__ import annotations
+
+import ast
+import json
+import os
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple, Union
+
+from . import builtins as desugar_builtins
+from . import transform
+
+# Bump when the layout of a profile changes.
+_FORMAT = 1
+
+
+class Profile:
+
+    """Counts of the combinations of types observed at each site."""
+
+    def __init__(self, sites: Optional[Dict[str, Dict[str, int]]] = None) -> None:
+        self.sites: Dict[str, Dict[str, int]] = sites or {}
+
+    def observe(self, site: str, types: str) -> None:
+        """Count an observation of the (comma-separated) types at a site."""
+        counts = self.sites.setdefault(site, {})
+        counts[types] = counts.get(types, 0) + 1
+
+    def update(self, other: Profile) -> None:
+        """Add the counts of another profile to this one."""
+        for site, other_counts in other.sites.items():
+            counts = self.sites.setdefault(site, {})
+            for types, count in other_counts.items():
+                counts[types] = counts.get(types, 0) + count
+
+    def clear(self) -> None:
+        self.sites.clear()
+
+    def monomorphic(self, name: str) -> Dict[str, Tuple[str, ...]]:
+        """Find the sites of a module where only one combination of types was
+        observed, mapping their locations to the types."""
+        observed = {}
+        for site, counts in self.sites.items():
+            # The name of a module may contain a colon, but not its location.
+            module, *location = site.rsplit(":", 4)
+            if module == name and len(counts) == 1:
+                observed[":".join(location)] = tuple(next(iter(counts)).split(","))
+        return observed
+
+    def dump(self, path: Union[str, os.PathLike]) -> None:
+        """Write the profile to a file."""
+        data = {"version": _FORMAT, "sites": self.sites}
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(data, file, separators=(",", ":"), sort_keys=True)
+
+    @classmethod
+    def load(cls, path: Union[str, os.PathLike]) -> Profile:
+        """Read a profile written by `dump()`."""
+        with open(path, encoding="utf-8") as file:
+            data = json.load(file)
+        if not isinstance(data, dict) or data.get("version") != _FORMAT:
+            raise ValueError(f"{os.fspath(path)!r} is not a profile")
+        return cls(data["sites"])
+
+
+def merge(paths: Iterable[Union[str, os.PathLike]]) -> Profile:
+    """Read the profiles in the files, adding their counts together."""
+    profile = Profile()
+    for path in paths:
+        profile.update(Profile.load(path))
+    return profile
+
+
+_RECORDED = Profile()
+
+
+def recorded() -> Profile:
+    """Return the profile which instrumented code records into."""
+    return _RECORDED
+
+
+def _type_name(obj: object) -> str:
+    type_ = type(obj)
+    if type_.__module__ == "builtins":
+        return type_.__qualname__
+    return f"{type_.__module__}.{type_.__qualname__}"
+
+
+def binary(site: str, function: Callable[[Any, Any], Any], lhs: Any, rhs: Any) -> Any:
+    """Record the types of the operands of an operator and apply it."""
+    _RECORDED.observe(site, f"{_type_name(lhs)},{_type_name(rhs)}")
+    return function(lhs, rhs)
+
+
+def attribute(site: str, obj: object, attr: str) -> Any:
+    """Record the type of an object and look up one of its attributes."""
+    _RECORDED.observe(site, _type_name(obj))
+    return desugar_builtins.getattr(obj, attr)
+
+
+def instrument(
+    source: Union[str, bytes, ast.Module],
+    name: str,
+    /,
+    rules: Iterable[str] = transform.DEFAULT_RULES,
+) -> str:
+    """Desugar a module so that running it records the types observed at each
+    site into `recorded()`."""
+    transformer = transform._Desugar(transform._check_rules(rules), instrument=name)
+    statements = transform._iter_statements(transformer, source)
+    return "".join(map(transform._unparse, statements))
+
+
+def specialize(
+    source: Union[str, bytes, ast.Module],
+    name: str,
+    profile: Profile,
+    /,
+    rules: Iterable[str] = transform.DEFAULT_RULES,
+) -> str:
+    """Desugar a module with fast paths for the types observed at each
+    monomorphic site in the profile."""
+    transformer = transform._Desugar(
+        transform._check_rules(rules), observed=profile.monomorphic(name)
+    )
+    statements = transform._iter_statements(transformer, source)
+    return "".join(map(transform._unparse, statements))
@@ -0,0 +1,3337 @@
+"""Desugar Python source code by applying the rewrites listed in the README.
+
+`transform()` takes source code (or an `ast.Module`) and returns the
+equivalent source code with the syntax unravelled, e.g. `a + b` becomes
+`_desugar_operator.__add__(a, b)`. Each rewrite is a rule named in
+`ALL_RULES` and any subset may be selected via the `rules` argument.
+
+Top-level statements are transformed and emitted one at a time (see
+`iter_transform()`), so the output of a large module never has to be held in
+memory at once.
+
+Where a rewrite cannot be applied without changing semantics the syntax is
+left as-is (see `_Desugar`). The rules in `OPTIONAL_RULES` optimize the
+desugared code instead of unravelling syntax, and are only applied when
+selected; each is described where it is implemented.
+
+"""
+
+from __future__ import annotations
+
+import ast
+import builtins
+import copy
+import functools
+import hashlib
+import importlib.util
+import io
+import textwrap
+import typing
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+RULES: Dict[str, str] = {
+    "attribute": "`obj.attr` ➠ `getattr(obj, 'attr')`",
+    "binary": "`a + b` ➠ `operator.__add__(a, b)`",
+    "augmented": "`a += b` ➠ `a = operator.__iadd__(a, b)`",
+    "unary": "`-a` ➠ `operator.__neg__(a)`",
+    "comparison": "`a < b` ➠ `operator.__lt__(a, b)`",
+    "boolean": "`a or b` ➠ `_temp if (_temp := a) else b`",
+    "subscript": "`x[i]` ➠ `operator.__getitem__(x, i)`",
+    "slice": "`a:b:c` ➠ `slice(a, b, c)`",
+    "literal": "`True`, `None`, `'ABC'`, `b'ABC'`, `3j`, `...`",
+    "display": "`[a, b]` ➠ `list((a, b))`",
+    "comprehension": "`[c for b in a]` ➠ `list(c for b in a)`",
+    "lambda": "`lambda a: b` ➠ `def _lambda(a): return b`",
+    "assert": "`assert a, b`",
+    "for": "`for a in b: ...`",
+    "with": "`with a as b: ...`",
+    "async_def": "`async def` ➠ `@_coroutine def` and `await`",
+    "async_for": "`async for a in b: ...`",
+    "async_with": "`async with a as b: ...`",
+    "decorator": "`@decorator`",
+    "break": "`break` and `else` on loops",
+    "continue": "`continue`",
+    "if": "`if a: ...`",
+    "elif": "`elif` and `else` on `if`",
+    "match": "`match a: case ...`",
+    "try_else": "`else` on `try`",
+    "finally": "`finally` on `try`",
+    "raise_from": "`raise a from b`",
+    "import": "`import a` and `from a import b`",
+    "pass": "`pass` ➠ `'pass'`",
+    "del": "`del a` of a global",
+    "temporaries": "`_temp = a; f(_temp); del _temp` ➠ `f(a)`",
+    "flags": "`break`, `continue` and `if` via flags instead of exceptions",
+    "specialize": "`a + b` ➠ `int.__add__(a, b)` when annotated as `int` (guarded)",
+    "hoist_literals": "`'ABC'` ➠ `_literal_…`, bound once at the top level",
+    "fused_comprehension": "`[c for b in a]` ➠ a function appending `c` in a loop",
+    "range": "`for i in range(n)` ➠ counting `i` up in the `while` loop (guarded)",
+    "shared_finally": "`finally` without copying its block into an exception handler",
+    "flat_await": "`await a` ➠ `_await_flat(a)`, flattened when run by `trampoline()`",
+}
+
+ALL_RULES = frozenset(RULES)
+# Optimizations of the desugared code rather than unravellings, which are only
+# applied when asked for.
+OPTIONAL_RULES = frozenset(
+    {
+        "temporaries",
+        "flags",
+        "specialize",
+        "hoist_literals",
+        "fused_comprehension",
+        "range",
+        "shared_finally",
+        "flat_await",
+    }
+)
+DEFAULT_RULES = ALL_RULES - OPTIONAL_RULES
+
+# Bound at the top of every desugared module (after any docstring and
+# `__future__` imports).
+PROLOGUE = """\
+import builtins as _builtins
+import sys as _sys
+import desugar.builtins as _desugar_builtins
+import desugar.operator as _desugar_operator
+
+
+class _BreakStatement(_builtins.BaseException):
+    pass
+
+
+class _ContinueStatement(_builtins.BaseException):
+    pass
+
+
+class _Done(_builtins.BaseException):
+    pass
+
+
+def _None():
+    pass
+
+
+def _tuple(*args):
+    return args
+"""
+
+_PROLOGUE_BODY = ast.parse(PROLOGUE).body
+# Desugared code never rebinds the names bound by the prologue, so loading them
+# (or an attribute of one of the modules) has no effect.
+_PROLOGUE_MODULES = frozenset(
+    typing.cast(str, alias.asname)
+    for statement in _PROLOGUE_BODY
+    if isinstance(statement, ast.Import)
+    for alias in statement.names
+)
+_PROLOGUE_NAMES = _PROLOGUE_MODULES | frozenset(
+    statement.name
+    for statement in _PROLOGUE_BODY
+    if isinstance(statement, (ast.FunctionDef, ast.ClassDef))
+)
+
+_BINARY_OPERATORS = {
+    ast.Add: "add",
+    ast.Sub: "sub",
+    ast.Mult: "mul",
+    ast.MatMult: "matmul",
+    ast.Div: "truediv",
+    ast.FloorDiv: "floordiv",
+    ast.Mod: "mod",
+    ast.Pow: "pow",
+    ast.LShift: "lshift",
+    ast.RShift: "rshift",
+    ast.BitAnd: "and",
+    ast.BitXor: "xor",
+    ast.BitOr: "or",
+}
+
+_UNARY_OPERATORS = {
+    ast.Invert: "__invert__",
+    ast.Not: "not_",
+    ast.UAdd: "__pos__",
+    ast.USub: "__neg__",
+}
+
+_COMPARISONS = {
+    ast.Eq: "__eq__",
+    ast.NotEq: "__ne__",
+    ast.Lt: "__lt__",
+    ast.LtE: "__le__",
+    ast.Gt: "__gt__",
+    ast.GtE: "__ge__",
+    ast.Is: "is_",
+    ast.IsNot: "is_not",
+}
+
+# The operators of `int` and `float` which "specialize" calls directly.
+_INT_OPERATORS = frozenset(_BINARY_OPERATORS.values()) - {"matmul"}
+_FLOAT_OPERATORS = frozenset({"add", "sub", "mul", "truediv", "floordiv", "mod", "pow"})
+_REFLECTED_COMPARISONS = {
+    "eq": "eq",
+    "ne": "ne",
+    "lt": "gt",
+    "le": "ge",
+    "gt": "lt",
+    "ge": "le",
+}
+_SPECIALIZED_TYPES = {int: "int", float: "float", str: "str"}
+# The types of literals which the subject of a `match` statement may be looked
+# up in a table of, by the types of subjects whose hashes agree with their
+# equality to those literals.
+_MATCH_TABLE_TYPES = {
+    int: ("int", "float", "complex", "bool"),
+    float: ("int", "float", "complex", "bool"),
+    complex: ("int", "float", "complex", "bool"),
+    str: ("str",),
+    bytes: ("bytes",),
+}
+# The fewest consecutive cases of literals looked up in a table.
+_MATCH_TABLE_CASES = 3
+
+_TRY_NODES = (ast.Try, getattr(ast, "TryStar", ast.Try))
+# The functions of `sys` returning the exception being handled.
+_EXCEPTION_FUNCTIONS = frozenset({"exc_info", "exception"})
+# `match` is new in Python 3.10.
+_MATCH_NODES = getattr(ast, "Match", ())
+_CASE_NODES = getattr(ast, "match_case", ())
+_LOOP_NODES = (ast.For, ast.AsyncFor, ast.While)
+_FUNCTION_NODES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)
+_SCOPE_NODES = (*_FUNCTION_NODES, ast.ClassDef)
+_COMPREHENSION_NODES = (ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)
+_DOCSTRING_NODES = (ast.Module, ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+# Scopes where an assignment expression binds a name which does no harm.
+_BINDING_SCOPES = frozenset({"module", "function", "coroutine", "lambda"})
+# Scopes where a statement defining a function may be hoisted out of an
+# expression.
+_HOISTING_SCOPES = frozenset({"module", "function", "coroutine"})
+
+
+def _raw(node: Any, /) -> Any:
+    """Mark a generated node so that no rule is applied to it (its children
+    are still visited)."""
+    node._desugar_raw = True
+    return node
+
+
+class _Substitute(ast.NodeTransformer):
+
+    """Fill in the placeholders of a template.
+
+    Placeholder names map to a string (to rename the name, e.g. for a
+    temporary), an expression, or a list of statements (for an expression
+    statement consisting of only the placeholder). Every node of the template
+    itself is marked as raw and stripped of its location.
+
+    """
+
+    def __init__(self, replacements: Dict[str, Any]) -> None:
+        self.replacements = replacements
+
+    def visit(self, node: ast.AST) -> Any:
+        for attribute in node._attributes:
+            try:
+                delattr(node, attribute)
+            except AttributeError:
+                pass
+        return super().visit(_raw(node))
+
+    def visit_Name(self, node: ast.Name) -> Any:
+        replacement = self.replacements.get(node.id)
+        if replacement is None:
+            return node
+        elif isinstance(replacement, str):
+            node.id = replacement
+            return node
+        else:
+            return replacement
+
+    def visit_ExceptHandler(self, node: ast.ExceptHandler) -> Any:
+        replacement = self.replacements.get(node.name)
+        if isinstance(replacement, str):
+            node.name = replacement
+        return self.generic_visit(node)
+
+    def visit_Expr(self, node: ast.Expr) -> Any:
+        if isinstance(node.value, ast.Name):
+            replacement = self.replacements.get(node.value.id)
+            if isinstance(replacement, list):
+                return replacement
+        return self.generic_visit(node)
+
+
+@functools.lru_cache(maxsize=None)
+def _parse_statements(template: str, /) -> List[ast.stmt]:
+    return ast.parse(textwrap.dedent(template)).body
+
+
+@functools.lru_cache(maxsize=None)
+def _parse_expression(template: str, /) -> ast.expr:
+    return ast.parse(template, mode="eval").body
+
+
+def _statements(template: str, /, **replacements: Any) -> List[ast.stmt]:
+    """Create statements from a template."""
+    body = copy.deepcopy(_parse_statements(template))
+    substitute = _Substitute(replacements)
+    statements = []
+    for statement in body:
+        result = substitute.visit(statement)
+        if isinstance(result, list):
+            statements.extend(result)
+        else:
+            statements.append(result)
+    return statements
+
+
+def _expression(template: str, /, **replacements: Any) -> ast.expr:
+    """Create an expression from a template."""
+    return _Substitute(replacements).visit(copy.deepcopy(_parse_expression(template)))
+
+
+def _call(function: str, /, *args: ast.expr) -> ast.Call:
+    """Create a call of a function (specified by its dotted name)."""
+    return _raw(ast.Call(_expression(function), list(args), []))
+
+
+def _name(id: str, /, ctx: Optional[ast.expr_context] = None) -> ast.Name:
+    return _raw(ast.Name(id, ctx or ast.Load()))
+
+
+def _constant(value: Any, /) -> ast.Constant:
+    return _raw(ast.Constant(value))
+
+
+def _is_docstring(statement: ast.stmt, /) -> bool:
+    return (
+        isinstance(statement, ast.Expr)
+        and isinstance(statement.value, ast.Constant)
+        and isinstance(statement.value.value, str)
+    )
+
+
+def _catches_base_exception(type_: Optional[ast.expr], /) -> bool:
+    """Check if an exception handler might catch an arbitrary `BaseException`."""
+    if type_ is None:
+        return True
+    elif isinstance(type_, ast.Tuple):
+        return any(_catches_base_exception(element) for element in type_.elts)
+    elif isinstance(type_, ast.Name):
+        return type_.id == "BaseException"
+    elif isinstance(type_, ast.Attribute):
+        return type_.attr == "BaseException"
+    else:
+        return True
+
+
+def _loop_control(
+    statements: List[ast.stmt], /, protected: bool = False
+) -> Iterator[Tuple[List[ast.stmt], int, bool]]:
+    """Find the `break` and `continue` statements which apply to an enclosing
+    loop.
+
+    Yields the block containing the statement, its index in the block, and
+    whether an exception raised in its place could be intercepted by a `with`
+    statement or an exception handler catching `BaseException`.
+
+    """
+    for index, statement in enumerate(statements):
+        if isinstance(statement, (ast.Break, ast.Continue)):
+            yield statements, index, protected
+        elif isinstance(statement, _LOOP_NODES):
+            # `else` is not part of the loop as far as `break` is concerned.
+            yield from _loop_control(statement.orelse, protected)
+        elif isinstance(statement, (ast.With, ast.AsyncWith)):
+            yield from _loop_control(statement.body, True)
+        elif isinstance(statement, _TRY_NODES):
+            catches = any(
+                _catches_base_exception(handler.type) for handler in statement.handlers
+            )
+            yield from _loop_control(statement.body, protected or catches)
+            for handler in statement.handlers:
+                yield from _loop_control(handler.body, protected)
+            yield from _loop_control(statement.orelse, protected)
+            yield from _loop_control(statement.finalbody, protected)
+        elif isinstance(statement, ast.If):
+            yield from _loop_control(statement.body, protected)
+            yield from _loop_control(statement.orelse, protected)
+        elif isinstance(statement, _MATCH_NODES):
+            for case in statement.cases:
+                yield from _loop_control(case.body, protected)
+
+
+def _replace_loop_control(
+    statements: List[ast.stmt], /, control: type, template: str
+) -> None:
+    """Replace the `break` or `continue` statements applying to an enclosing
+    loop with the statement from a template."""
+    for block, index, _ in list(_loop_control(statements)):
+        if isinstance(block[index], control):
+            (block[index],) = _statements(template)
+
+
+def _own_scope(nodes: Iterable[ast.AST], /) -> Iterator[ast.AST]:
+    """Walk the nodes without descending into nested scopes."""
+    todo = list(nodes)
+    while todo:
+        node = todo.pop()
+        yield node
+        if not isinstance(node, (*_SCOPE_NODES, *_COMPREHENSION_NODES)):
+            todo.extend(ast.iter_child_nodes(node))
+
+
+def _returns(statements: List[ast.stmt], /) -> bool:
+    """Check if a `return` statement in the block applies to its function."""
+    return any(isinstance(node, ast.Return) for node in _own_scope(statements))
+
+
+def _jumps(statements: List[ast.stmt], /) -> bool:
+    """Check if the block can be left early via `return`, `break` or
+    `continue`."""
+    return _returns(statements) or any(True for _ in _loop_control(statements))
+
+
+def _blocks(node: ast.AST, /) -> Iterator[List[ast.stmt]]:
+    """Find the blocks of statements directly within a node."""
+    for value in node.__dict__.values():
+        if isinstance(value, list) and value:
+            if isinstance(value[0], ast.stmt):
+                yield value
+            elif isinstance(value[0], (ast.excepthandler, _CASE_NODES)):
+                for child in value:
+                    yield from _blocks(child)
+
+
+def _jumps_from_finally(statements: List[ast.stmt], /) -> bool:
+    """Check if a `break` or `continue` applying to an enclosing loop is in a
+    `finally` block."""
+    todo = list(statements)
+    while todo:
+        statement = todo.pop()
+        if isinstance(statement, _LOOP_NODES):
+            todo.extend(statement.orelse)
+        elif not isinstance(statement, _SCOPE_NODES):
+            if isinstance(statement, _TRY_NODES) and any(
+                True for _ in _loop_control(statement.finalbody)
+            ):
+                return True
+            for block in _blocks(statement):
+                todo.extend(block)
+    return False
+
+
+def _observes_exception(statements: List[ast.stmt], /) -> bool:
+    """Check if the statements could tell whether an exception is being
+    handled: via a bare `raise`, the context of an exception they handle
+    themselves (including in a `with` statement), or `sys.exc_info()` and
+    `sys.exception()`."""
+    for node in ast.walk(ast.Module(statements, [])):
+        if isinstance(node, ast.Raise) and node.exc is None:
+            return True
+        elif isinstance(node, (ast.ExceptHandler, ast.With, ast.AsyncWith)):
+            return True
+        elif isinstance(node, ast.Name) and node.id in _EXCEPTION_FUNCTIONS:
+            return True
+        elif isinstance(node, ast.Attribute) and node.attr in _EXCEPTION_FUNCTIONS:
+            return True
+    return False
+
+
+def _annotated_type(annotation: Optional[ast.expr], /) -> Optional[str]:
+    """Return the name of the type specified by an annotation, if it is one
+    "specialize" handles."""
+    if isinstance(annotation, ast.Constant) and isinstance(annotation.value, str):
+        name = annotation.value.strip()  # A forward reference.
+    elif isinstance(annotation, ast.Name):
+        name = annotation.id
+    else:
+        return None
+    return name if name in _SPECIALIZED_TYPES.values() else None
+
+
+def _annotated_types(
+    node: Union[ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda], /
+) -> Dict[str, Optional[str]]:
+    """Find the types of the parameters and local variables of a function
+    from their annotations."""
+    arguments = node.args
+    types = {
+        argument.arg: _annotated_type(argument.annotation)
+        for argument in [
+            *arguments.posonlyargs,
+            *arguments.args,
+            *arguments.kwonlyargs,
+        ]
+    }
+    for argument in (arguments.vararg, arguments.kwarg):
+        if argument is not None:
+            types[argument.arg] = None
+    if not isinstance(node, ast.Lambda):
+        for child in _own_scope(node.body):
+            if isinstance(child, ast.AnnAssign) and isinstance(child.target, ast.Name):
+                types[child.target.id] = _annotated_type(child.annotation)
+    return types
+
+
+def _specialization(
+    name: str, left: Optional[str], right: Optional[str], /
+) -> Optional[Tuple[str, str, bool, Optional[str]]]:
+    """Find the method implementing an operator (e.g. "add" or "lt") for
+    operands which are exactly of the specified types.
+
+    Returns the type defining the method, the method's name, whether the
+    operands are passed to it swapped, and the type of the result (if known).
+
+    """
+    comparison = name in _REFLECTED_COMPARISONS
+    if left == right == "int":
+        if comparison:
+            return "int", f"__{name}__", False, None
+        elif name in _INT_OPERATORS:
+            # A negative exponent gives a `float`.
+            result = {"truediv": "float", "pow": None}.get(name, "int")
+            return "int", f"__{name}__", False, result
+    elif left in {"int", "float"} and right in {"int", "float"}:
+        # `int` returns `NotImplemented` for a `float`, leaving it to `float`.
+        if comparison:
+            if left == "float":
+                return "float", f"__{name}__", False, None
+            return "float", f"__{_REFLECTED_COMPARISONS[name]}__", True, None
+        elif name in _FLOAT_OPERATORS:
+            # A fractional power of a negative number gives a `complex`.
+            result = None if name == "pow" else "float"
+            if left == "float":
+                return "float", f"__{name}__", False, result
+            return "float", f"__r{name}__", True, result
+    elif left == right == "str":
+        if comparison:
+            return "str", f"__{name}__", False, None
+        elif name == "add":
+            return "str", "__add__", False, "str"
+    elif name == "mul" and (left, right) == ("str", "int"):
+        return "str", "__mul__", False, "str"
+    elif name == "mul" and (left, right) == ("int", "str"):
+        return "str", "__rmul__", True, "str"
+    return None
+
+
+def _is_builtin(type_name: str, /) -> bool:
+    """Check if a type (as named in a profile) is a built-in one."""
+    return isinstance(getattr(builtins, type_name, None), type)
+
+
+def _pattern_literals(pattern: ast.pattern, /) -> Optional[List[Tuple[ast.expr, Any]]]:
+    """Return the literals (and their values) a pattern matches, if it consists
+    of nothing but literals which a table may be used for."""
+    if isinstance(pattern, ast.MatchOr):
+        literals = []
+        for alternative in pattern.patterns:
+            found = _pattern_literals(alternative)
+            if found is None:
+                return None
+            literals.extend(found)
+        return literals
+    elif isinstance(pattern, ast.MatchValue):
+        try:
+            value = ast.literal_eval(pattern.value)
+        except ValueError:  # A dotted name.
+            return None
+        if type(value) in _MATCH_TABLE_TYPES:
+            return [(pattern.value, value)]
+    return None
+
+
+def _pattern_facts(pattern: ast.pattern, /) -> Iterator[Tuple[Any, ...]]:
+    """Find what a pattern looks up about its subject, which may be cached for
+    other patterns matching the subject of the same `match` statement."""
+    if isinstance(pattern, ast.MatchAs) and pattern.pattern is not None:
+        yield from _pattern_facts(pattern.pattern)
+    elif isinstance(pattern, ast.MatchOr):
+        for alternative in pattern.patterns:
+            yield from _pattern_facts(alternative)
+    elif isinstance(pattern, ast.MatchSequence):
+        yield ("sequence",)
+        starred = any(isinstance(item, ast.MatchStar) for item in pattern.patterns)
+        if not starred or len(pattern.patterns) > 1:
+            yield ("len",)
+    elif isinstance(pattern, ast.MatchMapping):
+        yield ("mapping",)
+        if pattern.keys:
+            yield ("len",)
+    elif isinstance(pattern, ast.MatchClass):
+        cls = ast.dump(pattern.cls)
+        yield ("class", cls)
+        if pattern.patterns:
+            count = len(pattern.patterns)
+            yield ("args", cls, count, tuple(pattern.kwd_attrs))
+            for position in range(count):
+                yield ("position", cls, position)
+        for attr in pattern.kwd_attrs:
+            yield ("attr", attr)
+
+
+def _pattern_names(pattern: ast.pattern, /) -> List[str]:
+    """Find the names a pattern binds."""
+    names = []
+    for node in ast.walk(pattern):
+        if isinstance(node, (ast.MatchAs, ast.MatchStar)) and node.name is not None:
+            names.append(node.name)
+        elif isinstance(node, ast.MatchMapping) and node.rest is not None:
+            names.append(node.rest)
+    return names
+
+
+def _is_wildcard(pattern: ast.pattern, /) -> bool:
+    """Check if a pattern is `_` or `*_`."""
+    if isinstance(pattern, ast.MatchAs):
+        return pattern.pattern is None and pattern.name is None
+    return isinstance(pattern, ast.MatchStar) and pattern.name is None
+
+
+class _Match:
+
+    """The temporaries of a `match` statement being desugared."""
+
+    def __init__(self, subject: str, case: str, shared: Set[Tuple[Any, ...]]) -> None:
+        self.subject = subject
+        # The index of the case which matched, or `None`.
+        self.case = case
+        # What more than one pattern looks up about the subject, and the
+        # temporaries caching it (which are unset until it is first looked up).
+        self.shared = shared
+        self.cached: Dict[Tuple[Any, ...], str] = {}
+        # The temporary bound to the value meaning unset or missing.
+        self.nothing: Optional[str] = None
+
+
+class _Desugar(ast.NodeTransformer):
+
+    """Apply the desugaring rules to the statements of a module.
+
+    Each `visit_*()` method either transforms the node in place (visiting its
+    children) or builds a replacement out of raw template nodes around the
+    node's *unvisited* children and then visits the replacement, so every
+    source node is visited exactly once. Statements which need to be
+    executed before the statement currently being visited (e.g. the function
+    definition for a `lambda`) are hoisted via `_hoist()`.
+
+    Some rewrites cannot be applied everywhere without changing semantics; in
+    those cases the syntax is left as-is:
+
+    - `class`, `global` and `del` of local names are not unravelled.
+    - Rewrites needing temporary names bound by an assignment expression
+      (`and`, `or` and chained comparisons) are skipped in class bodies and
+      comprehensions.
+    - `lambda` is only hoisted into a function definition in module and
+      function scope when its default arguments are literals.
+    - `with`/`async with` and `try`/`finally` are left alone when their bodies
+      contain `return`, `break` or `continue`, as is `if` when its body
+      contains `break` or `continue` which would end up applying to the
+      introduced `while` loop.
+    - `break` and `continue` are not turned into exceptions when they would be
+      raised through a `with` statement or an exception handler which catches
+      `BaseException`.
+    - `async def` is only converted when it is not an async generator and does
+      not use `await` within a comprehension.
+
+    """
+
+    def __init__(
+        self,
+        rules: typing.FrozenSet[str],
+        *,
+        instrument: Optional[str] = None,
+        observed: Optional[typing.Mapping[str, Tuple[str, ...]]] = None,
+    ) -> None:
+        self.rules = rules
+        # The name of the module when recording the types observed at each
+        # site for a profile (see `desugar.profile`).
+        self.instrument = instrument
+        # The types observed at each monomorphic site in a profile.
+        self.observed = observed or {}
+        self._counter = 0
+        self._pending: List[List[ast.stmt]] = []
+        self._scopes = ["module"]
+        self._classes: List[str] = []
+        # The temporaries created for the current top-level statement.
+        self.temporaries: Set[str] = set()
+        # The desugared literals to bind before the current top-level
+        # statement, and those bound before previous ones, for
+        # "hoist_literals" (and the tables of `match` statements).
+        self.literals: Dict[str, ast.expr] = {}
+        self.bound_literals: Set[str] = set()
+        # The types of the variables of the enclosing functions, for
+        # "specialize".
+        self._types: List[Dict[str, Optional[str]]] = []
+
+    def visit_top_level(self, statement: ast.stmt, /) -> List[ast.stmt]:
+        """Desugar a top-level statement of a module."""
+        # Restarting the numbering of temporaries keeps the output for a
+        # statement independent of what precedes it.
+        self._counter = 0
+        self.temporaries.clear()
+        self.literals = {}
+        return self._visit_block([statement])
+
+    def visit(self, node: ast.AST) -> Any:
+        if getattr(node, "_desugar_raw", False):
+            return self.generic_visit(node)
+        return super().visit(node)
+
+    def generic_visit(self, node: ast.AST) -> Any:
+        if isinstance(node, _COMPREHENSION_NODES):
+            self._scopes.append("comprehension")
+            try:
+                return self._visit_fields(node)
+            finally:
+                self._scopes.pop()
+        elif isinstance(node, ast.Lambda):
+            return self._visit_fields(node, "lambda")
+        elif isinstance(node, _FUNCTION_NODES):
+            coroutine = getattr(node, "_desugar_coroutine", False)
+            return self._visit_fields(node, "coroutine" if coroutine else "function")
+        elif isinstance(node, ast.ClassDef):
+            return self._visit_fields(node, "class")
+        else:
+            return self._visit_fields(node)
+
+    def _visit_fields(self, node: ast.AST, body_scope: Optional[str] = None) -> Any:
+        """Visit the fields of a node, with `body` in the specified scope."""
+        for field, old_value in ast.iter_fields(node):
+            if field in {"annotation", "returns"}:
+                continue  # Annotations may be kept as strings.
+            if field == "body" and body_scope is not None:
+                self._scopes.append(body_scope)
+                if body_scope == "class":
+                    self._classes.append(node.name)
+                else:
+                    self._types.append(_annotated_types(node))
+            try:
+                if isinstance(old_value, list):
+                    if old_value and isinstance(old_value[0], ast.stmt):
+                        docstring = field == "body" and isinstance(
+                            node, _DOCSTRING_NODES
+                        )
+                        old_value[:] = self._visit_block(old_value, docstring)
+                    else:
+                        new_values = []
+                        for value in old_value:
+                            if isinstance(value, ast.AST):
+                                value = self.visit(value)
+                            new_values.append(value)
+                        old_value[:] = new_values
+                elif isinstance(old_value, ast.AST):
+                    setattr(node, field, self.visit(old_value))
+            finally:
+                if field == "body" and body_scope is not None:
+                    self._scopes.pop()
+                    if body_scope == "class":
+                        self._classes.pop()
+                    else:
+                        self._types.pop()
+        return node
+
+    def _visit_block(
+        self, statements: List[ast.stmt], docstring: bool = False
+    ) -> List[ast.stmt]:
+        """Visit a block of statements, including any hoisted statements."""
+        result: List[ast.stmt] = []
+        for position, statement in enumerate(statements):
+            first = position == 0 and docstring
+            if first and _is_docstring(statement):
+                result.append(statement)
+                continue
+            elif (
+                "pass" in self.rules
+                and type(statement) is ast.Pass
+                and not getattr(statement, "_desugar_raw", False)
+                # A string as the first statement would become a docstring.
+                and not first
+            ):
+                statement = ast.copy_location(
+                    _raw(ast.Expr(_constant("pass"))), statement
+                )
+            self._pending.append([])
+            try:
+                new = self.visit(statement)
+            finally:
+                result.extend(self._pending.pop())
+            if isinstance(new, ast.AST):
+                result.append(new)
+            else:
+                result.extend(new)
+        return result
+
+    def _visit_statements(self, statements: List[ast.stmt]) -> List[ast.stmt]:
+        """Visit statements replacing the one currently being visited."""
+        result = []
+        for statement in statements:
+            new = self.visit(statement)
+            if isinstance(new, ast.AST):
+                result.append(new)
+            else:
+                result.extend(new)
+        return result
+
+    def _hoist(self, statements: List[ast.stmt]) -> None:
+        """Execute the statements before the statement being visited."""
+        self._pending[-1].extend(statements)
+
+    def _temp(self, kind: str) -> str:
+        """Create a name for a temporary."""
+        name = f"_{kind}_{self._counter}"
+        self._counter += 1
+        self.temporaries.add(name)
+        return name
+
+    @property
+    def _scope(self) -> str:
+        return self._scopes[-1]
+
+    def _can_bind(self) -> bool:
+        """Check if an assignment expression may be used."""
+        return self._scope in _BINDING_SCOPES
+
+    def _mangle(self, name: str) -> str:
+        """Mangle a private name as the compiler would in the current class."""
+        # Python/compile.c:_Py_Mangle
+        if (
+            not self._classes
+            or not name.startswith("__")
+            or name.endswith("__")
+            or "." in name
+        ):
+            return name
+        class_name = self._classes[-1].lstrip("_")
+        return f"_{class_name}{name}" if class_name else name
+
+    def _await_function(self) -> str:
+        """Return the name of the function awaits are desugared to."""
+        if "flat_await" in self.rules:
+            return "_desugar_builtins._await_flat"
+        return "_desugar_builtins._await"
+
+    def _awaited(self, expression: str) -> str:
+        """Create the source for awaiting an expression in the current scope."""
+        if self._scope == "coroutine":
+            return f"(yield from {self._await_function()}({expression}))"
+        else:
+            return f"(await {expression})"
+
+    def _type(self, node: ast.expr) -> Optional[str]:
+        """Return the name of the type an expression is expected to have."""
+        if isinstance(node, ast.Constant):
+            # Not `isinstance()`, as `bool` is a subclass of `int`.
+            return _SPECIALIZED_TYPES.get(type(node.value))
+        elif isinstance(node, ast.Name):
+            for types in reversed(self._types):
+                if node.id in types:
+                    return types[node.id]
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+            if node.func.id == "len":
+                return "int"
+            elif node.func.id in _SPECIALIZED_TYPES.values():
+                return node.func.id
+        elif isinstance(node, ast.UnaryOp):
+            if isinstance(node.op, (ast.UAdd, ast.USub)):
+                operand = self._type(node.operand)
+                return operand if operand in {"int", "float"} else None
+        elif isinstance(node, ast.BinOp):
+            name = _BINARY_OPERATORS[type(node.op)]
+            specialization = _specialization(
+                name, self._type(node.left), self._type(node.right)
+            )
+            if specialization is not None:
+                return specialization[3]
+        return None
+
+    def _site(self, node: ast.AST) -> Optional[str]:
+        """Identify where in the module's source a node is, for profiling."""
+        if getattr(node, "end_col_offset", None) is None:
+            return None  # Generated rather than from the source.
+        return (
+            f"{node.lineno}:{node.col_offset}"  # type: ignore[attr-defined]
+            f":{node.end_lineno}:{node.end_col_offset}"  # type: ignore[attr-defined]
+        )
+
+    def _record(
+        self, function: str, node: ast.AST, *args: ast.expr
+    ) -> Optional[ast.expr]:
+        """Create a call recording the types observed at a site (when
+        instrumenting for a profile)."""
+        site = self._site(node)
+        if self.instrument is None or site is None:
+            return None
+        site = f"{self.instrument}:{site}"
+        return _call(f"_desugar_profile.{function}", _constant(site), *args)
+
+    def _guarded(
+        self,
+        operands: List[ast.expr],
+        types: List[str],
+        fast: typing.Callable[..., ast.expr],
+        generic: typing.Callable[..., ast.expr],
+    ) -> Optional[ast.expr]:
+        """Create `FAST if type(a) is T and ... else GENERIC` from the operands
+        and their expected types, evaluating each operand once and in order,
+        or return `None` if that is impossible in the current scope."""
+        # Unless all operands are names (or literals) they are bound to
+        # temporaries.
+        bind = not all(
+            isinstance(operand, (ast.Name, ast.Constant)) for operand in operands
+        )
+        if bind and not self._can_bind():
+            return None
+        guards: List[ast.expr] = []
+        values = []
+        for operand, type_ in zip(operands, types):
+            if isinstance(operand, ast.Constant):
+                values.append(operand)  # Its type is certain.
+                continue
+            if bind:
+                temp = self._temp("operand")
+                evaluated = _raw(ast.NamedExpr(_name(temp, ast.Store()), operand))
+                values.append(_name(temp))
+            else:
+                evaluated, operand = operand, copy.deepcopy(operand)
+                values.append(operand)
+            guards.append(
+                _expression(
+                    f"_builtins.type(OPERAND) is _builtins.{type_}", OPERAND=evaluated
+                )
+            )
+        specialized = fast(*[copy.deepcopy(value) for value in values])
+        if not guards:
+            return specialized
+        elif len(guards) == 1:
+            guard = guards[0]
+        elif bind:
+            # Unlike `and`, `&` evaluates both operands.
+            guard = _raw(ast.BinOp(guards[0], ast.BitAnd(), guards[1]))
+        else:
+            guard = _raw(ast.BoolOp(ast.And(), guards))
+        return _raw(ast.IfExp(guard, specialized, generic(*values)))
+
+    def _specialize(
+        self,
+        node: ast.AST,
+        name: str,
+        left: ast.expr,
+        right: ast.expr,
+        generic: typing.Callable[[ast.expr, ast.expr], ast.expr],
+    ) -> Optional[ast.expr]:
+        """Create an expression calling the method of an operator's operands'
+        types directly if they have the expected types, e.g.
+        `int.__add__(a, b) if type(a) is int and type(b) is int else
+        operator.__add__(a, b)`, or return `None` if there is no
+        specialization of the operator for those types.
+
+        With "specialize", the operands are hinted to be `int`, `float` or
+        `str` by a literal, a call of the type, or annotations on the
+        parameters and local variables of the enclosing functions. The hints
+        only affect speed and never the result, as the generic operator is
+        called when the operands are not exactly of those types, so
+        annotations need not be accurate. The types observed in a profile take
+        precedence over those hinted by the source.
+
+        """
+        site = self._site(node)
+        if site is not None and site in self.observed:
+            types = list(self.observed[site])
+        elif "specialize" in self.rules:
+            types = [self._type(left), self._type(right)]
+        else:
+            return None
+        specialization = _specialization(name, *types)
+        if specialization is None:
+            return None
+        owner, method, swapped, _ = specialization
+
+        def fast(*arguments: ast.expr) -> ast.expr:
+            if swapped:
+                arguments = arguments[::-1]
+            return _call(f"_builtins.{owner}.{method}", *arguments)
+
+        return self._guarded([left, right], types, fast, generic)
+
+    # Expressions ############################################################
+
+    def visit_Attribute(self, node: ast.Attribute) -> Any:
+        if "attribute" in self.rules and isinstance(node.ctx, ast.Load):
+            attr = self._mangle(node.attr)
+            call = self._record("attribute", node, node.value, _constant(attr))
+            site = self._site(node)
+            observed = self.observed.get(site, ()) if site is not None else ()
+            # Looking up an attribute of a built-in type natively is safe.
+            if call is None and len(observed) == 1 and _is_builtin(observed[0]):
+                call = self._guarded(
+                    [node.value],
+                    list(observed),
+                    lambda obj: _call("_builtins.getattr", obj, _constant(attr)),
+                    lambda obj: _call(
+                        "_desugar_builtins.getattr", obj, _constant(attr)
+                    ),
+                )
+            if call is None:
+                call = _call("_desugar_builtins.getattr", node.value, _constant(attr))
+            return self.visit(ast.copy_location(call, node))
+        return self.generic_visit(node)
+
+    def visit_BinOp(self, node: ast.BinOp) -> Any:
+        if "binary" in self.rules:
+            name = _BINARY_OPERATORS[type(node.op)]
+            method = f"_desugar_operator.__{name}__"
+            call = (
+                self._record("binary", node, _expression(method), node.left, node.right)
+                or self._specialize(
+                    node,
+                    name,
+                    node.left,
+                    node.right,
+                    lambda left, right: _call(method, left, right),
+                )
+                or _call(method, node.left, node.right)
+            )
+            return self.visit(ast.copy_location(call, node))
+        return self.generic_visit(node)
+
+    def visit_UnaryOp(self, node: ast.UnaryOp) -> Any:
+        if "unary" in self.rules:
+            name = _UNARY_OPERATORS[type(node.op)]
+            call = _call(f"_desugar_operator.{name}", node.operand)
+            return self.visit(ast.copy_location(call, node))
+        return self.generic_visit(node)
+
+    def _comparison(self, op: ast.cmpop, left: ast.expr, right: ast.expr) -> ast.expr:
+        if isinstance(op, ast.In):
+            return _call("_desugar_operator.__contains__", right, left)
+        elif isinstance(op, ast.NotIn):
+            contains = _call("_desugar_operator.__contains__", right, left)
+            return _call("_desugar_operator.not_", contains)
+        else:
+            return _call(f"_desugar_operator.{_COMPARISONS[type(op)]}", left, right)
+
+    def visit_Compare(self, node: ast.Compare) -> Any:
+        if "comparison" not in self.rules:
+            return self.generic_visit(node)
+        elif len(node.ops) == 1:
+            op = node.ops[0]
+            left, right = node.left, node.comparators[0]
+            comparison = None
+            # `is`, `in` et al. have no specialization.
+            name = _COMPARISONS.get(type(op), "").strip("_")
+            if name in _REFLECTED_COMPARISONS:
+                method = _expression(f"_desugar_operator.__{name}__")
+                comparison = self._record(
+                    "binary", node, method, left, right
+                ) or self._specialize(
+                    node,
+                    name,
+                    left,
+                    right,
+                    lambda left, right: self._comparison(op, left, right),
+                )
+            if comparison is None:
+                comparison = self._comparison(op, left, right)
+            return self.visit(ast.copy_location(comparison, node))
+        elif not self._can_bind():
+            return self.generic_visit(node)
+        # `a < b < c` ➠ `a < (_temp := b) and _temp < c`
+        comparisons = []
+        left = node.left
+        last = len(node.ops) - 1
+        for position, (op, right) in enumerate(zip(node.ops, node.comparators)):
+            if position < last:
+                temp = self._temp("compare")
+                right = _raw(ast.NamedExpr(_name(temp, ast.Store()), right))
+                next_left = _name(temp)
+            comparisons.append(self._comparison(op, left, right))
+            left = next_left
+        return self.visit(ast.copy_location(ast.BoolOp(ast.And(), comparisons), node))
+
+    def visit_BoolOp(self, node: ast.BoolOp) -> Any:
+        if "boolean" not in self.rules or not self._can_bind():
+            return self.generic_visit(node)
+        first, *rest = node.values
+        if len(rest) == 1:
+            remainder = rest[0]
+        else:
+            remainder = ast.copy_location(ast.BoolOp(node.op, rest), node)
+        if isinstance(node.op, ast.Or):
+            template = "TEMP if (TEMP := FIRST) else REST"
+        else:
+            template = "TEMP if not (TEMP := FIRST) else REST"
+        temp = self._temp("temp")
+        expression = _expression(template, TEMP=temp, FIRST=first, REST=remainder)
+        return self.visit(ast.copy_location(expression, node))
+
+    def _literal(self, value: Any, literal: ast.expr) -> ast.expr:
+        """Bind the desugared form of a literal to a module-level name (if it
+        has not been already), returning a reference to it.
+
+        With "hoist_literals", the binding comes before the top-level
+        statement using the literal (or slice of literals), so e.g. a string in
+        a loop is not rebuilt from its bytes on every iteration. The name is
+        derived from the value, so a literal used by several statements is
+        only bound once (except by `Incremental`, where each statement binds
+        the literals it uses so it can be reused on its own).
+
+        """
+        return self._bind("literal", repr((type(value).__name__, value)), literal)
+
+    def _bind(self, kind: str, key: str, expression: ast.expr) -> ast.expr:
+        """Bind an expression to a module-level name derived from a key (if it
+        has not been already), returning a reference to it."""
+        digest = hashlib.blake2b(
+            key.encode("utf-8", "backslashreplace"), digest_size=6
+        ).hexdigest()
+        name = f"_{kind}_{digest}"
+        if name not in self.bound_literals:
+            self.literals.setdefault(name, expression)
+        return _name(name)
+
+    def _slice_call(self, node: ast.Slice) -> ast.expr:
+        parts = [
+            _constant(None) if part is None else part
+            for part in (node.lower, node.upper, node.step)
+        ]
+        call = ast.copy_location(_call("_builtins.slice", *parts), node)
+        if "hoist_literals" in self.rules and all(
+            isinstance(part, ast.Constant) for part in parts
+        ):
+            value = slice(*(part.value for part in parts))
+            return self._literal(value, self.visit(call))
+        return call
+
+    def _index(self, index: ast.expr) -> ast.expr:
+        """Convert any slices in a subscription into slice objects."""
+        if isinstance(index, ast.Slice):
+            return self._slice_call(index)
+        elif isinstance(index, ast.Tuple):
+            index.elts = [
+                self._slice_call(element) if isinstance(element, ast.Slice) else element
+                for element in index.elts
+            ]
+        return index
+
+    def visit_Subscript(self, node: ast.Subscript) -> Any:
+        if "subscript" in self.rules and isinstance(node.ctx, ast.Load):
+            call = _call(
+                "_desugar_operator.__getitem__", node.value, self._index(node.slice)
+            )
+            return self.visit(ast.copy_location(call, node))
+        return self.generic_visit(node)
+
+    def visit_Slice(self, node: ast.Slice) -> Any:
+        if "slice" in self.rules:
+            return self.visit(self._slice_call(node))
+        return self.generic_visit(node)
+
+    def visit_Constant(self, node: ast.Constant) -> Any:
+        if "literal" not in self.rules:
+            return node
+        value = node.value
+        if value is None:
+            literal = _call("_None")
+        elif value is True or value is False:
+            literal = _call("_builtins.bool", _constant(int(value)))
+        elif isinstance(value, str):
+            try:
+                encoded = value.encode("utf-8")
+            except UnicodeEncodeError:  # Lone surrogates.
+                return node
+            data = _call("_tuple", *map(_constant, encoded))
+            decode = _raw(
+                ast.Attribute(_call("_builtins.bytes", data), "decode", ast.Load())
+            )
+            literal = _raw(ast.Call(decode, [_constant("utf-8")], []))
+        elif isinstance(value, bytes):
+            literal = _call("_builtins.bytes", _call("_tuple", *map(_constant, value)))
+        elif isinstance(value, complex):
+            real, imag = _constant(value.real), _constant(value.imag)
+            literal = _call("_builtins.complex", real, imag)
+        elif value is Ellipsis:
+            literal = _expression("_builtins.Ellipsis")
+        else:
+            return node
+        if "hoist_literals" in self.rules:
+            literal = self._literal(value, literal)
+        return ast.copy_location(literal, node)
+
+    def visit_JoinedStr(self, node: ast.JoinedStr) -> Any:
+        # The literal parts of an f-string must stay as they are.
+        for value in node.values:
+            if isinstance(value, ast.FormattedValue):
+                value.value = self.visit(value.value)
+                if value.format_spec is not None:
+                    self.visit_JoinedStr(value.format_spec)
+        return node
+
+    def _display(self, node: ast.expr, type_: Optional[str], elements: List[ast.expr]):
+        """Create the call for a display."""
+        call = _call("_tuple", *elements)
+        if type_ is not None:
+            call = _call(f"_builtins.{type_}", call)
+        return self.visit(ast.copy_location(call, node))
+
+    def visit_List(self, node: ast.List) -> Any:
+        if "display" in self.rules and isinstance(node.ctx, ast.Load):
+            return self._display(node, "list", node.elts)
+        return self.generic_visit(node)
+
+    def visit_Set(self, node: ast.Set) -> Any:
+        if "display" in self.rules:
+            return self._display(node, "set", node.elts)
+        return self.generic_visit(node)
+
+    def visit_Tuple(self, node: ast.Tuple) -> Any:
+        if (
+            "display" in self.rules
+            and isinstance(node.ctx, ast.Load)
+            # A slice is only valid directly in a subscription.
+            and (
+                "slice" in self.rules
+                or not any(isinstance(element, ast.Slice) for element in node.elts)
+            )
+        ):
+            return self._display(node, None, node.elts)
+        return self.generic_visit(node)
+
+    def visit_Dict(self, node: ast.Dict) -> Any:
+        if "display" in self.rules and None not in node.keys:
+            pairs = [
+                _call("_tuple", key, value)
+                for key, value in zip(node.keys, node.values)
+            ]
+            return self._display(node, "dict", pairs)
+        return self.generic_visit(node)
+
+    def _fused_comprehension(
+        self, node: Union[ast.ListComp, ast.SetComp, ast.DictComp], type_: str
+    ) -> Any:
+        """Create a function building the result of a comprehension in a loop.
+
+        With "fused_comprehension", a list, set or dict comprehension becomes
+        a call of a function defined just before the statement containing it,
+        which adds each element to the result via the result's pre-bound
+        `append()`, `add()` or `__setitem__()` instead of consuming a
+        generator expression. As with a comprehension, the loop variables are
+        local to the function and the first iterable is evaluated in the
+        enclosing scope. It applies where the "lambda" rule would be able to
+        define a function, and not to comprehensions containing `await` or an
+        assignment expression (which binds in the enclosing scope).
+
+        """
+        name = self._temp("comprehension")
+        iterable, result, add = (
+            self._temp(kind) for kind in ("iterable", "result", "add")
+        )
+        if isinstance(node, ast.DictComp):
+            method, elements = "__setitem__", [node.key, node.value]
+        else:
+            method, elements = ("append" if type_ == "list" else "add"), [node.elt]
+        body: List[ast.stmt] = [
+            _raw(ast.Expr(_raw(ast.Call(_name(add), elements, []))))
+        ]
+        for position in reversed(range(len(node.generators))):
+            generator = node.generators[position]
+            for condition in reversed(generator.ifs):
+                body = [_raw(ast.If(condition, body, []))]
+            iter_ = _name(iterable) if position == 0 else generator.iter
+            body = [_raw(ast.For(generator.target, iter_, body, [], None))]
+        function, *_ = _statements(
+            f"""
+            def NAME():
+                RESULT = _builtins.{type_}()
+                ADD = RESULT.{method}
+                LOOP
+                return RESULT
+            """,
+            RESULT=result,
+            ADD=add,
+            LOOP=body,
+        )
+        function.name = name
+        function.args = ast.arguments([], [ast.arg(iterable)], None, [], [], None, [])
+        self._hoist([self.visit(function)])
+        call = _call(name, node.generators[0].iter)
+        return self.visit(ast.copy_location(call, node))
+
+    def _comprehension(self, node: ast.expr, type_: str, element: ast.expr) -> Any:
+        if (
+            "fused_comprehension" in self.rules
+            and self._scope in _HOISTING_SCOPES
+            and not any(
+                isinstance(child, (ast.Await, ast.NamedExpr))
+                or (isinstance(child, ast.comprehension) and child.is_async)
+                for child in ast.walk(node)
+            )
+        ):
+            return self._fused_comprehension(node, type_)
+        elif "comprehension" not in self.rules or any(
+            isinstance(child, ast.Await)
+            or (isinstance(child, ast.comprehension) and child.is_async)
+            for child in ast.walk(node)
+        ):
+            return self.generic_visit(node)
+        generator = _raw(ast.GeneratorExp(element, node.generators))
+        call = _call(f"_builtins.{type_}", ast.copy_location(generator, node))
+        return self.visit(ast.copy_location(call, node))
+
+    def visit_ListComp(self, node: ast.ListComp) -> Any:
+        return self._comprehension(node, "list", node.elt)
+
+    def visit_SetComp(self, node: ast.SetComp) -> Any:
+        return self._comprehension(node, "set", node.elt)
+
+    def visit_DictComp(self, node: ast.DictComp) -> Any:
+        return self._comprehension(node, "dict", _call("_tuple", node.key, node.value))
+
+    def visit_Lambda(self, node: ast.Lambda) -> Any:
+        defaults = [*node.args.defaults, *filter(None, node.args.kw_defaults)]
+        if (
+            "lambda" not in self.rules
+            or self._scope not in _HOISTING_SCOPES
+            # Defaults would be evaluated early.
+            or not all(isinstance(default, ast.Constant) for default in defaults)
+        ):
+            return self.generic_visit(node)
+        name = self._temp("lambda")
+        function, rename = _statements(
+            """
+            def NAME():
+                return BODY
+            NAME.__name__ = "<lambda>"
+            """,
+            NAME=name,
+            BODY=node.body,
+        )
+        function.name = name
+        function.args = node.args
+        self._hoist([self.visit(function), rename])
+        return ast.copy_location(_name(name), node)
+
+    def visit_Await(self, node: ast.Await) -> Any:
+        """Desugar `await` in a coroutine converted by "async_def".
+
+        With "flat_await", `_await_flat()` is awaited through instead of
+        `_await()`, so when the coroutine is run by `trampoline()` each
+        resumption costs the same however deeply the awaits are nested (and
+        the awaits delegate as usual otherwise).
+
+        """
+        if self._scope == "coroutine":
+            call = _call(self._await_function(), node.value)
+            return self.visit(ast.copy_location(_raw(ast.YieldFrom(call)), node))
+        return self.generic_visit(node)
+
+    # Statements #############################################################
+
+    def visit_Assign(self, node: ast.Assign) -> Any:
+        target, *others = node.targets
+        if (
+            "subscript" in self.rules
+            and not others
+            and isinstance(target, ast.Subscript)
+        ):
+            value = node.value
+            statements = []
+            # The value is evaluated before the container and index.
+            if not isinstance(value, (ast.Constant, ast.Name)):
+                temp = self._temp("value")
+                statements.extend(_statements("TEMP = VALUE", TEMP=temp, VALUE=value))
+                value = _name(temp)
+            call = _call(
+                "_desugar_operator.__setitem__",
+                target.value,
+                self._index(target.slice),
+                value,
+            )
+            statements.append(ast.copy_location(_raw(ast.Expr(call)), node))
+            return self._visit_statements(statements)
+        return self.generic_visit(node)
+
+    def visit_AugAssign(self, node: ast.AugAssign) -> Any:
+        if "augmented" not in self.rules:
+            return self.generic_visit(node)
+        method = f"_desugar_operator.__i{_BINARY_OPERATORS[type(node.op)]}__"
+        target = node.target
+        statements = []
+        # An assignment evaluates its target after the value, unlike the
+        # arguments of `__setitem__()`, so a name in the target is read again
+        # after the value is evaluated, which may rebind it.
+        reread = isinstance(target, ast.Attribute) or "subscript" not in self.rules
+        rebinds = not isinstance(node.value, (ast.Constant, ast.Name))
+
+        def temp_for(expression: ast.expr, kind: str) -> ast.Name:
+            """Evaluate an expression once, unless it is side effect-free."""
+            if isinstance(expression, ast.Constant) or (
+                isinstance(expression, ast.Name) and not (reread and rebinds)
+            ):
+                return expression
+            temp = self._temp(kind)
+            statements.extend(_statements("TEMP = VALUE", TEMP=temp, VALUE=expression))
+            return _name(temp)
+
+        if isinstance(target, ast.Name):
+            current = _name(target.id)
+            store = target
+        elif isinstance(target, ast.Attribute):
+            obj = temp_for(target.value, "object")
+            current = ast.Attribute(copy.copy(obj), target.attr, ast.Load())
+            store = _raw(ast.Attribute(copy.copy(obj), target.attr, ast.Store()))
+        else:
+            container = temp_for(target.value, "container")
+            index = temp_for(self._index(target.slice), "index")
+            current = ast.Subscript(copy.copy(container), copy.copy(index), ast.Load())
+            if "subscript" in self.rules:
+                store = None
+            else:
+                store = _raw(ast.Subscript(container, index, ast.Store()))
+        value = None
+        if isinstance(target, ast.Name):
+            # Immutable types implement augmented assignment with the binary
+            # operator.
+            value = self._record(
+                "binary", node, _expression(method), current, node.value
+            ) or self._specialize(
+                node,
+                _BINARY_OPERATORS[type(node.op)],
+                current,
+                node.value,
+                lambda current, value: _call(method, current, value),
+            )
+        if value is None:
+            value = _call(method, ast.copy_location(current, node), node.value)
+        if store is None:
+            call = _call("_desugar_operator.__setitem__", container, index, value)
+            statement = _raw(ast.Expr(call))
+        else:
+            statement = _raw(ast.Assign([store], value))
+        statements.append(ast.copy_location(statement, node))
+        return self._visit_statements(statements)
+
+    def visit_Delete(self, node: ast.Delete) -> Any:
+        targets = []
+        todo = list(reversed(node.targets))
+        while todo:
+            target = todo.pop()
+            if isinstance(target, (ast.Tuple, ast.List)):
+                todo.extend(reversed(target.elts))
+            else:
+                targets.append(target)
+        statements = []
+        changed = False
+        for target in targets:
+            if "subscript" in self.rules and isinstance(target, ast.Subscript):
+                call = _call(
+                    "_desugar_operator.__delitem__",
+                    target.value,
+                    self._index(target.slice),
+                )
+                statements.append(_raw(ast.Expr(call)))
+                changed = True
+            elif (
+                "del" in self.rules
+                and isinstance(target, ast.Name)
+                and self._scope == "module"
+            ):
+                statements.extend(
+                    _statements(
+                        """
+                        try:
+                            _builtins.getattr(_builtins.globals(), "__delitem__")(NAME)
+                        except _builtins.KeyError:
+                            raise _builtins.NameError(MESSAGE) from None
+                        """,
+                        NAME=_constant(target.id),
+                        MESSAGE=_constant(f"name {target.id!r} is not defined"),
+                    )
+                )
+                changed = True
+            else:
+                statements.append(_raw(ast.Delete([target])))
+        if not changed:
+            return self.generic_visit(node)
+        for statement in statements:
+            ast.copy_location(statement, node)
+        return self._visit_statements(statements)
+
+    def visit_Assert(self, node: ast.Assert) -> Any:
+        if "assert" not in self.rules:
+            return self.generic_visit(node)
+        if node.msg is None:
+            template = """
+                if __debug__:
+                    if not TEST:
+                        raise _builtins.AssertionError
+                """
+        else:
+            template = """
+                if __debug__:
+                    if not TEST:
+                        raise _builtins.AssertionError(MESSAGE)
+                """
+        statements = _statements(template, TEST=node.test, MESSAGE=node.msg)
+        return self._visit_statements(
+            [ast.copy_location(statement, node) for statement in statements]
+        )
+
+    def visit_Raise(self, node: ast.Raise) -> Any:
+        if "raise_from" not in self.rules or node.cause is None:
+            return self.generic_visit(node)
+        statements = _statements(
+            """
+            RAISE = EXCEPTION
+            if _builtins.isinstance(RAISE, _builtins.type) and _builtins.issubclass(RAISE, _builtins.BaseException):
+                RAISE = RAISE()
+            elif not _builtins.isinstance(RAISE, _builtins.BaseException):
+                raise _builtins.TypeError("exceptions must derive from BaseException")
+            FROM = CAUSE
+            if _builtins.isinstance(FROM, _builtins.type) and _builtins.issubclass(FROM, _builtins.BaseException):
+                FROM = FROM()
+            RAISE.__cause__ = FROM
+            raise RAISE
+            """,
+            RAISE=self._temp("raise"),
+            EXCEPTION=node.exc,
+            FROM=self._temp("from"),
+            CAUSE=node.cause,
+        )
+        return self._visit_statements(
+            [ast.copy_location(statement, node) for statement in statements]
+        )
+
+    def visit_Import(self, node: ast.Import) -> Any:
+        if "import" not in self.rules:
+            return self.generic_visit(node)
+        statements = []
+        for alias in node.names:
+            module = _call(
+                "_builtins.__import__",
+                _constant(alias.name),
+                _call("_builtins.globals"),
+                _call("_builtins.locals"),
+                _constant(None),
+                _constant(0),
+            )
+            if alias.asname is None:
+                # `import a.b` binds `a`.
+                name = alias.name.partition(".")[0]
+            else:
+                # `import a.b as c` binds `a.b`.
+                name = alias.asname
+                for attribute in alias.name.split(".")[1:]:
+                    module = _call(
+                        "_desugar_builtins._import_from", module, _constant(attribute)
+                    )
+            statements.append(_raw(ast.Assign([_name(name, ast.Store())], module)))
+        return [ast.copy_location(statement, node) for statement in statements]
+
+    def visit_ImportFrom(self, node: ast.ImportFrom) -> Any:
+        if (
+            "import" not in self.rules
+            or node.module == "__future__"
+            or any(alias.name == "*" for alias in node.names)
+        ):
+            return self.generic_visit(node)
+        temp = self._temp("module")
+        fromlist = _raw(
+            ast.Tuple([_constant(alias.name) for alias in node.names], ast.Load())
+        )
+        module = _call(
+            "_builtins.__import__",
+            _constant(node.module or ""),
+            _call("_builtins.globals"),
+            _call("_builtins.locals"),
+            fromlist,
+            _constant(node.level),
+        )
+        statements = [_raw(ast.Assign([_name(temp, ast.Store())], module))]
+        for alias in node.names:
+            name = _constant(self._mangle(alias.name))
+            value = _call("_desugar_builtins._import_from", _name(temp), name)
+            target = _name(alias.asname or alias.name, ast.Store())
+            statements.append(_raw(ast.Assign([target], value)))
+        statements.append(_raw(ast.Delete([_name(temp, ast.Del())])))
+        return [ast.copy_location(statement, node) for statement in statements]
+
+    def _definition(
+        self, node: Union[ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef]
+    ) -> Any:
+        """Apply decorators after the definition."""
+        if "decorator" not in self.rules or not node.decorator_list:
+            return self.generic_visit(node)
+        # Decorators are evaluated before the definition.
+        names = [self._temp("decorator") for _ in node.decorator_list]
+        statements: List[ast.stmt] = [
+            _raw(ast.Assign([_name(name, ast.Store())], decorator))
+            for name, decorator in zip(names, node.decorator_list)
+        ]
+        node.decorator_list = []
+        decorated: ast.expr = _name(node.name)
+        for name in reversed(names):
+            decorated = _raw(ast.Call(_name(name), [decorated], []))
+        statements.append(_raw(node))
+        statements.append(_raw(ast.Assign([_name(node.name, ast.Store())], decorated)))
+        statements.append(_raw(ast.Delete([_name(name, ast.Del()) for name in names])))
+        return self._visit_statements(
+            [ast.copy_location(statement, node) for statement in statements]
+        )
+
+    def visit_FunctionDef(self, node: ast.FunctionDef) -> Any:
+        return self._definition(node)
+
+    def visit_ClassDef(self, node: ast.ClassDef) -> Any:
+        return self._definition(node)
+
+    def _coroutine_convertible(self, node: ast.AsyncFunctionDef) -> bool:
+        """Check if an `async def` can become a generator-based coroutine."""
+        for child in _own_scope(node.body):
+            if isinstance(child, (ast.Yield, ast.YieldFrom)):
+                return False  # An async generator.
+            elif isinstance(child, ast.AsyncFor):
+                if "async_for" not in self.rules:
+                    return False
+            elif isinstance(child, ast.AsyncWith):
+                if "async_with" not in self.rules or _jumps(child.body):
+                    return False
+            elif isinstance(child, _COMPREHENSION_NODES):
+                for grandchild in ast.walk(child):
+                    if isinstance(grandchild, ast.Await) or (
+                        isinstance(grandchild, ast.comprehension)
+                        and grandchild.is_async
+                    ):
+                        return False
+        return True
+
+    def visit_AsyncFunctionDef(self, node: ast.AsyncFunctionDef) -> Any:
+        if "async_def" not in self.rules or not self._coroutine_convertible(node):
+            return self._definition(node)
+        function = ast.copy_location(
+            ast.FunctionDef(**{field: getattr(node, field) for field in node._fields}),
+            node,
+        )
+        function._desugar_coroutine = True
+        function.decorator_list.append(_expression("_desugar_builtins._coroutine"))
+        if not any(
+            isinstance(child, (ast.Await, ast.AsyncFor, ast.AsyncWith))
+            for child in _own_scope(function.body)
+        ):
+            # Without a `yield` the function would not be a generator.
+            position = 1 if _is_docstring(function.body[0]) else 0
+            function.body[position:position] = _statements("yield from ()")
+        return self.visit(function)
+
+    def _loop(self, node: Union[ast.For, ast.AsyncFor, ast.While]) -> Any:
+        if "flags" in self.rules:
+            flagged = self._flag_loop(node)
+            if flagged is not None:
+                return flagged
+        body, orelse = node.body, node.orelse
+        owned = list(_loop_control(body))
+        safe = not any(protected for _, _, protected in owned)
+        has_break = any(
+            isinstance(block[index], ast.Break) for block, index, _ in owned
+        )
+        has_continue = any(
+            isinstance(block[index], ast.Continue) for block, index, _ in owned
+        )
+        if has_continue and safe and "continue" in self.rules:
+            _replace_loop_control(body, ast.Continue, "raise _ContinueStatement")
+            body = _statements(
+                """
+                try:
+                    BODY
+                except _ContinueStatement:
+                    pass
+                """,
+                BODY=body,
+            )
+        catch_break = False
+        trailing: List[ast.stmt] = []
+        if "break" in self.rules:
+            if has_break:
+                if safe:
+                    _replace_loop_control(body, ast.Break, "raise _BreakStatement")
+                    catch_break = True
+            elif orelse:
+                # Without a `break` the `else` clause always runs.
+                trailing, orelse = orelse, []
+
+        # With `break` desugared, `else` moves to the `try` catching it.
+        loop_orelse = [] if catch_break else orelse
+        if isinstance(node, ast.For) and "for" in self.rules:
+            loop = self._for(node, body, loop_orelse, False)
+        elif isinstance(node, ast.AsyncFor) and "async_for" in self.rules:
+            loop = self._for(node, body, loop_orelse, True)
+        else:
+            node.body = body
+            node.orelse = loop_orelse
+            loop = [_raw(node)]
+
+        if catch_break:
+            if orelse:
+                template = """
+                    try:
+                        LOOP
+                    except _BreakStatement:
+                        pass
+                    else:
+                        ORELSE
+                    """
+            else:
+                template = """
+                    try:
+                        LOOP
+                    except _BreakStatement:
+                        pass
+                    """
+            statements = _statements(template, LOOP=loop, ORELSE=orelse)
+        else:
+            statements = loop
+        statements.extend(trailing)
+        return self._visit_statements(
+            [ast.copy_location(statement, node) for statement in statements]
+        )
+
+    def _flag_loop(self, node: Union[ast.For, ast.AsyncFor, ast.While]) -> Any:
+        """Desugar `break`, `continue` and `else` on a loop using flags, or
+        return `None` if that is not possible.
+
+        With "flags", instead of raising and catching an exception (which is
+        slow, and may happen on every iteration of a loop), flags are set and
+        checked by the condition of a `while` loop; `if` becomes a `while`
+        loop run at most once in the same way. A `break` or `continue` is
+        unravelled even within `with` or an exception handler catching
+        `BaseException` (but not within `finally`, where it would also discard
+        any exception being raised), while `break` and `continue` in a `for`
+        loop which is not unravelled into a `while` loop still raise an
+        exception.
+
+        """
+        if _jumps_from_finally(node.body):
+            return None  # The jump would discard any exception being raised.
+        if isinstance(node, ast.While):
+            statements = self._flag_while(node)
+        else:
+            is_async = isinstance(node, ast.AsyncFor)
+            if ("async_for" if is_async else "for") not in self.rules:
+                return None  # Flags cannot end a `for` loop.
+            statements = []
+            for statement in self._for(node, node.body, node.orelse, is_async):
+                if isinstance(statement, ast.While):
+                    statements.extend(self._flag_while(statement))
+                else:
+                    statements.append(statement)
+        return self._visit_statements(
+            [ast.copy_location(statement, node) for statement in statements]
+        )
+
+    def _flag_while(self, node: ast.While) -> List[ast.stmt]:
+        """Desugar `break`, `continue` and `else` on a `while` loop using flags.
+
+        The `break` in the `while` loop of a desugared `for` loop is left
+        as-is, as it is not in a loop of its own.
+
+        """
+        owned = [
+            block[index]
+            for block, index, _ in _loop_control(node.body)
+            if not getattr(block[index], "_desugar_raw", False)
+        ]
+        convert_break = "break" in self.rules and any(
+            isinstance(statement, ast.Break) for statement in owned
+        )
+        convert_continue = "continue" in self.rules and any(
+            isinstance(statement, ast.Continue) for statement in owned
+        )
+        # `running` is cleared by `break` to end the loop, `proceed` by either
+        # to skip the rest of the iteration.
+        running = self._temp("running") if convert_break else None
+        body: List[ast.stmt] = []
+        if convert_continue:
+            proceed = self._temp("proceed")
+            body.extend(_statements("PROCEED = True", PROCEED=proceed))
+        else:
+            proceed = running
+        if proceed is None:
+            body = node.body
+        else:
+            body.extend(self._flag_jumps(node.body, running, proceed))
+        statements: List[ast.stmt] = []
+        flags = [flag for flag in {running, proceed} if flag is not None]
+        if proceed is not None and proceed != running:
+            # Bound even if the loop never runs, so it can be deleted.
+            statements.extend(_statements("PROCEED = True", PROCEED=proceed))
+        test = node.test
+        orelse = node.orelse
+        trailing: List[ast.stmt] = []
+        if running is not None:
+            statements.extend(_statements("RUNNING = True", RUNNING=running))
+            if isinstance(test, ast.Constant) and test.value:
+                test = _name(running)
+            else:
+                test = _raw(ast.BoolOp(ast.And(), [_name(running), test]))
+            if orelse:
+                # The `else` clause runs unless the loop ended with `break`.
+                trailing, orelse = [ast.If(_name(running), orelse, [])], []
+        elif (
+            orelse
+            and "break" in self.rules
+            and not any(isinstance(statement, ast.Break) for statement in owned)
+        ):
+            # Without a `break` the `else` clause always runs.
+            trailing, orelse = orelse, []
+        statements.append(_raw(ast.While(test, body, orelse)))
+        statements.extend(trailing)
+        if flags:
+            names = [_name(flag, ast.Del()) for flag in sorted(flags)]
+            statements.append(_raw(ast.Delete(names)))
+        return statements
+
+    def _flag_jumps(
+        self, statements: List[ast.stmt], running: Optional[str], proceed: str
+    ) -> List[ast.stmt]:
+        """Replace the `break` (if `running` is specified) and `continue`
+        statements applying to the loop with clearing flags, only executing
+        the statements which follow one if `proceed` is still set."""
+        result: List[ast.stmt] = []
+        for position, statement in enumerate(statements):
+            raw = getattr(statement, "_desugar_raw", False)
+            if isinstance(statement, ast.Break) and running is not None and not raw:
+                flags = [_name(running, ast.Store())]
+                if proceed != running:
+                    flags.append(_name(proceed, ast.Store()))
+                clear = _raw(ast.Assign(flags, _constant(False)))
+                # Anything after the `break` is unreachable.
+                result.append(ast.copy_location(clear, statement))
+                return result
+            elif isinstance(statement, ast.Continue) and proceed != running and not raw:
+                clear = _raw(
+                    ast.Assign([_name(proceed, ast.Store())], _constant(False))
+                )
+                result.append(ast.copy_location(clear, statement))
+                return result
+            jumps = False
+            if isinstance(statement, _LOOP_NODES):
+                blocks = [statement.orelse]
+            elif isinstance(statement, _SCOPE_NODES):
+                blocks = []
+            else:
+                blocks = list(_blocks(statement))
+            for block in blocks:
+                if any(True for _ in _loop_control(block)):
+                    block[:] = self._flag_jumps(block, running, proceed)
+                    jumps = True
+                    if (
+                        isinstance(statement, _TRY_NODES)
+                        and block is statement.body
+                        and statement.orelse
+                    ):
+                        # `else` only runs if the body finished normally.
+                        guard = ast.If(_name(proceed), statement.orelse, [])
+                        statement.orelse = [ast.copy_location(guard, statement)]
+            result.append(statement)
+            if jumps:
+                rest = self._flag_jumps(statements[position + 1 :], running, proceed)
+                if rest:
+                    guard = ast.If(_name(proceed), rest, [])
+                    result.append(ast.copy_location(guard, rest[0]))
+                return result
+        return result
+
+    def _for(
+        self,
+        node: Union[ast.For, ast.AsyncFor],
+        body: List[ast.stmt],
+        orelse: List[ast.stmt],
+        is_async: bool,
+    ) -> List[ast.stmt]:
+        """Desugar `for` or `async for` into `while`."""
+        if is_async:
+            iterator = "_desugar_builtins.aiter(ITERABLE)"
+            next_item = self._awaited("_desugar_builtins.anext(ITER)")
+            stop = "_builtins.StopAsyncIteration"
+        else:
+            iterator = "_desugar_builtins.iter(ITERABLE)"
+            next_item = "_desugar_builtins.next(ITER)"
+            stop = "_builtins.StopIteration"
+            if (
+                "range" in self.rules
+                and isinstance(node.iter, ast.Call)
+                and isinstance(node.iter.func, ast.Name)
+                and node.iter.func.id == "range"
+            ):
+                return self._range(node, body, orelse)
+        if orelse and "flags" in self.rules:
+            # Leaving out the `continue` saves a flag.
+            template = f"""
+                ITER = {iterator}
+                LOOPING = True
+                while LOOPING:
+                    try:
+                        TARGET = {next_item}
+                    except {stop}:
+                        LOOPING = False
+                    else:
+                        BODY
+                else:
+                    ORELSE
+                del ITER, LOOPING
+                """
+        elif orelse:
+            template = f"""
+                ITER = {iterator}
+                LOOPING = True
+                while LOOPING:
+                    try:
+                        TARGET = {next_item}
+                    except {stop}:
+                        LOOPING = False
+                        continue
+                    else:
+                        BODY
+                else:
+                    ORELSE
+                del ITER, LOOPING
+                """
+        else:
+            template = f"""
+                ITER = {iterator}
+                while True:
+                    try:
+                        TARGET = {next_item}
+                    except {stop}:
+                        break
+                    else:
+                        BODY
+                del ITER
+                """
+        return _statements(
+            template,
+            ITER=self._temp("iter"),
+            LOOPING=self._temp("looping"),
+            ITERABLE=node.iter,
+            TARGET=node.target,
+            BODY=body,
+            ORELSE=orelse,
+        )
+
+    def _range(
+        self, node: ast.For, body: List[ast.stmt], orelse: List[ast.stmt]
+    ) -> List[ast.stmt]:
+        """Desugar a `for` loop over `range()` into a `while` loop which counts
+        unless `range` is not the built-in.
+
+        With "range", the loop counts up to the end of the range itself
+        instead of calling `next()` on an iterator (and catching
+        `StopIteration`) for each item. The call is evaluated as usual, and
+        only if its result is a `range` object is it iterated by counting;
+        otherwise the loop falls back on the iterator.
+
+        """
+        looping = self._temp("looping")
+        if "flags" in self.rules:
+            # Skipping the body instead of using `continue` keeps the loop
+            # control of the template out of the way of `_flag_jumps()`.
+            start, test, stop = "LOOPING = True", "LOOPING", "LOOPING = False"
+            body = _statements(
+                """
+                if LOOPING:
+                    BODY
+                """,
+                LOOPING=looping,
+                BODY=body,
+            )
+        elif orelse:
+            start, test, stop = "LOOPING = True", "LOOPING", "LOOPING = False; continue"
+        else:
+            start, test, stop = "", "True", "break"
+        return _statements(
+            f"""
+            RANGE = ITERABLE
+            if _builtins.type(RANGE) is _builtins.range:
+                ITER = None
+                COUNTER = RANGE.start
+                STEP = RANGE.step
+                END = RANGE[-1] + STEP if RANGE else COUNTER
+            else:
+                ITER = _desugar_builtins.iter(RANGE)
+                COUNTER = STEP = END = None
+            {start}
+            while {test}:
+                if ITER is None:
+                    if COUNTER == END:
+                        {stop}
+                    else:
+                        TARGET = COUNTER
+                        COUNTER += STEP
+                else:
+                    try:
+                        ANOTHER_TARGET = _desugar_builtins.next(ITER)
+                    except _builtins.StopIteration:
+                        {stop}
+                BODY
+            else:
+                ORELSE
+            del RANGE, ITER, COUNTER, STEP, END{", LOOPING" if start else ""}
+            """,
+            RANGE=self._temp("range"),
+            ITER=self._temp("iter"),
+            COUNTER=self._temp("counter"),
+            STEP=self._temp("step"),
+            END=self._temp("end"),
+            LOOPING=looping,
+            ITERABLE=node.iter,
+            TARGET=node.target,
+            ANOTHER_TARGET=copy.deepcopy(node.target),
+            BODY=body,
+            ORELSE=orelse,
+        )
+
+    visit_For = visit_AsyncFor = visit_While = _loop
+
+    def _with(self, node: Union[ast.With, ast.AsyncWith], is_async: bool) -> Any:
+        if ("async_with" if is_async else "with") not in self.rules or _jumps(
+            node.body
+        ):
+            return self.generic_visit(node)
+        item, *rest = node.items
+        if rest:
+            inner = type(node)(items=rest, body=node.body, type_comment=None)
+            body = [ast.copy_location(inner, node)]
+        else:
+            body = node.body
+        if is_async:
+            enter, exit = "__aenter__", "__aexit__"
+            awaited = self._awaited
+        else:
+            enter, exit = "__enter__", "__exit__"
+            awaited = str
+        assign = "" if item.optional_vars is None else "TARGET = "
+        template = f"""
+            MANAGER = EXPRESSION
+            ENTER = _builtins.type(MANAGER).{enter}
+            EXIT = _builtins.type(MANAGER).{exit}
+            {assign}{awaited("ENTER(MANAGER)")}
+            try:
+                BODY
+            except:
+                if not {awaited("EXIT(MANAGER, *_sys.exc_info())")}:
+                    raise
+            else:
+                {awaited("EXIT(MANAGER, None, None, None)")}
+            """
+        statements = _statements(
+            template,
+            MANAGER=self._temp("manager"),
+            ENTER=self._temp("enter"),
+            EXIT=self._temp("exit"),
+            EXPRESSION=item.context_expr,
+            TARGET=item.optional_vars,
+            BODY=body,
+        )
+        return self._visit_statements(
+            [ast.copy_location(statement, node) for statement in statements]
+        )
+
+    def visit_With(self, node: ast.With) -> Any:
+        return self._with(node, False)
+
+    def visit_AsyncWith(self, node: ast.AsyncWith) -> Any:
+        return self._with(node, True)
+
+    def visit_If(self, node: ast.If) -> Any:
+        if node.orelse and "elif" in self.rules:
+            return self._visit_statements(self._elif(node))
+        elif (
+            not node.orelse
+            and "if" in self.rules
+            # A `break` or `continue` would apply to the `while` loop.
+            and not any(True for _ in _loop_control(node.body))
+        ):
+            if "flags" in self.rules:
+                template = """
+                    FLAG = TEST
+                    while FLAG:
+                        FLAG = False
+                        BODY
+                    del FLAG
+                    """
+            else:
+                template = """
+                    try:
+                        while TEST:
+                            BODY
+                            raise _Done
+                    except _Done:
+                        pass
+                    """
+            statements = _statements(
+                template, FLAG=self._temp("if"), TEST=node.test, BODY=node.body
+            )
+            return self._visit_statements(
+                [ast.copy_location(statement, node) for statement in statements]
+            )
+        return self.generic_visit(node)
+
+    def _elif(self, node: ast.If) -> List[ast.stmt]:
+        """Desugar `elif`/`else` into separate `if` statements using flags."""
+        branches = []
+        while True:
+            branches.append((node.test, node.body))
+            orelse = node.orelse
+            if len(orelse) == 1 and isinstance(orelse[0], ast.If):
+                node = orelse[0]
+            else:
+                break
+        flags = [
+            self._temp("ran")
+            for _ in range(len(branches) if orelse else len(branches) - 1)
+        ]
+
+        def any_ran(flags: List[str]) -> ast.expr:
+            if len(flags) == 1:
+                return _name(flags[0])
+            return _raw(ast.BoolOp(ast.Or(), [_name(flag) for flag in flags]))
+
+        statements: List[ast.stmt] = [
+            _raw(
+                ast.Assign(
+                    [_name(flag, ast.Store()) for flag in flags], _constant(False)
+                )
+            )
+        ]
+        for position, (test, body) in enumerate(branches):
+            if position:
+                not_ran = _raw(ast.UnaryOp(ast.Not(), any_ran(flags[:position])))
+                test = _raw(ast.BoolOp(ast.And(), [not_ran, test]))
+            if position < len(flags):
+                ran = _raw(
+                    ast.Assign([_name(flags[position], ast.Store())], _constant(True))
+                )
+                body = [ran, *body]
+            statements.append(ast.If(test, body, []))
+        if orelse:
+            not_ran = _raw(ast.UnaryOp(ast.Not(), any_ran(flags)))
+            statements.append(ast.If(not_ran, orelse, []))
+        statements.append(_raw(ast.Delete([_name(flag, ast.Del()) for flag in flags])))
+        return [ast.copy_location(statement, node) for statement in statements]
+
+    def visit_Try(self, node: ast.Try) -> Any:
+        body, handlers, orelse, finalbody = (
+            node.body,
+            node.handlers,
+            node.orelse,
+            node.finalbody,
+        )
+        convert_else = orelse and "try_else" in self.rules
+        convert_finally = (
+            finalbody
+            and "finally" in self.rules
+            and not _jumps([*body, *orelse])
+            and not any(_jumps(handler.body) for handler in handlers)
+        )
+        if not convert_else and not convert_finally:
+            return self.generic_visit(node)
+        statements: List[ast.stmt] = []
+        if convert_else:
+            flag = self._temp("finished")
+            statements.extend(_statements("FLAG = False", FLAG=flag))
+            finished = _statements("FLAG = True", FLAG=flag)
+            inner = _raw(ast.Try([*body, *finished], handlers, [], []))
+            core = [inner, ast.copy_location(ast.If(_name(flag), orelse, []), node)]
+        elif handlers:
+            core = [_raw(ast.Try(body, handlers, orelse, []))]
+        else:
+            core = body
+        if convert_finally and (
+            "shared_finally" in self.rules and not _observes_exception(finalbody)
+        ):
+            statements.extend(self._shared_finally(core, finalbody))
+        elif convert_finally:
+            statements.extend(
+                _statements(
+                    """
+                    try:
+                        CORE
+                    except _builtins.BaseException:
+                        FINALLY
+                        raise
+                    """,
+                    CORE=core,
+                    FINALLY=finalbody,
+                )
+            )
+            statements.extend(copy.deepcopy(finalbody))
+        elif finalbody:
+            statements.append(_raw(ast.Try(core, [], [], finalbody)))
+        else:
+            statements.extend(core)
+        return self._visit_statements(
+            [ast.copy_location(statement, node) for statement in statements]
+        )
+
+    def _shared_finally(
+        self, core: List[ast.stmt], finalbody: List[ast.stmt]
+    ) -> List[ast.stmt]:
+        """Desugar `finally` keeping a single copy of its block, which runs
+        after any exception raised by the rest of the `try` statement is caught
+        and is followed by raising the exception again.
+
+        By default the block is copied into an exception handler as well as
+        after the `try` statement, which makes the size of the desugared code
+        grow exponentially with the depth of nested `finally` blocks. With
+        "shared_finally", an exception raised by the block is chained to the
+        pending one as it would have been. The pending exception is not being
+        handled while the block runs, though, so a block which could tell
+        (see `_observes_exception()`) is still copied.
+
+        """
+        return _statements(
+            """
+            PENDING = None
+            try:
+                CORE
+            except _builtins.BaseException as CAUGHT:
+                PENDING = CAUGHT
+            try:
+                FINALLY
+            except _builtins.BaseException as RAISED:
+                if PENDING is not None:
+                    _desugar_builtins._chain_pending(RAISED, PENDING)
+                del PENDING
+                raise
+            if PENDING is None:
+                del PENDING
+            else:
+                # Raising the exception again chains it to any exception
+                # being handled around the `try` statement.
+                CONTEXT = PENDING.__context__
+                try:
+                    raise PENDING
+                except _builtins.BaseException:
+                    PENDING.__context__ = CONTEXT
+                    del PENDING, CONTEXT
+                    raise
+            """,
+            PENDING=self._temp("pending"),
+            CAUGHT=self._temp("caught"),
+            RAISED=self._temp("raised"),
+            CONTEXT=self._temp("context"),
+            CORE=core,
+            FINALLY=finalbody,
+        )
+
+    def visit_Match(self, node: ast.Match) -> Any:
+        """Desugar `match` into a decision tree rather than one test per case
+        in turn.
+
+        The checks shared by several patterns (whether the subject is a
+        sequence or a mapping, its length, `isinstance()` and attribute lookups
+        for class patterns) are made at most once and remembered, as PEP 634
+        allows. A run of unguarded cases matching literals of the same builtin
+        types is looked up in a module-level dict when the subject is exactly
+        of one of those types. Each case's body is emitted once.
+
+        """
+        if "match" not in self.rules:
+            return self.generic_visit(node)
+        counts: Dict[Tuple[Any, ...], int] = {}
+        for case in node.cases:
+            for fact in _pattern_facts(case.pattern):
+                counts[fact] = counts.get(fact, 0) + 1
+        match = _Match(
+            self._temp("subject"),
+            self._temp("case"),
+            {fact for fact, count in counts.items() if count > 1},
+        )
+        body: List[ast.stmt] = []
+        index = 0
+        while index < len(node.cases):
+            run = 0
+            for case in node.cases[index:]:
+                if case.guard is not None or _pattern_literals(case.pattern) is None:
+                    break
+                run += 1
+            if run >= _MATCH_TABLE_CASES:
+                block = self._match_table(match, index, node.cases[index : index + run])
+                index += run
+            else:
+                block = self._match_case(match, index, node.cases[index])
+                index += 1
+            if body:
+                # A previous case may have matched.
+                block = _statements(
+                    "if CASE is None:\n    BLOCK", CASE=match.case, BLOCK=block
+                )
+            body.extend(block)
+        statements = _statements(
+            "SUBJECT = VALUE\nCASE = None",
+            SUBJECT=match.subject,
+            VALUE=node.subject,
+            CASE=match.case,
+        )
+        temporaries = [match.subject, match.case, *match.cached.values()]
+        if match.nothing is not None:
+            statements.extend(
+                _statements(
+                    "NOTHING = _desugar_builtins._NOTHING", NOTHING=match.nothing
+                )
+            )
+            for name in match.cached.values():
+                statements.extend(
+                    _statements("NAME = NOTHING", NAME=name, NOTHING=match.nothing)
+                )
+            temporaries.append(match.nothing)
+        statements.extend(body)
+        statements.append(
+            _raw(ast.Delete([_name(name, ast.Del()) for name in temporaries]))
+        )
+        return self._visit_statements(
+            [ast.copy_location(statement, node) for statement in statements]
+        )
+
+    def _match_case(
+        self, match: _Match, index: int, case: ast.match_case
+    ) -> List[ast.stmt]:
+        """Desugar a case into running its body if its pattern matches (and its
+        guard is true)."""
+
+        def matched(captures: Dict[str, str]) -> List[ast.stmt]:
+            statements: List[ast.stmt] = [
+                _raw(ast.Assign([_name(name, ast.Store())], _name(value)))
+                for name, value in captures.items()
+            ]
+            found = [
+                *_statements("CASE = INDEX", CASE=match.case, INDEX=_constant(index)),
+                *case.body,
+            ]
+            if case.guard is None:
+                statements.extend(found)
+            else:
+                statements.extend(
+                    _statements("if GUARD:\n    FOUND", GUARD=case.guard, FOUND=found)
+                )
+            return statements
+
+        return self._match_pattern(match, case.pattern, match.subject, {}, matched)
+
+    def _match_table(
+        self, match: _Match, start: int, cases: List[ast.match_case]
+    ) -> List[ast.stmt]:
+        """Desugar consecutive cases of literals into looking up the subject in a
+        table of the literals, unless it is of a type whose hashes may disagree
+        with its equality to the literals, when it is compared with each in
+        turn."""
+        table: Dict[Any, int] = {}
+        keys: List[Optional[ast.expr]] = []
+        values: List[ast.expr] = []
+        described = []
+        types: Set[str] = set()
+        for index, case in enumerate(cases, start):
+            for literal, value in _pattern_literals(case.pattern) or []:
+                types.update(_MATCH_TABLE_TYPES[type(value)])
+                # Only the first of equal literals (e.g. `1` and `1.0`) matches.
+                if value not in table:
+                    table[value] = index
+                    keys.append(self.visit(copy.deepcopy(literal)))
+                    values.append(_constant(index))
+                    described.append((type(value).__name__, value, index))
+        fallback: List[ast.stmt] = []
+        for index, case in reversed(list(enumerate(cases, start))):
+            test = self._match_test(case.pattern, match.subject)
+            found = _statements("CASE = INDEX", CASE=match.case, INDEX=_constant(index))
+            fallback = [_raw(ast.If(test, found, fallback))]
+        table_name = self._bind(
+            "match_table",
+            repr(described),
+            _raw(ast.Dict(keys, values)),
+        )
+        type_names = sorted(types)
+        types_name = self._bind(
+            "match_types",
+            repr(type_names),
+            _raw(
+                ast.Tuple(
+                    [_expression(f"_builtins.{name}") for name in type_names],
+                    ast.Load(),
+                )
+            ),
+        )
+        bodies = [(index, case.body) for index, case in enumerate(cases, start)]
+        return _statements(
+            """
+            if _builtins.type(SUBJECT) in TYPES:
+                CASE = TABLE.get(SUBJECT)
+            else:
+                FALLBACK
+            if CASE is not None:
+                DISPATCH
+            """,
+            SUBJECT=match.subject,
+            TYPES=types_name,
+            CASE=match.case,
+            TABLE=table_name,
+            FALLBACK=fallback,
+            DISPATCH=self._match_dispatch(match, bodies),
+        )
+
+    def _match_dispatch(
+        self, match: _Match, bodies: List[Tuple[int, List[ast.stmt]]]
+    ) -> List[ast.stmt]:
+        """Run the body of the case whose index is in the temporary, by
+        bisecting the cases."""
+        if len(bodies) == 1:
+            return bodies[0][1]
+        middle = len(bodies) // 2
+        return _statements(
+            "if CASE < INDEX:\n    LOWER\nelse:\n    UPPER",
+            CASE=match.case,
+            INDEX=_constant(bodies[middle][0]),
+            LOWER=self._match_dispatch(match, bodies[:middle]),
+            UPPER=self._match_dispatch(match, bodies[middle:]),
+        )
+
+    def _match_test(self, pattern: ast.pattern, subject: str) -> Optional[ast.expr]:
+        """Create an expression checking if a pattern matches a subject, if it
+        is a literal, a value or a singleton (or alternatives of them)."""
+        if isinstance(pattern, ast.MatchValue):
+            value = copy.deepcopy(pattern.value)
+            return _raw(ast.Compare(_name(subject), [ast.Eq()], [value]))
+        elif isinstance(pattern, ast.MatchSingleton):
+            singleton = ast.Constant(pattern.value)
+            return _raw(ast.Compare(_name(subject), [ast.Is()], [singleton]))
+        elif isinstance(pattern, ast.MatchOr):
+            tests = [self._match_test(item, subject) for item in pattern.patterns]
+            if all(test is not None for test in tests):
+                return _raw(ast.BoolOp(ast.Or(), tests))
+        return None
+
+    def _match_nothing(self, match: _Match) -> str:
+        if match.nothing is None:
+            match.nothing = self._temp("nothing")
+        return match.nothing
+
+    def _match_fact(
+        self,
+        match: _Match,
+        subject: str,
+        fact: Tuple[Any, ...],
+        kind: str,
+        expression: ast.expr,
+    ) -> Tuple[List[ast.stmt], str]:
+        """Look something up about a subject into a temporary, which caches it
+        if other patterns look it up about the subject of the `match`
+        statement too."""
+        if subject != match.subject or fact not in match.shared:
+            name = self._temp(kind)
+            return _statements("NAME = VALUE", NAME=name, VALUE=expression), name
+        name = match.cached.get(fact)
+        if name is None:
+            name = match.cached[fact] = self._temp(kind)
+        statements = _statements(
+            "if NAME is NOTHING:\n    NAME = VALUE",
+            NAME=name,
+            NOTHING=self._match_nothing(match),
+            VALUE=expression,
+        )
+        return statements, name
+
+    def _match_pattern(
+        self,
+        match: _Match,
+        pattern: ast.pattern,
+        subject: str,
+        captures: Dict[str, str],
+        then: Callable[[Dict[str, str]], List[ast.stmt]],
+    ) -> List[ast.stmt]:
+        """Create the statements which, if a pattern matches the subject in a
+        temporary, run the statements from `then` (which is passed the
+        temporaries of the names captured so far)."""
+        if isinstance(pattern, ast.MatchAs):
+            on_match = then
+            if pattern.name is not None:
+                name = pattern.name
+
+                def on_match(found: Dict[str, str]) -> List[ast.stmt]:
+                    return then({**found, name: subject})
+
+            if pattern.pattern is None:
+                return on_match(captures)
+            return self._match_pattern(
+                match, pattern.pattern, subject, captures, on_match
+            )
+        test = self._match_test(pattern, subject)
+        if test is not None:
+            return _statements("if TEST:\n    THEN", TEST=test, THEN=then(captures))
+        elif isinstance(pattern, ast.MatchOr):
+            return self._match_or(match, pattern, subject, captures, then)
+        elif isinstance(pattern, ast.MatchSequence):
+            return self._match_sequence(match, pattern, subject, captures, then)
+        elif isinstance(pattern, ast.MatchMapping):
+            return self._match_mapping(match, pattern, subject, captures, then)
+        else:
+            assert isinstance(pattern, ast.MatchClass)
+            return self._match_class(match, pattern, subject, captures, then)
+
+    def _match_steps(
+        self,
+        match: _Match,
+        steps: List[Tuple[List[ast.stmt], ast.pattern, str]],
+        captures: Dict[str, str],
+        then: Callable[[Dict[str, str]], List[ast.stmt]],
+    ) -> List[ast.stmt]:
+        """Match sub-patterns in turn, each after the statements extracting its
+        subject from the enclosing one."""
+        if not steps:
+            return then(captures)
+        (extract, pattern, subject), *rest = steps
+
+        def matched(found: Dict[str, str]) -> List[ast.stmt]:
+            return self._match_steps(match, rest, found, then)
+
+        return [
+            *extract,
+            *self._match_pattern(match, pattern, subject, captures, matched),
+        ]
+
+    def _match_or(
+        self,
+        match: _Match,
+        pattern: ast.MatchOr,
+        subject: str,
+        captures: Dict[str, str],
+        then: Callable[[Dict[str, str]], List[ast.stmt]],
+    ) -> List[ast.stmt]:
+        """Try each alternative until one matches, then run `then` once."""
+        matched = self._temp("matched")
+        names = _pattern_names(pattern.patterns[0])
+        bound = {name: self._temp("capture") for name in names}
+
+        def alternative_matched(found: Dict[str, str]) -> List[ast.stmt]:
+            statements: List[ast.stmt] = [
+                _raw(ast.Assign([_name(bound[name], ast.Store())], _name(found[name])))
+                for name in names
+            ]
+            statements.extend(_statements("MATCHED = True", MATCHED=matched))
+            return statements
+
+        statements = _statements("MATCHED = False", MATCHED=matched)
+        for alternative in pattern.patterns:
+            attempt = self._match_pattern(
+                match, alternative, subject, {}, alternative_matched
+            )
+            if alternative is not pattern.patterns[0]:
+                attempt = _statements(
+                    "if not MATCHED:\n    ATTEMPT", MATCHED=matched, ATTEMPT=attempt
+                )
+            statements.extend(attempt)
+        statements.extend(
+            _statements(
+                "if MATCHED:\n    THEN",
+                MATCHED=matched,
+                THEN=then({**captures, **bound}),
+            )
+        )
+        return statements
+
+    def _match_sequence(
+        self,
+        match: _Match,
+        pattern: ast.MatchSequence,
+        subject: str,
+        captures: Dict[str, str],
+        then: Callable[[Dict[str, str]], List[ast.stmt]],
+    ) -> List[ast.stmt]:
+        """Match a sequence pattern, extracting the items as the compiler does:
+        by indexing when the only starred sub-pattern is `*_`, otherwise by
+        unpacking."""
+        patterns = pattern.patterns
+        star = next(
+            (
+                position
+                for position, item in enumerate(patterns)
+                if isinstance(item, ast.MatchStar)
+            ),
+            None,
+        )
+        size = len(patterns) if star is None else len(patterns) - 1
+        statements, is_sequence = self._match_fact(
+            match,
+            subject,
+            ("sequence",),
+            "sequence",
+            _call("_desugar_builtins._match_sequence", _name(subject)),
+        )
+        length = None
+        checks: List[ast.stmt] = []
+        if star is None or size:
+            checks, length = self._match_fact(
+                match,
+                subject,
+                ("len",),
+                "length",
+                _call("_builtins.len", _name(subject)),
+            )
+        if all(_is_wildcard(item) for item in patterns):
+            items = then(captures)
+        elif star is not None and _is_wildcard(patterns[star]):
+            steps = []
+            for position, item in enumerate(patterns):
+                if _is_wildcard(item):
+                    continue
+                elif position < star:
+                    index = _constant(position)
+                else:
+                    index = _expression(
+                        "LENGTH - OFFSET",
+                        LENGTH=length,
+                        OFFSET=_constant(len(patterns) - position),
+                    )
+                temp = self._temp("item")
+                extract = _statements(
+                    "ITEM = SUBJECT[INDEX]", ITEM=temp, SUBJECT=subject, INDEX=index
+                )
+                steps.append((extract, item, temp))
+            items = self._match_steps(match, steps, captures, then)
+        else:
+            targets: List[ast.expr] = []
+            steps = []
+            for item in patterns:
+                temp = self._temp("item")
+                target: ast.expr = _name(temp, ast.Store())
+                if isinstance(item, ast.MatchStar):
+                    target = _raw(ast.Starred(target, ast.Store()))
+                    item = ast.MatchAs(None, item.name)
+                targets.append(target)
+                if not _is_wildcard(item):
+                    steps.append(([], item, temp))
+            items = [
+                _raw(
+                    ast.Assign([_raw(ast.Tuple(targets, ast.Store()))], _name(subject))
+                ),
+                *self._match_steps(match, steps, captures, then),
+            ]
+        if length is not None:
+            comparison = "==" if star is None else ">="
+            checks.extend(
+                _statements(
+                    f"if LENGTH {comparison} SIZE:\n    ITEMS",
+                    LENGTH=length,
+                    SIZE=_constant(size),
+                    ITEMS=items,
+                )
+            )
+        else:
+            checks.extend(items)
+        statements.extend(
+            _statements("if SEQUENCE:\n    CHECKS", SEQUENCE=is_sequence, CHECKS=checks)
+        )
+        return statements
+
+    def _match_mapping(
+        self,
+        match: _Match,
+        pattern: ast.MatchMapping,
+        subject: str,
+        captures: Dict[str, str],
+        then: Callable[[Dict[str, str]], List[ast.stmt]],
+    ) -> List[ast.stmt]:
+        """Match a mapping pattern, looking up the keys with the mapping's
+        `get()`."""
+        statements, is_mapping = self._match_fact(
+            match,
+            subject,
+            ("mapping",),
+            "mapping",
+            _call("_desugar_builtins._match_mapping", _name(subject)),
+        )
+        keys = _raw(ast.Tuple([copy.deepcopy(key) for key in pattern.keys], ast.Load()))
+        bind_keys: List[ast.stmt] = []
+        found: List[ast.stmt] = []
+        on_match = then
+        if pattern.rest is not None and pattern.keys:
+            # The keys are only evaluated once.
+            keys_temp = self._temp("keys")
+            bind_keys = _statements("KEYS = TUPLE", KEYS=keys_temp, TUPLE=keys)
+            keys = _name(keys_temp)
+        if pattern.rest is not None:
+            rest, name = self._temp("rest"), pattern.rest
+            found.extend(
+                _statements(
+                    "REST = _desugar_builtins._match_rest(SUBJECT, KEYS)",
+                    REST=rest,
+                    SUBJECT=subject,
+                    KEYS=copy.deepcopy(keys),
+                )
+            )
+
+            def on_match(found: Dict[str, str]) -> List[ast.stmt]:
+                return then({**found, name: rest})
+
+        if not pattern.keys:
+            found.extend(on_match(captures))
+            return [
+                *statements,
+                *_statements("if MAPPING:\n    FOUND", MAPPING=is_mapping, FOUND=found),
+            ]
+        checks, length = self._match_fact(
+            match, subject, ("len",), "length", _call("_builtins.len", _name(subject))
+        )
+        values = self._temp("values")
+        temps = [self._temp("value") for _ in pattern.keys]
+        steps = [([], item, temp) for item, temp in zip(pattern.patterns, temps)]
+        unpack = _raw(
+            ast.Assign(
+                [
+                    _raw(
+                        ast.Tuple(
+                            [_name(temp, ast.Store()) for temp in temps], ast.Store()
+                        )
+                    )
+                ],
+                _name(values),
+            )
+        )
+        matched_keys = [
+            *found,
+            unpack,
+            *self._match_steps(match, steps, captures, on_match),
+        ]
+        checks.extend(
+            _statements(
+                """
+                if LENGTH >= SIZE:
+                    BIND_KEYS
+                    VALUES = _desugar_builtins._match_keys(SUBJECT, KEYS)
+                    if VALUES is not None:
+                        MATCHED
+                """,
+                LENGTH=length,
+                SIZE=_constant(len(pattern.keys)),
+                BIND_KEYS=bind_keys,
+                VALUES=values,
+                SUBJECT=subject,
+                KEYS=keys,
+                MATCHED=matched_keys,
+            )
+        )
+        return [
+            *statements,
+            *_statements("if MAPPING:\n    CHECKS", MAPPING=is_mapping, CHECKS=checks),
+        ]
+
+    def _match_class(
+        self,
+        match: _Match,
+        pattern: ast.MatchClass,
+        subject: str,
+        captures: Dict[str, str],
+        then: Callable[[Dict[str, str]], List[ast.stmt]],
+    ) -> List[ast.stmt]:
+        """Match a class pattern, looking up the attributes for its
+        sub-patterns before matching any of them."""
+        cls = ast.dump(pattern.cls)
+        statements, is_instance = self._match_fact(
+            match,
+            subject,
+            ("class", cls),
+            "instance",
+            _call(
+                "_desugar_builtins._match_class",
+                copy.deepcopy(pattern.cls),
+                _name(subject),
+            ),
+        )
+        count = len(pattern.patterns)
+        if count or pattern.kwd_attrs:
+            nothing = self._match_nothing(match)
+        checks: List[ast.stmt] = []
+        attributes: List[Tuple[List[ast.stmt], str]] = []
+        if count:
+            keywords = [_constant(attr) for attr in pattern.kwd_attrs]
+            checks, names = self._match_fact(
+                match,
+                subject,
+                ("args", cls, count, tuple(pattern.kwd_attrs)),
+                "match_args",
+                _call(
+                    "_desugar_builtins._match_args",
+                    copy.deepcopy(pattern.cls),
+                    _constant(count),
+                    _raw(ast.Tuple(keywords, ast.Load())),
+                ),
+            )
+            for position in range(count):
+                lookup = _call(
+                    "_builtins.getattr",
+                    _name(subject),
+                    _expression(
+                        "NAMES[POSITION]", NAMES=names, POSITION=_constant(position)
+                    ),
+                    _name(nothing),
+                )
+                fetch, value = self._match_fact(
+                    match, subject, ("position", cls, position), "attribute", lookup
+                )
+                if count == 1:
+                    # The sub-pattern of e.g. `int(x)` matches the subject.
+                    fetch = _statements(
+                        "if NAMES is None:\n    VALUE = SUBJECT\nelse:\n    FETCH",
+                        NAMES=names,
+                        VALUE=value,
+                        SUBJECT=subject,
+                        FETCH=fetch,
+                    )
+                attributes.append((fetch, value))
+        for attr in pattern.kwd_attrs:
+            lookup = _call(
+                "_builtins.getattr", _name(subject), _constant(attr), _name(nothing)
+            )
+            attributes.append(
+                self._match_fact(match, subject, ("attr", attr), "attribute", lookup)
+            )
+        steps = [
+            ([], item, value)
+            for item, (_, value) in zip(
+                [*pattern.patterns, *pattern.kwd_patterns], attributes
+            )
+        ]
+        found = self._match_steps(match, steps, captures, then)
+        for fetch, value in reversed(attributes):
+            found = [
+                *fetch,
+                *_statements(
+                    "if VALUE is not NOTHING:\n    FOUND",
+                    VALUE=value,
+                    NOTHING=nothing,
+                    FOUND=found,
+                ),
+            ]
+        checks.extend(found)
+        statements.extend(
+            _statements("if INSTANCE:\n    CHECKS", INSTANCE=is_instance, CHECKS=checks)
+        )
+        return statements
+
+    def visit_match_case(self, node: ast.match_case) -> Any:
+        # Patterns are not expressions and must be left alone.
+        if node.guard is not None:
+            node.guard = self.visit(node.guard)
+        node.body = self._visit_block(node.body)
+        return node
+
+
+class _Temporaries:
+
+    """Inline temporaries which are assigned and loaded once (the
+    "temporaries" rule).
+
+    A temporary is replaced by its value when that cannot change what the code
+    does: either the value is stable (e.g. `_desugar_builtins._coroutine`), so it does not
+    matter when (or where outside of a loop) it is evaluated, or loading the
+    temporary is the first thing with an effect which the following statement
+    evaluates. A temporary which is never loaded is dropped, keeping its value
+    as an expression statement if evaluating it may have an effect. Either
+    way, any `del` of the temporary goes too.
+
+    """
+
+    def __init__(self, statements: List[ast.stmt], temporaries: Set[str]) -> None:
+        self.temporaries = temporaries
+        self.stores: Dict[str, int] = dict.fromkeys(temporaries, 0)
+        self.loads: Dict[str, int] = dict.fromkeys(temporaries, 0)
+        self.excluded: Set[str] = set()
+        self.eliminated: Set[str] = set()
+        for node in ast.walk(ast.Module(statements, [])):
+            if isinstance(node, ast.Name) and node.id in temporaries:
+                if isinstance(node.ctx, ast.Store):
+                    self.stores[node.id] += 1
+                elif isinstance(node.ctx, ast.Load):
+                    self.loads[node.id] += 1
+            elif isinstance(node, (ast.Global, ast.Nonlocal)):
+                self.excluded.update(node.names)
+            elif isinstance(node, ast.AugAssign) and isinstance(node.target, ast.Name):
+                self.excluded.add(node.target.id)
+
+    def _candidate(self, statement: ast.stmt) -> Optional[str]:
+        """Return the temporary a statement assigns to, if it may be inlined."""
+        if not isinstance(statement, ast.Assign) or len(statement.targets) != 1:
+            return None
+        target = statement.targets[0]
+        if (
+            isinstance(target, ast.Name)
+            and target.id in self.temporaries
+            and target.id not in self.excluded
+            and self.stores[target.id] == 1
+            and self.loads[target.id] <= 1
+        ):
+            return target.id
+        return None
+
+    @staticmethod
+    def _stable(node: ast.expr) -> bool:
+        """Check if an expression has no effect and always has the same value."""
+        if isinstance(node, ast.Constant):
+            return True
+        elif isinstance(node, ast.Name):
+            return node.id in _PROLOGUE_NAMES
+        elif isinstance(node, ast.Attribute):
+            return isinstance(node.value, ast.Name) and (
+                node.value.id in _PROLOGUE_MODULES
+            )
+        return False
+
+    def _evaluates_first(self, node: ast.expr, name: str) -> Optional[bool]:
+        """Check if loading `name` is the first thing with an effect which
+        evaluating the expression does (`None` if nothing has an effect)."""
+        if isinstance(node, ast.Name):
+            if node.id == name:
+                return True
+            elif node.id in _PROLOGUE_NAMES or node.id in self.temporaries:
+                return None
+            return False
+        elif isinstance(node, ast.Constant):
+            return None
+        # Subexpressions in the order they are evaluated, stopping before any
+        # which are only evaluated conditionally.
+        children: List[ast.expr]
+        if isinstance(node, ast.Call):
+            children = [node.func, *node.args]
+            children.extend(keyword.value for keyword in node.keywords)
+        elif isinstance(node, (ast.Attribute, ast.Starred)):
+            children = [node.value]
+        elif isinstance(node, (ast.Tuple, ast.List)):
+            children = node.elts
+        elif isinstance(node, ast.IfExp):
+            children = [node.test]
+        elif isinstance(node, ast.BoolOp):
+            children = node.values[:1]
+        else:
+            return False
+        for child in children:
+            first = self._evaluates_first(child, name)
+            if first is not None:
+                return first
+        if isinstance(node, (ast.Tuple, ast.List)) or self._stable(node):
+            return None
+        return False
+
+    def _leads_with(self, statement: ast.stmt, name: str) -> bool:
+        """Check if loading `name` is the first thing with an effect which
+        executing the statement does."""
+        expression: Optional[ast.expr]
+        if isinstance(statement, (ast.Expr, ast.Return, ast.Assign)):
+            # An assignment evaluates its value before its targets.
+            expression = statement.value
+        elif isinstance(statement, ast.If):
+            expression = statement.test
+        elif isinstance(statement, ast.Raise):
+            expression = statement.exc
+        else:
+            return False
+        return (
+            expression is not None and self._evaluates_first(expression, name) is True
+        )
+
+    def _loaded_in(self, statement: ast.stmt, name: str) -> bool:
+        """Check if `name` is loaded by the statement other than in a loop or
+        nested scope (where it could be evaluated more than once, or later)."""
+        todo: List[ast.AST] = [statement]
+        while todo:
+            node = todo.pop()
+            if isinstance(node, ast.Name) and node.id == name:
+                return isinstance(node.ctx, ast.Load)
+            elif not isinstance(
+                node, (*_SCOPE_NODES, *_COMPREHENSION_NODES, *_LOOP_NODES)
+            ):
+                todo.extend(ast.iter_child_nodes(node))
+        return False
+
+    def _inline(self, block: List[ast.stmt], index: int, name: str) -> bool:
+        """Try to eliminate the temporary assigned by `block[index]`."""
+        assignment = typing.cast(ast.Assign, block[index])
+        value = assignment.value
+        if not self.loads[name]:
+            if self._stable(value):
+                del block[index]
+            else:
+                block[index] = ast.copy_location(_raw(ast.Expr(value)), assignment)
+            return True
+        following = block[index + 1 : index + 2]
+        if self._stable(value):
+            following = [
+                statement
+                for statement in block[index + 1 :]
+                if self._loaded_in(statement, name)
+            ]
+        elif not (following and self._leads_with(following[0], name)):
+            return False
+        if not following:
+            return False
+        _Inline(name, value).visit(following[0])
+        del block[index]
+        return True
+
+    def optimize(self, block: List[ast.stmt]) -> None:
+        """Eliminate the temporaries in a block (and the blocks within it)."""
+        index = 0
+        while index < len(block):
+            name = self._candidate(block[index])
+            if name is not None and self._inline(block, index, name):
+                self.eliminated.add(name)
+                continue
+            for inner in _blocks(block[index]):
+                self.optimize(inner)
+            index += 1
+
+    def remove_deletes(self, block: List[ast.stmt]) -> None:
+        """Remove the eliminated temporaries from `del` statements."""
+        index = 0
+        while index < len(block):
+            statement = block[index]
+            if isinstance(statement, ast.Delete):
+                statement.targets = [
+                    target
+                    for target in statement.targets
+                    if not (
+                        isinstance(target, ast.Name) and target.id in self.eliminated
+                    )
+                ]
+                if not statement.targets:
+                    del block[index]
+                    continue
+            for inner in _blocks(statement):
+                self.remove_deletes(inner)
+            index += 1
+
+
+class _Inline(ast.NodeTransformer):
+
+    """Replace the load of a temporary with its value."""
+
+    def __init__(self, name: str, value: ast.expr) -> None:
+        self.name = name
+        self.value = value
+
+    def visit_Name(self, node: ast.Name) -> Any:
+        if node.id == self.name and isinstance(node.ctx, ast.Load):
+            return self.value
+        return node
+
+
+def _check_rules(rules: Iterable[str]) -> typing.FrozenSet[str]:
+    rules = frozenset(rules)
+    unknown = rules - ALL_RULES
+    if unknown:
+        raise ValueError(f"unknown rule(s): {', '.join(sorted(unknown))}")
+    return rules
+
+
+def _header_length(body: List[ast.stmt]) -> int:
+    """Count the statements which must stay at the top of a module: the
+    docstring and `__future__` imports."""
+    length = 0
+    if body and _is_docstring(body[0]):
+        length = 1
+    while (
+        length < len(body)
+        and isinstance(body[length], ast.ImportFrom)
+        and body[length].module == "__future__"
+    ):
+        length += 1
+    return length
+
+
+def _parse(source: Union[str, bytes, ast.Module], /) -> ast.Module:
+    if isinstance(source, ast.Module):
+        return source
+    return ast.parse(source)
+
+
+def _desugar_top_level(transformer: _Desugar, statement: ast.stmt) -> List[ast.stmt]:
+    """Desugar a top-level statement of a module."""
+    statements = transformer.visit_top_level(statement)
+    if "temporaries" in transformer.rules and transformer.temporaries:
+        temporaries = _Temporaries(statements, transformer.temporaries)
+        temporaries.optimize(statements)
+        if temporaries.eliminated:
+            temporaries.remove_deletes(statements)
+    if transformer.literals:
+        statements[:0] = [
+            _raw(ast.Assign([_name(name, ast.Store())], literal))
+            for name, literal in transformer.literals.items()
+        ]
+        transformer.bound_literals.update(transformer.literals)
+    for new in statements:
+        # Generated nodes take the location of the statement they came from.
+        ast.copy_location(new, statement)
+        ast.fix_missing_locations(new)
+    return statements
+
+
+def _unparse(statement: ast.stmt) -> str:
+    """Create the source of a top-level statement."""
+    if isinstance(statement, _DOCSTRING_NODES[1:]):
+        return "\n" + ast.unparse(statement) + "\n\n"
+    elif _is_docstring(statement):
+        # Unparsing as a module keeps the docstring's formatting.
+        return ast.unparse(ast.Module([statement], [])) + "\n"
+    else:
+        return ast.unparse(statement) + "\n"
+
+
+def iter_statements(
+    source: Union[str, bytes, ast.Module], /, rules: Iterable[str] = DEFAULT_RULES
+) -> Iterator[ast.stmt]:
+    """Desugar a module, yielding the resulting top-level statements.
+
+    Statements are removed from the module as they are transformed, so an
+    `ast.Module` which is passed in is left empty.
+
+    """
+    return _iter_statements(_Desugar(_check_rules(rules)), source)
+
+
+def _iter_statements(
+    transformer: _Desugar, source: Union[str, bytes, ast.Module], /
+) -> Iterator[ast.stmt]:
+    module = _parse(source)
+    body, module.body = module.body, []
+    header = _header_length(body)
+    yield from body[:header]
+    yield from ast.parse(PROLOGUE).body
+    if transformer.instrument is not None:
+        yield from ast.parse("import desugar.profile as _desugar_profile").body
+    # Popping from the end of a list is cheap, and drops the reference to each
+    # statement once it has been handled.
+    del body[:header]
+    body.reverse()
+    while body:
+        yield from _desugar_top_level(transformer, body.pop())
+
+
+def iter_transform(
+    source: Union[str, bytes, ast.Module], /, rules: Iterable[str] = DEFAULT_RULES
+) -> Iterator[str]:
+    """Desugar a module, yielding the source of each top-level statement."""
+    for statement in iter_statements(source, rules):
+        yield _unparse(statement)
+
+
+def transform(
+    source: Union[str, bytes, ast.Module], /, rules: Iterable[str] = DEFAULT_RULES
+) -> str:
+    """Desugar a module, returning the resulting source code."""
+    return "".join(iter_transform(source, rules))
+
+
+def transform_ast(
+    source: Union[str, bytes, ast.Module], /, rules: Iterable[str] = DEFAULT_RULES
+) -> ast.Module:
+    """Desugar a module, returning the resulting AST (ready to be compiled)."""
+    return ast.Module(list(iter_statements(source, rules)), [])
+
+
+class _Statement:
+
+    """A top-level statement of a module along with its desugared form."""
+
+    __slots__ = ("key", "start", "end", "lineno", "statements", "source")
+
+    def __init__(
+        self,
+        key: Tuple[str, int, int],
+        start: int,
+        end: int,
+        statements: List[ast.stmt],
+    ) -> None:
+        self.key = key
+        # The lines of the statement in the latest version of the module.
+        self.start = start
+        self.end = end
+        # The line the desugared statements currently start on.
+        self.lineno = start
+        self.statements = statements
+        self.source: Optional[str] = None
+
+
+class Incremental:
+
+    """Desugar successive versions of a module, reusing unchanged statements.
+
+    Each top-level statement is fingerprinted by its source code, so after an
+    edit only the statements which changed are desugared again. Statements
+    which only moved have the line numbers of their desugared nodes shifted.
+
+    To avoid parsing the whole module after every edit, the lines which
+    changed since the previous version are found by comparing the start and
+    end of the two versions, and only the statements overlapping the change
+    are parsed again. If those cannot be parsed on their own (e.g. the change
+    opens a bracket which is closed further on), the whole module is parsed.
+
+    The statements of a module returned by `transform_ast()` are reused (and
+    their line numbers updated in place) by later calls, so they should be
+    compiled or copied before the next call.
+
+    """
+
+    def __init__(self, rules: Iterable[str] = DEFAULT_RULES) -> None:
+        self.rules = _check_rules(rules)
+        self._transformer = _Desugar(self.rules)
+        self._lines: List[str] = []
+        self._header: List[ast.stmt] = []
+        self._header_end = 0
+        self._body: List[_Statement] = []
+        # How the statements of the latest version were handled.
+        self.reused = 0
+        self.desugared = 0
+
+    def _statement(
+        self,
+        statement: ast.stmt,
+        lines: List[str],
+        previous: Dict[Tuple[str, int, int], List[_Statement]],
+    ) -> _Statement:
+        """Desugar a statement, unless an identical one was desugared before."""
+        decorators = getattr(statement, "decorator_list", None)
+        start = decorators[0].lineno if decorators else statement.lineno
+        end = typing.cast(int, statement.end_lineno)
+        # Statements separated by `;` share lines, but not columns.
+        key = (
+            "".join(lines[start - 1 : end]),
+            statement.col_offset,
+            typing.cast(int, statement.end_col_offset),
+        )
+        # Identical statements each get their own entry so nodes are not shared.
+        candidates = previous.get(key)
+        if candidates:
+            self.reused += 1
+            reused = candidates.pop()
+            reused.start, reused.end = start, end
+            return reused
+        self.desugared += 1
+        # A reused statement may follow one which is desugared again, so each
+        # binds all of the literals it uses.
+        self._transformer.bound_literals.clear()
+        statements = _desugar_top_level(self._transformer, statement)
+        return _Statement(key, start, end, statements)
+
+    @staticmethod
+    def _by_key(
+        statements: Iterable[_Statement],
+    ) -> Dict[Tuple[str, int, int], List[_Statement]]:
+        by_key: Dict[Tuple[str, int, int], List[_Statement]] = {}
+        for statement in statements:
+            by_key.setdefault(statement.key, []).append(statement)
+        return by_key
+
+    def _update_changed(self, lines: List[str]) -> bool:
+        """Parse only the statements which overlap the lines which changed."""
+        old = self._lines
+        if not old:
+            return False
+        shortest = min(len(old), len(lines))
+        prefix = 0
+        while prefix < shortest and old[prefix] == lines[prefix]:
+            prefix += 1
+        suffix = 0
+        while (
+            suffix < shortest - prefix
+            and old[len(old) - suffix - 1] == lines[len(lines) - suffix - 1]
+        ):
+            suffix += 1
+        if prefix == 0 or prefix < self._header_end:
+            return False  # The docstring or a `__future__` import changed.
+        # Line numbers below are 1-based, as in the AST.
+        changed_start, changed_end = prefix + 1, len(old) - suffix
+        before = [s for s in self._body if s.end < changed_start]
+        after = [s for s in self._body if s.start > changed_end]
+        overlapping = self._body[len(before) : len(self._body) - len(after)]
+        region_start = changed_start
+        region_end = changed_end
+        if overlapping:
+            region_start = min(region_start, overlapping[0].start)
+            region_end = max(region_end, overlapping[-1].end)
+        delta = len(lines) - len(old)
+        # Leading newlines give the parsed nodes their actual line numbers.
+        region = "\n" * (region_start - 1)
+        region += "".join(lines[region_start - 1 : region_end + delta])
+        try:
+            parsed = ast.parse(region).body
+        except SyntaxError:
+            return False
+        if _header_length(parsed):
+            # A new docstring or `__future__` import must stay at the top.
+            return False
+        self.reused += len(before) + len(after)
+        previous = self._by_key(overlapping)
+        body = before
+        body.extend(self._statement(statement, lines, previous) for statement in parsed)
+        for statement in after:
+            statement.start += delta
+            statement.end += delta
+        body.extend(after)
+        self._body = body
+        return True
+
+    def _update_all(self, source: str, lines: List[str]) -> None:
+        """Parse the whole module."""
+        module = ast.parse(source).body
+        header = _header_length(module)
+        self._header = module[:header]
+        self._header_end = self._header[-1].end_lineno or 0 if header else 0
+        previous = self._by_key(self._body)
+        self._body = [
+            self._statement(statement, lines, previous) for statement in module[header:]
+        ]
+
+    def _update(self, source: Union[str, bytes], /) -> None:
+        """Bring the desugared statements up to date with a version of the module."""
+        if isinstance(source, bytes):
+            source = importlib.util.decode_source(source)
+        # Split lines like the parser does (form feeds, etc. are not newlines).
+        lines = io.StringIO(source, newline=None).readlines()
+        self.reused = self.desugared = 0
+        if not self._update_changed(lines):
+            self.reused = self.desugared = 0
+            self._update_all(source, lines)
+        self._lines = lines
+
+    def transform_ast(self, source: Union[str, bytes], /) -> ast.Module:
+        """Desugar a version of the module, returning the resulting AST."""
+        self._update(source)
+        body = [*self._header, *ast.parse(PROLOGUE).body]
+        for statement in self._body:
+            if statement.lineno != statement.start:
+                for new in statement.statements:
+                    ast.increment_lineno(new, statement.start - statement.lineno)
+                statement.lineno = statement.start
+            body.extend(statement.statements)
+        return ast.Module(body, [])
+
+    def transform(self, source: Union[str, bytes], /) -> str:
+        """Desugar a version of the module, returning the resulting source."""
+        self._update(source)
+        chunks = [_unparse(statement) for statement in self._header]
+        chunks.append("".join(map(_unparse, ast.parse(PROLOGUE).body)))
+        # The source of a statement does not depend on its line numbers.
+        for statement in self._body:
+            if statement.source is None:
+                statement.source = "".join(map(_unparse, statement.statements))
+            chunks.append(statement.source)
+        return "".join(chunks)
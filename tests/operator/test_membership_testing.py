@@ -74,3 +74,126 @@ class TestMembershipTesting:
         """Defining neither __contains__ nor __iter__ results in a TypeError."""
         with pytest.raises(TypeError):
             __contains__(object(), 42)
+
+
+class TestMembershipIndex:
+    def test_not_opted_in(self):
+        """Without opting in, every membership test iterates anew."""
+        iterable = Iterable([1, 2, 3])
+        assert desugar.operator.__contains__(iterable, 2) is True
+        iterable._iter.remove(2)
+        assert desugar.operator.__contains__(iterable, 2) is False
+
+    def test_index(self):
+        """An opted-in container is only iterated over once."""
+        calls = 0
+
+        class Counting:
+            def __iter__(self):
+                nonlocal calls
+                calls += 1
+                yield from range(100)
+
+        container = Counting()
+        desugar.operator.index_membership(container)
+        assert desugar.operator.__contains__(container, 42) is True
+        assert desugar.operator.__contains__(container, 42.0) is True
+        assert desugar.operator.__contains__(container, 100) is False
+        assert calls == 1
+
+    def test_unhashable(self):
+        """Unhashable items and containers fall back to a linear search."""
+
+        class Equal:
+            __hash__ = None
+
+            def __eq__(self, other):
+                return other == 42
+
+        class UnhashableIterable(Iterable):
+            __hash__ = None
+
+        unhashable = [1]
+        iterable = UnhashableIterable([Equal(), unhashable, 3])
+        desugar.operator.index_membership(iterable)
+        assert desugar.operator.__contains__(iterable, 42) is True
+        assert desugar.operator.__contains__(iterable, unhashable) is True
+        assert desugar.operator.__contains__(iterable, [1]) is True
+        assert desugar.operator.__contains__(iterable, 3) is True
+        assert desugar.operator.__contains__(iterable, [3]) is False
+
+    def test_invalidate(self):
+        """Invalidating the index picks up changes to the container."""
+        iterable = Iterable([1, 2, 3])
+        desugar.operator.index_membership(iterable)
+        assert desugar.operator.__contains__(iterable, 4) is False
+        iterable._iter.append(4)
+        assert desugar.operator.__contains__(iterable, 4) is False
+        desugar.operator.invalidate_membership(iterable)
+        assert desugar.operator.__contains__(iterable, 4) is True
+
+    def test_weak(self):
+        """The index does not keep the container alive."""
+        iterable = Iterable([1, 2, 3])
+        desugar.operator.index_membership(iterable)
+        assert desugar.operator.__contains__(iterable, 1) is True
+        key = id(iterable)
+        del iterable
+        assert key not in desugar.operator._membership_indexes
+
+    def test_not_weakrefable(self):
+        """Containers which cannot be weakly referenced are not indexed."""
+
+        class Slotted:
+            __slots__ = ("items",)
+
+            def __init__(self, items):
+                self.items = items
+
+            def __iter__(self):
+                return iter(self.items)
+
+        container = Slotted([1, 2, 3])
+        desugar.operator.index_membership(container)
+        assert id(container) not in desugar.operator._membership_indexes
+        assert desugar.operator.__contains__(container, 2) is True
+        container.items.append(4)
+        assert desugar.operator.__contains__(container, 4) is True
+        desugar.operator.invalidate_membership(container)
+
+
+class TestContainsMany:
+    def test_set(self):
+        """Exact sets and dicts are probed directly."""
+        assert desugar.operator.contains_many({1, 2}, [1, 3, 2]) == bytearray([1, 0, 1])
+        assert desugar.operator.contains_many({"a": 1}, ["b", "a"]) == bytearray([0, 1])
+
+    def test_unhashable(self):
+        """Unhashable items raise TypeError like the `in` operator."""
+        with pytest.raises(TypeError):
+            desugar.operator.contains_many({1}, [[]])
+
+    def test_contains(self):
+        """The result of __contains__ is passed through operator.truth()."""
+        assert desugar.operator.contains_many(Contains(), [42, 0, "", "a"]) == (
+            bytearray([1, 0, 0, 1])
+        )
+
+    def test_iterable(self):
+        """Containers without __contains__ are searched via iteration."""
+        iterable = Iterable([1, 2, 3])
+        assert desugar.operator.contains_many(iterable, [3, 4]) == bytearray([1, 0])
+
+    def test_non_container(self):
+        """Raise TypeError when a non-container is checked against."""
+        with pytest.raises(TypeError):
+            desugar.operator.contains_many(42, [1])
+
+        class ContainsNone:
+            __contains__ = None
+
+        with pytest.raises(TypeError):
+            desugar.operator.contains_many(ContainsNone(), [1])
+
+    def test_empty(self):
+        assert desugar.operator.contains_many([1], []) == bytearray()
@@ -1,3 +1,4 @@
+import collections
 import operator
 
 import pytest
@@ -42,3 +43,143 @@ class TestDelitem:
     def test_no_delitem(self, delitem):
         with pytest.raises(TypeError):
             delitem(object, 0)
+
+
+class Subscriptable:
+    def __init__(self):
+        self.data = {}
+
+    def __getitem__(self, index):
+        return self.data[index]
+
+    def __setitem__(self, index, value):
+        self.data[index] = value
+
+    def __delitem__(self, index):
+        del self.data[index]
+
+
+class ListSubclass(list):
+    pass
+
+
+class TestGetitemMany:
+    @pytest.mark.parametrize(
+        "container", [[0, 1, 2, 3], {0: 0, 1: 1, 2: 2, 3: 3}, (0, 1, 2, 3)]
+    )
+    def test_gather(self, container):
+        assert desugar.operator.getitem_many(container, [3, 0, 3]) == [3, 0, 3]
+
+    def test_memoryview(self):
+        view = memoryview(b"abcd")
+        assert desugar.operator.getitem_many(view, [0, -1]) == [ord("a"), ord("d")]
+
+    def test_custom(self):
+        container = Subscriptable()
+        container.data.update(a=1, b=2)
+        assert desugar.operator.getitem_many(container, "ba") == [2, 1]
+
+    def test_no_getitem(self):
+        with pytest.raises(TypeError):
+            desugar.operator.getitem_many(object(), [0])
+
+
+class TestSetitemMany:
+    def test_scatter(self):
+        container = [0] * 4
+        desugar.operator.setitem_many(container, [3, 1], "ab")
+        assert container == [0, "b", 0, "a"]
+
+    def test_custom(self):
+        container = Subscriptable()
+        desugar.operator.setitem_many(container, ["a", "b"], [1, 2])
+        assert container.data == {"a": 1, "b": 2}
+
+    def test_length_mismatch(self):
+        container = {}
+        with pytest.raises(ValueError):
+            desugar.operator.setitem_many(container, [1, 2], [1])
+        assert not container
+
+    def test_no_setitem(self):
+        with pytest.raises(TypeError):
+            desugar.operator.setitem_many(object(), [0], [0])
+
+
+class TestDelitemMany:
+    def test_list_positions(self):
+        """List indices refer to positions before any deletion."""
+        container = list(range(6))
+        desugar.operator.delitem_many(container, [1, -1, 3, 1])
+        assert container == [0, 2, 4]
+
+    def test_list_out_of_range(self):
+        """Nothing is deleted when an index is out of range."""
+        container = list(range(3))
+        with pytest.raises(IndexError):
+            desugar.operator.delitem_many(container, [0, 3])
+        assert container == [0, 1, 2]
+
+    def test_list_slice(self):
+        """Slices also refer to positions before any deletion."""
+        container = list(range(6))
+        desugar.operator.delitem_many(container, [slice(0, 2), 0, slice(-1, 2, -2)])
+        assert container == [2, 4]
+
+    @pytest.mark.parametrize(
+        "sequence_type",
+        [ListSubclass, collections.UserList, bytearray, collections.deque],
+    )
+    @pytest.mark.parametrize(
+        "indices", [[0, 1], [1, -1, 3, 1], [slice(0, 2), 0], [slice(None, None, 2), 1]]
+    )
+    def test_other_sequences(self, sequence_type, indices):
+        """Any other mutable sequence has the same items deleted as a list."""
+        expected = list(range(6))
+        desugar.operator.delitem_many(expected, indices)
+        container = sequence_type(range(6))
+        desugar.operator.delitem_many(container, indices)
+        assert list(container) == expected
+
+    def test_dict(self):
+        container = {"a": 1, "b": 2, "c": 3}
+        desugar.operator.delitem_many(container, ["c", "a"])
+        assert container == {"b": 2}
+
+    def test_custom(self):
+        container = Subscriptable()
+        container.data.update(a=1, b=2)
+        desugar.operator.delitem_many(container, ["a"])
+        assert container.data == {"b": 2}
+
+    def test_no_delitem(self):
+        with pytest.raises(TypeError):
+            desugar.operator.delitem_many(object(), [0])
+
+
+class TestGetitemView:
+    @pytest.mark.parametrize("container", [b"abcdef", bytearray(b"abcdef")])
+    def test_slice(self, container):
+        """Slicing a buffer returns a view sharing its memory."""
+        view = desugar.operator.getitem_view(container, slice(1, None, 2))
+        assert isinstance(view, memoryview)
+        assert view == container[1::2]
+
+    def test_shared(self):
+        container = bytearray(b"abc")
+        view = desugar.operator.getitem_view(container, slice(1, 3))
+        container[1] = ord("z")
+        assert view.tobytes() == b"zc"
+
+    def test_index(self):
+        """Non-slice indices are handled by __getitem__()."""
+        assert desugar.operator.getitem_view(b"abc", 1) == ord("b")
+
+    def test_non_buffer(self):
+        """Containers without the buffer protocol are sliced normally."""
+        assert desugar.operator.getitem_view("abc", slice(1, None)) == "bc"
+        assert desugar.operator.getitem_view([1, 2, 3], slice(2)) == [1, 2]
+
+    def test_no_getitem(self):
+        with pytest.raises(TypeError):
+            desugar.operator.getitem_view(object(), slice(1))
@@ -1,5 +1,9 @@
+import asyncio
 import builtins
 import collections.abc
+import concurrent.futures
+import gc
+import threading
 import types
 import warnings
 
@@ -532,12 +536,151 @@ class TestAwait:
 
         assert list(range(3)) == list(desugar.builtins._await(coro()))
 
+    def test_result(self):
+        """The result of the awaitable is returned."""
+
+        @types.coroutine
+        def coro():
+            yield
+            return 42
+
+        def await_coro():
+            return (yield from desugar.builtins._await(coro()))
+
+        gen = await_coro()
+        next(gen)
+        with pytest.raises(StopIteration) as exc_info:
+            next(gen)
+        assert exc_info.value.value == 42
+
     def test_not_coroutine(self):
         """An object that isn't awaitable triggers a TypeError."""
         with pytest.raises(TypeError):
             list(desugar.builtins._await(None))
 
 
+class TestTrampoline:
+    @staticmethod
+    def chain(depth, leaf):
+        """Create a chain of `depth` coroutines awaiting each other via _await_flat()."""
+
+        @types.coroutine
+        def level(n):
+            if n:
+                return (yield from desugar.builtins._await_flat(level(n - 1))) + 1
+            else:
+                return (yield from desugar.builtins._await_flat(leaf()))
+
+        return level(depth)
+
+    def test_result(self):
+        """The result propagates back through every level."""
+
+        @types.coroutine
+        def leaf():
+            return (yield "leaf")
+
+        runner = desugar.builtins.trampoline(self.chain(10, leaf))
+        assert runner.send(None) == "leaf"
+        with pytest.raises(StopIteration) as exc_info:
+            runner.send(32)
+        assert exc_info.value.value == 42
+
+    def test_exception(self):
+        """Exceptions propagate through and can be caught by awaiting coroutines."""
+
+        @types.coroutine
+        def leaf():
+            yield
+            raise ValueError
+
+        @types.coroutine
+        def catcher():
+            try:
+                yield from desugar.builtins._await_flat(self.chain(5, leaf))
+            except ValueError:
+                return "caught"
+
+        runner = desugar.builtins.trampoline(catcher())
+        runner.send(None)
+        with pytest.raises(StopIteration) as exc_info:
+            runner.send(None)
+        assert exc_info.value.value == "caught"
+
+    def test_throw(self):
+        """Exceptions thrown into the trampoline reach the innermost coroutine."""
+
+        @types.coroutine
+        def leaf():
+            try:
+                yield
+            except KeyError:
+                return -1
+
+        runner = desugar.builtins.trampoline(self.chain(3, leaf))
+        runner.send(None)
+        with pytest.raises(StopIteration) as exc_info:
+            runner.throw(KeyError)
+        assert exc_info.value.value == 2
+
+    def test_close(self):
+        """Closing the trampoline closes every coroutine on the stack."""
+        closed = []
+
+        @types.coroutine
+        def level(n):
+            try:
+                if n:
+                    yield from desugar.builtins._await_flat(level(n - 1))
+                else:
+                    yield
+            finally:
+                closed.append(n)
+
+        runner = desugar.builtins.trampoline(level(2))
+        runner.send(None)
+        runner.close()
+        assert closed == [0, 1, 2]
+
+    @pytest.mark.asyncio
+    async def test_asyncio(self):
+        """Awaiting a trampoline runs native awaitables on the event loop."""
+
+        async def leaf():
+            await asyncio.sleep(0)
+            return 0
+
+        assert await desugar.builtins.trampoline(self.chain(20, leaf)) == 20
+
+    @pytest.mark.asyncio
+    async def test_without_trampoline(self):
+        """Without a trampoline, _await_flat() delegates like _await()."""
+
+        @types.coroutine
+        def leaf():
+            return (yield "leaf")
+
+        coroutine = self.chain(10, leaf)
+        assert coroutine.send(None) == "leaf"
+        with pytest.raises(StopIteration) as exc_info:
+            coroutine.send(32)
+        assert exc_info.value.value == 42
+
+        async def native_leaf():
+            await asyncio.sleep(0)
+            return 0
+
+        assert await self.chain(20, native_leaf) == 20
+
+    def test_not_awaitable(self):
+        @types.coroutine
+        def bad():
+            yield from desugar.builtins._await_flat(None)
+
+        with pytest.raises(TypeError):
+            desugar.builtins.trampoline(bad()).send(None)
+
+
 # Testing w/ Python requires Python 3.10.
 class TestAiter:
     def test_iterable(self):
@@ -585,6 +728,47 @@ class TestAiter:
         with pytest.raises(TypeError):
             desugar.builtins.aiter(AsyncIterable())
 
+    def test_async_generator(self):
+        """Async generators are async iterators."""
+
+        async def agen():
+            yield
+
+        iterator = agen()
+        assert desugar.builtins.aiter(iterator) is iterator
+
+    def test_desugared_anext(self):
+        """A desugared `async def __anext__()` is accepted."""
+
+        class AsyncIterator:
+            @types.coroutine
+            def __anext__(self):
+                yield from ()
+                return 42
+
+        class AsyncIterable:
+            def __aiter__(self):
+                return AsyncIterator()
+
+        assert isinstance(desugar.builtins.aiter(AsyncIterable()), AsyncIterator)
+
+    def test_cached_validation(self):
+        """Replacing a validated __anext__() is still detected."""
+
+        class AsyncIterator:
+            async def __anext__(self):
+                return 42
+
+        class AsyncIterable:
+            def __aiter__(self):
+                return AsyncIterator()
+
+        desugar.builtins.aiter(AsyncIterable())
+        desugar.builtins.aiter(AsyncIterable())
+        AsyncIterator.__anext__ = lambda self: 42
+        with pytest.raises(TypeError):
+            desugar.builtins.aiter(AsyncIterable())
+
 
 # Testing against Python requires Python 3.10.
 class TestAnext:
@@ -623,6 +807,471 @@ class TestAnext:
         assert (await desugar.builtins.anext(Iterator(), default)) is default
 
 
+class LatentIterator:
+
+    """An async iterator over a range which is safe to advance concurrently."""
+
+    def __init__(self, stop, delay=0):
+        self.next = 0
+        self.stop = stop
+        self.delay = delay
+        self.in_flight = self.max_in_flight = 0
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        value = self.next
+        self.next += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            # Later items finish first to check the ordering.
+            await asyncio.sleep(self.delay / (value + 1))
+        finally:
+            self.in_flight -= 1
+        if value >= self.stop:
+            raise StopAsyncIteration
+        return value
+
+
+class TestAnextMany:
+    @pytest.mark.asyncio
+    async def test_batch(self):
+        iterator = LatentIterator(5)
+        assert await desugar.builtins.anext_many(iterator, 3) == [0, 1, 2]
+        assert await desugar.builtins.anext_many(iterator, 3) == [3, 4]
+
+    @pytest.mark.asyncio
+    async def test_exhausted(self):
+        with pytest.raises(StopAsyncIteration):
+            await desugar.builtins.anext_many(LatentIterator(0), 3)
+
+    @pytest.mark.asyncio
+    async def test_default(self):
+        default = object()
+        iterator = LatentIterator(0)
+        assert await desugar.builtins.anext_many(iterator, 3, default) is default
+
+    @pytest.mark.asyncio
+    async def test_zero(self):
+        assert await desugar.builtins.anext_many(LatentIterator(0), 0) == []
+
+    @pytest.mark.asyncio
+    async def test_non_iterator(self):
+        with pytest.raises(TypeError):
+            await desugar.builtins.anext_many(object(), 1)
+
+
+class TestAprefetch:
+    @pytest.mark.asyncio
+    async def test_in_order(self):
+        """Items are produced in order with several reads in flight."""
+        iterator = LatentIterator(10, delay=0.01)
+        prefetch = desugar.builtins.aprefetch(iterator, 4, concurrent=True)
+        items = [item async for item in prefetch]
+        assert items == list(range(10))
+        assert iterator.max_in_flight == 4
+
+    @pytest.mark.asyncio
+    async def test_stateful(self):
+        """By default one read is in flight at a time, which an iterator
+        updating its state after awaiting relies on."""
+
+        class Stateful(LatentIterator):
+            async def __anext__(self):
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+                await asyncio.sleep(0)
+                self.in_flight -= 1
+                value = self.next
+                if value >= self.stop:
+                    raise StopAsyncIteration
+                self.next += 1
+                return value
+
+        iterator = Stateful(10)
+        items = [item async for item in desugar.builtins.aprefetch(iterator, 4)]
+        assert items == list(range(10))
+        assert iterator.max_in_flight == 1
+
+    @pytest.mark.asyncio
+    async def test_reads_ahead(self):
+        """Reads one at a time still get `depth` items ahead."""
+        iterator = LatentIterator(10)
+        prefetch = desugar.builtins.aprefetch(iterator, 4)
+        assert await prefetch.__anext__() == 0
+        await asyncio.sleep(0.05)
+        assert iterator.next == 5
+        await prefetch.aclose()
+
+    @pytest.mark.asyncio
+    async def test_async_generator(self):
+        """Async generators are advanced one call at a time."""
+
+        async def agen():
+            for x in range(5):
+                await asyncio.sleep(0)
+                yield x
+
+        prefetch = desugar.builtins.aprefetch(agen(), 4, concurrent=True)
+        items = [item async for item in prefetch]
+        assert items == list(range(5))
+
+    @pytest.mark.asyncio
+    async def test_exception(self):
+        """Exceptions from __anext__() are raised in order."""
+
+        class Failing(LatentIterator):
+            async def __anext__(self):
+                value = await super().__anext__()
+                if value == 2:
+                    raise ValueError
+                return value
+
+        items = []
+        with pytest.raises(ValueError):
+            async for item in desugar.builtins.aprefetch(
+                Failing(5), 3, concurrent=True
+            ):
+                items.append(item)
+        assert items == [0, 1]
+
+    @pytest.mark.asyncio
+    async def test_close(self):
+        """Closing early cancels the reads in flight."""
+        iterator = LatentIterator(10, delay=0.01)
+        prefetch = desugar.builtins.aprefetch(iterator, 4)
+        assert await prefetch.__anext__() == 0
+        await prefetch.aclose()
+        await asyncio.sleep(0)
+        assert iterator.in_flight == 0
+
+    @pytest.mark.asyncio
+    async def test_bad_depth(self):
+        with pytest.raises(ValueError):
+            await desugar.builtins.aprefetch(LatentIterator(1), 0).__anext__()
+
+
+class TestAmap:
+    @staticmethod
+    async def double(item):
+        # Later items finish first.
+        await asyncio.sleep(0.01 / (item + 1))
+        return item * 2
+
+    @pytest.mark.asyncio
+    async def test_ordered(self):
+        results = [
+            result
+            async for result in desugar.builtins.amap(
+                self.double, LatentIterator(6), concurrency=3
+            )
+        ]
+        assert results == [0, 2, 4, 6, 8, 10]
+
+    @pytest.mark.asyncio
+    async def test_unordered(self):
+        results = [
+            result
+            async for result in desugar.builtins.amap(
+                self.double, LatentIterator(6), concurrency=6, ordered=False
+            )
+        ]
+        assert sorted(results) == [0, 2, 4, 6, 8, 10]
+        assert results != sorted(results)
+
+    @pytest.mark.asyncio
+    async def test_concurrency_limit(self):
+        """No more than `concurrency` calls run at once."""
+        running = max_running = 0
+
+        async def track(item):
+            nonlocal running, max_running
+            running += 1
+            max_running = max(running, max_running)
+            await asyncio.sleep(0.001)
+            running -= 1
+            return item
+
+        source = LatentIterator(20)
+        results = [
+            result
+            async for result in desugar.builtins.amap(track, source, concurrency=4)
+        ]
+        assert results == list(range(20))
+        assert max_running == 4
+
+    @pytest.mark.asyncio
+    async def test_backpressure(self):
+        """The source is only read as calls finish."""
+        source = LatentIterator(100)
+        finishing = asyncio.Event()
+
+        async def wait(item):
+            await finishing.wait()
+            return item
+
+        results = desugar.builtins.amap(wait, source, concurrency=2)
+        first = asyncio.ensure_future(results.__anext__())
+        await asyncio.sleep(0.01)
+        assert source.next == 2
+        finishing.set()
+        assert await first == 0
+        await results.aclose()
+
+    @pytest.mark.asyncio
+    async def test_slot_released(self):
+        """A call finishing behind a slower, earlier one frees its slot."""
+        last_started = asyncio.Event()
+
+        async def wait_for_last(item):
+            if item == 0:
+                await last_started.wait()
+            elif item == 3:
+                last_started.set()
+            return item
+
+        async def consume():
+            return [
+                result
+                async for result in desugar.builtins.amap(
+                    wait_for_last, LatentIterator(4), concurrency=2
+                )
+            ]
+
+        assert await asyncio.wait_for(consume(), 1) == list(range(4))
+
+    @pytest.mark.asyncio
+    async def test_ordered_window(self):
+        """A blocked call at the head stops the source being read ahead."""
+        source = LatentIterator(float("inf"))
+        unblock = asyncio.Event()
+
+        async def block_first(item):
+            if item == 0:
+                await unblock.wait()
+            return item
+
+        results = desugar.builtins.amap(block_first, source, concurrency=4)
+        first = asyncio.ensure_future(results.__anext__())
+        await asyncio.sleep(0.05)
+        assert source.next == 8
+        unblock.set()
+        assert await first == 0
+        await results.aclose()
+
+    @pytest.mark.asyncio
+    async def test_first_failure(self):
+        """The exception raised is that of the first call to fail."""
+
+        async def fail(item):
+            if item == 0:
+                await asyncio.sleep(0.01)
+                raise KeyError
+            elif item == 2:
+                raise ValueError
+            await asyncio.sleep(1)
+
+        with pytest.raises(ValueError):
+            async for _ in desugar.builtins.amap(
+                fail, LatentIterator(3), concurrency=3
+            ):
+                pass
+
+    @pytest.mark.asyncio
+    async def test_exception(self):
+        """An exception from a call is raised and the other calls are cancelled."""
+        cancelled = []
+
+        async def fail(item):
+            if item == 1:
+                raise ValueError
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                cancelled.append(item)
+                raise
+
+        with pytest.raises(ValueError):
+            async for _ in desugar.builtins.amap(
+                fail, LatentIterator(3), concurrency=3, ordered=False
+            ):
+                pass
+        await asyncio.sleep(0)
+        assert sorted(cancelled) == [0, 2]
+
+    @pytest.mark.asyncio
+    async def test_cancellation(self):
+        """Cancelling the consumer cancels the running calls."""
+        cancelled = []
+
+        async def block(item):
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                cancelled.append(item)
+                raise
+
+        async def consume():
+            async for _ in desugar.builtins.amap(
+                block, LatentIterator(10), concurrency=2
+            ):
+                pass
+
+        task = asyncio.ensure_future(consume())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0)
+        assert sorted(cancelled) == [0, 1]
+
+    @pytest.mark.asyncio
+    async def test_bad_concurrency(self):
+        with pytest.raises(ValueError):
+            await desugar.builtins.amap(
+                self.double, LatentIterator(1), concurrency=0
+            ).__anext__()
+
+
+class TestAiterFromSync:
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("batch", [1, 2, 3, 10])
+    async def test_items(self, batch):
+        aiterator = desugar.builtins.aiter_from_sync(range(7), batch=batch)
+        assert desugar.builtins.aiter(aiterator) is aiterator
+        assert [item async for item in aiterator] == list(range(7))
+
+    @pytest.mark.asyncio
+    async def test_executor(self):
+        """The iterator is advanced in the given executor, not the event loop."""
+        threads = set()
+
+        def gen():
+            for x in range(4):
+                threads.add(threading.get_ident())
+                yield x
+
+        with concurrent.futures.ThreadPoolExecutor(1) as executor:
+            aiterator = desugar.builtins.aiter_from_sync(gen(), executor, batch=2)
+            assert [item async for item in aiterator] == list(range(4))
+        assert threads and threading.get_ident() not in threads
+
+    @pytest.mark.asyncio
+    async def test_callable_sentinel(self):
+        values = iter([1, 2, 3, None, 4])
+        aiterator = desugar.builtins.aiter_from_sync(iter(lambda: next(values), None))
+        assert [item async for item in aiterator] == [1, 2, 3]
+
+    @pytest.mark.asyncio
+    async def test_exception(self):
+        """An exception is raised after the items which came before it."""
+
+        def gen():
+            yield 1
+            raise ValueError
+
+        items = []
+        with pytest.raises(ValueError):
+            async for item in desugar.builtins.aiter_from_sync(gen(), batch=5):
+                items.append(item)
+        assert items == [1]
+
+    @pytest.mark.asyncio
+    async def test_aclose(self):
+        closed = False
+
+        def gen():
+            nonlocal closed
+            try:
+                yield from range(10)
+            finally:
+                closed = True
+
+        aiterator = desugar.builtins.aiter_from_sync(gen())
+        assert await aiterator.__anext__() == 0
+        await aiterator.aclose()
+        assert closed
+        with pytest.raises(StopAsyncIteration):
+            await aiterator.__anext__()
+
+    @pytest.mark.asyncio
+    async def test_cancel(self):
+        """Cancelling closes the iterator once the worker thread is done with it."""
+        started = threading.Event()
+        release = threading.Event()
+        closed = threading.Event()
+
+        def gen():
+            try:
+                started.set()
+                release.wait()
+                yield 1
+            finally:
+                closed.set()
+
+        aiterator = desugar.builtins.aiter_from_sync(gen())
+        task = asyncio.ensure_future(aiterator.__anext__())
+        while not started.is_set():
+            await asyncio.sleep(0.001)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        release.set()
+        for _ in range(100):
+            if closed.is_set():
+                break
+            await asyncio.sleep(0.01)
+        assert closed.is_set()
+
+    @pytest.mark.asyncio
+    async def test_cancel_close_error(self):
+        """An error closing the iterator after cancellation is reported."""
+        started = threading.Event()
+        release = threading.Event()
+        error = ValueError("close")
+
+        class Iterator:
+            def __iter__(self):
+                return self
+
+            def __next__(self):
+                started.set()
+                release.wait()
+                return 1
+
+            def close(self):
+                raise error
+
+        contexts = []
+        loop = asyncio.get_running_loop()
+        loop.set_exception_handler(lambda loop, context: contexts.append(context))
+        try:
+            aiterator = desugar.builtins.aiter_from_sync(Iterator())
+            task = asyncio.ensure_future(aiterator.__anext__())
+            while not started.is_set():
+                await asyncio.sleep(0.001)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            release.set()
+            for _ in range(100):
+                if contexts:
+                    break
+                await asyncio.sleep(0.01)
+            gc.collect()
+        finally:
+            loop.set_exception_handler(None)
+        assert len(contexts) == 1
+        assert contexts[0]["exception"] is error
+        assert "never retrieved" not in contexts[0]["message"]
+
+    def test_bad_batch(self):
+        with pytest.raises(ValueError):
+            desugar.builtins.aiter_from_sync([], batch=0)
+
+
 @pytest.mark.parametrize("list", [builtins.list, desugar.builtins.list])
 class TestList:
 
@@ -0,0 +1,176 @@
+import os
+
+import pytest
+
+import desugar.cache as cache
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "source.py"
+    path.write_text("result = 1 + 2\n", encoding="utf-8")
+    return path
+
+
+def touch(path):
+    """Change the modification time of a file."""
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+class TestLookup:
+    def test_miss_then_hit(self, tmp_path, source):
+        with cache.Cache(tmp_path / "cache") as store:
+            path, entry, hit = store.lookup(source)
+            assert not hit
+            assert "__add__" in path.read_text(encoding="utf-8")
+            assert entry.output_size == path.stat().st_size
+            again, _, hit = store.lookup(source)
+            assert hit
+            assert again == path
+            assert (store.stats.hits, store.stats.misses) == (1, 1)
+            assert store.stats.bytes_written == store.stats.bytes_read
+
+    def test_changed_source(self, tmp_path, source):
+        with cache.Cache(tmp_path / "cache") as store:
+            store.lookup(source)
+            source.write_text("result = 3 + 4\n", encoding="utf-8")
+            touch(source)
+            path, _, hit = store.lookup(source)
+            assert not hit
+            assert "4" in path.read_text(encoding="utf-8")
+
+    def test_same_contents(self, tmp_path, source):
+        """A file with the same contents as a cached one is a hit."""
+        copy = tmp_path / "copy.py"
+        copy.write_bytes(source.read_bytes())
+        with cache.Cache(tmp_path / "cache") as store:
+            path, _, _ = store.lookup(source)
+            touch(source)
+            assert store.lookup(source)[::2] == (path, True)
+            assert store.lookup(copy)[::2] == (path, True)
+
+    def test_rules(self, tmp_path, source):
+        """Output for different rules is cached separately."""
+        with cache.Cache(tmp_path / "cache") as store:
+            all_rules, _, _ = store.lookup(source)
+            attribute, _, hit = store.lookup(source, frozenset(["attribute"]))
+            assert not hit
+            assert attribute != all_rules
+            assert "__add__" not in attribute.read_text(encoding="utf-8")
+
+    def test_unknown_rule(self, tmp_path, source):
+        with cache.Cache(tmp_path / "cache") as store:
+            with pytest.raises(ValueError):
+                store.lookup(source, frozenset(["nope"]))
+
+    def test_syntax_error(self, tmp_path):
+        """Nothing is cached for a file which cannot be desugared."""
+        bad = tmp_path / "bad.py"
+        bad.write_text("def", encoding="utf-8")
+        directory = tmp_path / "cache"
+        with cache.Cache(directory) as store:
+            with pytest.raises(SyntaxError):
+                store.lookup(bad)
+        assert not [path for path in directory.rglob("*") if path.is_file()]
+
+
+class TestIndex:
+    def test_saved(self, tmp_path, source):
+        directory = tmp_path / "cache"
+        with cache.Cache(directory) as store:
+            path, _, _ = store.lookup(source)
+            store.save()
+        with cache.Cache(directory) as store:
+            assert store.lookup(source)[::2] == (path, True)
+
+    def test_many(self, tmp_path):
+        """Entries are found by binary search."""
+        directory = tmp_path / "cache"
+        sources = []
+        for n in range(50):
+            path = tmp_path / f"source{n}.py"
+            path.write_text(f"x = {n}\n", encoding="utf-8")
+            sources.append(path)
+        with cache.Cache(directory) as store:
+            for path in sources:
+                store.lookup(path)
+            store.save()
+        size = (directory / "index").stat().st_size
+        assert size == cache._HEADER.size + 50 * cache._RECORD.size
+        with cache.Cache(directory) as store:
+            assert all(store.lookup(path)[2] for path in sources)
+
+    def test_shared(self, tmp_path, source):
+        """Entries from other caches can be recorded and saved."""
+        directory = tmp_path / "cache"
+        with cache.Cache(directory) as worker:
+            _, entry, hit = worker.lookup(source)
+        with cache.Cache(directory) as parent:
+            parent.record(entry, hit)
+            parent.save()
+            assert parent.stats.misses == 1
+        with cache.Cache(directory) as store:
+            assert store.lookup(source)[2]
+
+    def test_corrupt(self, tmp_path, source):
+        """A corrupt index is ignored and replaced."""
+        directory = tmp_path / "cache"
+        directory.mkdir()
+        (directory / "index").write_bytes(b"garbage")
+        with cache.Cache(directory) as store:
+            store.lookup(source)
+            store.save()
+        with cache.Cache(directory) as store:
+            assert store.lookup(source)[2]
+
+    def test_empty(self, tmp_path, source):
+        directory = tmp_path / "cache"
+        directory.mkdir()
+        (directory / "index").write_bytes(b"")
+        with cache.Cache(directory) as store:
+            assert not store.lookup(source)[2]
+
+    def test_eviction(self, tmp_path):
+        """The least recently used entries are evicted first."""
+        directory = tmp_path / "cache"
+        sources = []
+        for name in "abc":
+            path = tmp_path / f"{name}.py"
+            path.write_text(f"{name} = 1\n", encoding="utf-8")
+            sources.append(path)
+        with cache.Cache(directory) as store:
+            paths = [store.lookup(path)[0] for path in sources]
+            store.lookup(sources[0])  # Now the most recently used.
+            store.max_size = sum(path.stat().st_size for path in paths[::2])
+            store.save()
+            assert store.stats.evicted == 1
+        assert [path.exists() for path in paths] == [True, False, True]
+        with cache.Cache(directory) as store:
+            assert [store.lookup(path)[2] for path in sources] == [True, False, True]
+
+
+class TestAtomicPath:
+    def test_success(self, tmp_path):
+        path = tmp_path / "nested" / "file.txt"
+        with cache.atomic_path(path) as temp_path:
+            temp_path.write_text("contents", encoding="utf-8")
+            assert not path.exists()
+        assert path.read_text(encoding="utf-8") == "contents"
+        assert os.listdir(path.parent) == ["file.txt"]
+        assert path.stat().st_mode & 0o777 == cache._file_mode()
+
+    def test_file_mode(self):
+        umask = os.umask(0)
+        os.umask(umask)
+        assert cache._file_mode() == 0o666 & ~umask
+
+    def test_failure(self, tmp_path):
+        path = tmp_path / "file.txt"
+        path.write_text("previous", encoding="utf-8")
+        with pytest.raises(ZeroDivisionError):
+            with cache.atomic_path(path) as temp_path:
+                temp_path.write_text("partial", encoding="utf-8")
+                1 / 0
+        assert path.read_text(encoding="utf-8") == "previous"
+        assert os.listdir(tmp_path) == ["file.txt"]
@@ -0,0 +1,165 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+import desugar.importer
+
+
+@pytest.fixture
+def package(tmp_path, monkeypatch):
+    """Create a package named `sugary` on `sys.path`."""
+    root = tmp_path / "sugary"
+    root.mkdir()
+    (root / "__init__.py").write_text(
+        "from . import child\nresult = [x * 2 for x in child.values() if x]\n",
+        encoding="utf-8",
+    )
+    (root / "child.py").write_text(
+        "def values():\n    return (0, 1, 2)\n", encoding="utf-8"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(sys, "dont_write_bytecode", False)
+    yield root
+    for name in list(sys.modules):
+        if name == "sugary" or name.startswith("sugary."):
+            del sys.modules[name]
+    importlib.invalidate_caches()
+
+
+@pytest.fixture
+def finder():
+    finder = desugar.importer.install("sugary")
+    yield finder
+    desugar.importer.uninstall(finder)
+
+
+def desugared_pycs(package):
+    return sorted(
+        path.name
+        for path in (package / "__pycache__").glob("*.pyc")
+        if ".opt-desugar" in path.name
+    )
+
+
+class TestFinder:
+    def test_import(self, package, finder):
+        import sugary
+
+        assert sugary.result == [2, 4]
+        assert isinstance(sugary.__loader__, desugar.importer.DesugarLoader)
+        assert isinstance(sugary.child.__loader__, desugar.importer.DesugarLoader)
+        assert "_desugar_builtins" in vars(sugary)
+        assert ".opt-desugar" in sugary.__cached__
+
+    def test_other_modules(self, package, finder):
+        """Modules which were not named are left alone."""
+        assert finder.find_spec("sugar", None) is None
+        assert finder.find_spec("json", None) is None
+        assert finder.find_spec("sugaryx", None) is None
+
+    def test_never_desugar(self, package):
+        """desugar itself is never desugared."""
+        finder = desugar.importer.DesugarFinder(["desugar"])
+        assert finder.find_spec("desugar.builtins", None) is None
+
+    def test_uninstall(self, package):
+        finder = desugar.importer.install("sugary")
+        desugar.importer.uninstall(finder)
+        assert finder not in sys.meta_path
+        import sugary
+
+        assert not isinstance(sugary.__loader__, desugar.importer.DesugarLoader)
+
+    def test_unknown_rule(self):
+        with pytest.raises(ValueError):
+            desugar.importer.install("sugary", rules=["nope"])
+
+
+class TestBytecodeCache:
+    def import_fresh(self):
+        for name in list(sys.modules):
+            if name == "sugary" or name.startswith("sugary."):
+                del sys.modules[name]
+        return importlib.import_module("sugary")
+
+    def test_written_and_used(self, package, finder, monkeypatch):
+        self.import_fresh()
+        assert len(desugared_pycs(package)) == 2
+
+        def fail(*args, **kwargs):
+            raise AssertionError("source was desugared again")
+
+        monkeypatch.setattr(desugar.transform, "transform", fail)
+        assert self.import_fresh().result == [2, 4]
+
+    def test_separate_from_regular_bytecode(self, package):
+        """Regular imports neither use nor overwrite the desugared bytecode."""
+        finder = desugar.importer.install("sugary")
+        try:
+            self.import_fresh()
+        finally:
+            desugar.importer.uninstall(finder)
+        sugary = self.import_fresh()
+        assert "_desugar_builtins" not in vars(sugary)
+        assert len(desugared_pycs(package)) == 2
+
+    def test_stale(self, package, finder):
+        self.import_fresh()
+        init = package / "__init__.py"
+        init.write_text("result = 'changed!'\n", encoding="utf-8")
+        stat = init.stat()
+        os.utime(init, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2_000_000_000))
+        assert self.import_fresh().result == "changed!"
+
+    def test_rules_change_tag(self, package, finder):
+        self.import_fresh()
+        other = desugar.importer.install("sugary", rules=["attribute"])
+        try:
+            self.import_fresh()
+        finally:
+            desugar.importer.uninstall(other)
+        assert len(desugared_pycs(package)) == 4
+
+    def test_hash_based(self, package):
+        finder = desugar.importer.install("sugary", hash_based=True)
+        try:
+            self.import_fresh()
+            init = package / "__init__.py"
+            stat = init.stat()
+            # Same size and modification time, but different contents.
+            init.write_text(
+                init.read_text(encoding="utf-8").replace("2", "3"), encoding="utf-8"
+            )
+            os.utime(init, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+            assert self.import_fresh().result == [3, 6]
+        finally:
+            desugar.importer.uninstall(finder)
+
+    def test_corrupt(self, package, finder):
+        self.import_fresh()
+        for name in desugared_pycs(package):
+            (package / "__pycache__" / name).write_bytes(b"garbage")
+        assert self.import_fresh().result == [2, 4]
+
+    def test_dont_write_bytecode(self, package, finder, monkeypatch):
+        monkeypatch.setattr(sys, "dont_write_bytecode", True)
+        self.import_fresh()
+        assert not (package / "__pycache__").exists()
+
+    def test_line_numbers(self, package, finder):
+        """Tracebacks point at the original source."""
+        (package / "child.py").write_text(
+            "\n\ndef values():\n    for x in ():\n        pass\n    1 / 0\n",
+            encoding="utf-8",
+        )
+        with pytest.raises(ZeroDivisionError) as exc_info:
+            self.import_fresh()
+        entries = [
+            entry
+            for entry in exc_info.traceback
+            if os.path.basename(entry.path) == "child.py"
+        ]
+        # Traceback entries count lines from 0.
+        assert [entry.lineno + 1 for entry in entries] == [6]
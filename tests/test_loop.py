@@ -0,0 +1,224 @@
+import socket
+import time
+import types
+
+import pytest
+
+import desugar.builtins
+import desugar.loop
+
+
+@types.coroutine
+def desugared(value):
+    """A desugared coroutine: `await sleep(0); return value`."""
+    yield from desugar.builtins._await(desugar.loop.sleep(0))
+    return value
+
+
+class TestRun:
+    def test_result(self):
+        assert desugar.loop.run(desugared(42)) == 42
+
+    def test_native(self):
+        """Native coroutines can await the loop's functions."""
+
+        async def native():
+            await desugar.loop.sleep(0)
+            return await desugared(42)
+
+        assert desugar.loop.run(native()) == 42
+
+    def test_exception(self):
+        @types.coroutine
+        def fail():
+            yield from desugar.loop.sleep(0)
+            raise ValueError
+
+        with pytest.raises(ValueError):
+            desugar.loop.run(fail())
+
+    def test_unsupported_request(self):
+        """Yielding something the loop doesn't understand raises TypeError."""
+
+        @types.coroutine
+        def bad():
+            yield 42
+
+        with pytest.raises(TypeError):
+            desugar.loop.run(bad())
+
+    def test_deadlock(self):
+        """A loop with nothing left that could make progress raises RuntimeError."""
+
+        async def forever():
+            await desugar.loop.join(desugar.loop.Task(None))
+
+        with pytest.raises(RuntimeError):
+            desugar.loop.run(forever())
+
+    def test_unfinished_closed(self):
+        """Tasks still running when the main coroutine finishes are closed."""
+        closed = False
+
+        async def background():
+            nonlocal closed
+            try:
+                await desugar.loop.sleep(10)
+            finally:
+                closed = True
+
+        async def main():
+            await desugar.loop.spawn(background())
+            await desugar.loop.sleep(0)
+
+        desugar.loop.run(main())
+        assert closed
+
+
+class TestTasks:
+    def test_round_robin(self):
+        """Ready tasks take turns."""
+        order = []
+
+        async def worker(name):
+            for _ in range(3):
+                order.append(name)
+                await desugar.loop.sleep(0)
+
+        async def main():
+            tasks = [await desugar.loop.spawn(worker(name)) for name in "ab"]
+            for task in tasks:
+                await desugar.loop.join(task)
+
+        desugar.loop.run(main())
+        assert sorted(order) == list("aaabbb")
+        assert "".join(order) != "aaabbb"
+
+    def test_join(self):
+        async def main():
+            task = await desugar.loop.spawn(desugared(42))
+            return await desugar.loop.join(task)
+
+        assert desugar.loop.run(main()) == 42
+
+    def test_join_exception(self):
+        async def fail():
+            raise ValueError
+
+        async def main():
+            task = await desugar.loop.spawn(fail())
+            with pytest.raises(ValueError):
+                await desugar.loop.join(task)
+            return task.exception
+
+        assert isinstance(desugar.loop.run(main()), ValueError)
+
+    def test_many(self):
+        """100,000 concurrent tasks."""
+        count = 100_000
+        finished = 0
+
+        async def worker():
+            nonlocal finished
+            await desugar.loop.sleep(0)
+            await desugar.loop.sleep(0)
+            finished += 1
+
+        async def main():
+            tasks = [await desugar.loop.spawn(worker()) for _ in range(count)]
+            for task in tasks:
+                await desugar.loop.join(task)
+
+        desugar.loop.run(main())
+        assert finished == count
+
+
+class TestTimers:
+    def test_sleep(self):
+        async def main():
+            start = time.monotonic()
+            await desugar.loop.sleep(0.02)
+            return time.monotonic() - start
+
+        assert desugar.loop.run(main()) >= 0.02
+
+    def test_order(self):
+        """Timers fire in order of their deadlines."""
+        order = []
+
+        async def sleeper(delay):
+            await desugar.loop.sleep(delay)
+            order.append(delay)
+
+        async def main():
+            tasks = [
+                await desugar.loop.spawn(sleeper(delay)) for delay in (0.03, 0.01, 0.02)
+            ]
+            for task in tasks:
+                await desugar.loop.join(task)
+
+        desugar.loop.run(main())
+        assert order == [0.01, 0.02, 0.03]
+
+
+class TestIO:
+    def test_echo(self):
+        a, b = socket.socketpair()
+        a.setblocking(False)
+        b.setblocking(False)
+
+        async def echo():
+            while data := await desugar.loop.sock_recv(b, 1024):
+                await desugar.loop.sock_sendall(b, data)
+
+        async def main():
+            await desugar.loop.spawn(echo())
+            replies = []
+            for message in (b"spam", b"ham", b"eggs"):
+                await desugar.loop.sock_sendall(a, message)
+                replies.append(await desugar.loop.sock_recv(a, 1024))
+            return replies
+
+        with a, b:
+            assert desugar.loop.run(main()) == [b"spam", b"ham", b"eggs"]
+
+    def test_read_and_write(self):
+        """One task may wait to read while another waits to write the same socket."""
+        a, b = socket.socketpair()
+        a.setblocking(False)
+        b.setblocking(False)
+
+        async def reader():
+            await desugar.loop.wait_readable(a)
+            return a.recv(10)
+
+        async def writer():
+            await desugar.loop.wait_writable(a)
+            a.send(b"out")
+
+        async def main():
+            read = await desugar.loop.spawn(reader())
+            await desugar.loop.spawn(writer())
+            await desugar.loop.sleep(0.01)
+            assert b.recv(10) == b"out"
+            b.send(b"in")
+            return await desugar.loop.join(read)
+
+        with a, b:
+            assert desugar.loop.run(main()) == b"in"
+
+    def test_double_wait(self):
+        """Two tasks cannot wait for the same event on the same file object."""
+        a, b = socket.socketpair()
+
+        async def waiter():
+            await desugar.loop.wait_readable(a)
+
+        async def main():
+            await desugar.loop.spawn(waiter())
+            await desugar.loop.sleep(0)
+            await desugar.loop.wait_readable(a)
+
+        with a, b:
+            with pytest.raises(RuntimeError):
+                desugar.loop.run(main())
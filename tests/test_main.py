@@ -0,0 +1,114 @@
+import ast
+import os
+
+import pytest
+
+import desugar.__main__ as cli
+
+
+@pytest.fixture
+def tree(tmp_path):
+    source = tmp_path / "source"
+    (source / "package").mkdir(parents=True)
+    (source / "small.py").write_text("result = 1 + 2\n", encoding="utf-8")
+    (source / "package" / "large.py").write_text(
+        "".join(f"x{n} = {n} * 2\n" for n in range(100)), encoding="utf-8"
+    )
+    (source / "notes.txt").write_text("not Python", encoding="utf-8")
+    return source
+
+
+def run_output(path):
+    namespace = {}
+    exec(compile(path.read_text(encoding="utf-8"), str(path), "exec"), namespace)
+    return namespace
+
+
+class TestFindFiles:
+    def test_largest_first(self, tree):
+        files = cli.find_files(tree)
+        assert [path.name for _, path in files] == ["large.py", "small.py"]
+        assert files[0][0] > files[1][0]
+
+    def test_single_file(self, tree):
+        assert cli.find_files(tree / "small.py") == [
+            ((tree / "small.py").stat().st_size, tree / "small.py")
+        ]
+
+
+class TestDesugarFile:
+    def test_success(self, tmp_path, tree):
+        output = tmp_path / "out" / "small.py"
+        result = cli.desugar_file(tree / "small.py", output, frozenset(["binary"]))
+        assert result.error is None
+        assert result.seconds >= 0
+        assert run_output(output)["result"] == 3
+        assert "__add__" in output.read_text(encoding="utf-8")
+
+    def test_error_keeps_previous_output(self, tmp_path):
+        """A failure leaves the existing output untouched with no temporary file."""
+        source = tmp_path / "bad.py"
+        source.write_text("def", encoding="utf-8")
+        output_dir = tmp_path / "out"
+        output_dir.mkdir()
+        output = output_dir / "bad.py"
+        output.write_text("previous", encoding="utf-8")
+        result = cli.desugar_file(source, output, frozenset())
+        assert result.error.startswith("SyntaxError")
+        assert output.read_text(encoding="utf-8") == "previous"
+        assert os.listdir(output_dir) == ["bad.py"]
+
+    def test_encoding_declaration(self, tmp_path):
+        source = tmp_path / "latin.py"
+        source.write_bytes(b"# -*- coding: latin-1 -*-\nresult = '\xe9'\n")
+        output = tmp_path / "out.py"
+        assert cli.desugar_file(source, output, frozenset()).error is None
+        assert run_output(output)["result"] == "\xe9"
+
+
+class TestMain:
+    @pytest.mark.parametrize("jobs", ["1", "2"])
+    def test_tree(self, tmp_path, tree, capsys, jobs):
+        output = tmp_path / "output"
+        assert cli.main([str(tree), str(output), "--jobs", jobs]) == 0
+        assert run_output(output / "small.py")["result"] == 3
+        assert run_output(output / "package" / "large.py")["x99"] == 198
+        assert not (output / "notes.txt").exists()
+        stdout, stderr = capsys.readouterr()
+        assert len(stdout.splitlines()) == 2
+        assert "2/2 files" in stderr
+
+    def test_rules(self, tmp_path, tree):
+        output = tmp_path / "output"
+        assert cli.main([str(tree), str(output), "--rules", "attribute"]) == 0
+        module = ast.parse((output / "small.py").read_text(encoding="utf-8"))
+        assert isinstance(module.body[-1].value, ast.BinOp)
+
+    def test_unknown_rule(self, tmp_path, tree, capsys):
+        with pytest.raises(SystemExit):
+            cli.main([str(tree), str(tmp_path), "--rules", "attribute,nope"])
+        assert "nope" in capsys.readouterr().err
+
+    def test_failure(self, tmp_path, tree, capsys):
+        (tree / "bad.py").write_text("def", encoding="utf-8")
+        output = tmp_path / "output"
+        assert cli.main([str(tree), str(output), "--quiet"]) == 1
+        stdout, stderr = capsys.readouterr()
+        assert not stdout
+        assert "bad.py: SyntaxError" in stderr
+        assert "2/3 files" in stderr
+        assert (output / "small.py").exists()
+
+    def test_cache(self, tmp_path, tree, capsys):
+        output = tmp_path / "output"
+        args = [str(tree), str(output), "--cache", str(tmp_path / "cache")]
+        assert cli.main([*args, "--cache-stats"]) == 0
+        assert "0 hits, 2 misses" in capsys.readouterr().err
+        (output / "small.py").unlink()
+        assert cli.main([*args, "--cache-stats"]) == 0
+        assert "2 hits, 0 misses" in capsys.readouterr().err
+        assert run_output(output / "small.py")["result"] == 3
+
+    def test_cache_stats_without_cache(self, tmp_path, tree):
+        with pytest.raises(SystemExit):
+            cli.main([str(tree), str(tmp_path), "--cache-stats"])
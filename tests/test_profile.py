@@ -0,0 +1,130 @@
+import textwrap
+
+import pytest
+
+import desugar.profile as profile
+
+SOURCE = textwrap.dedent(
+    """
+    def scale(values, factor):
+        result = []
+        for value in values:
+            result.append(value * factor)
+        return result
+    def describe(value):
+        text = "value: "
+        text += str(value).upper()
+        return text
+    def add(a, b):
+        return a + b < 10
+    result = [
+        scale([1.0, 2.0], 3.0),
+        describe("x"),
+        add(1, 2),
+        add(1.5, 2),
+        add("a", "b") if False else None,
+    ]
+    """
+)
+
+
+def run(source):
+    namespace = {"__name__": "example"}
+    exec(compile(source, "<example>", "exec"), namespace)
+    return namespace["result"]
+
+
+@pytest.fixture
+def recorded():
+    recorded = profile.recorded()
+    recorded.clear()
+    yield recorded
+    recorded.clear()
+
+
+class TestInstrument:
+    def test_same_result(self, recorded):
+        assert run(profile.instrument(SOURCE, "example")) == run(SOURCE)
+
+    def test_records(self, recorded):
+        run(profile.instrument(SOURCE, "example"))
+        counts = {
+            site.partition(":")[2]: count for site, count in recorded.sites.items()
+        }
+        assert counts["5:22:5:36"] == {"float,float": 2}
+        assert counts["12:11:12:16"] == {"int,int": 1, "float,int": 1}
+        assert counts["12:11:12:21"] == {"int,int": 1, "float,int": 1}
+        assert counts["9:4:9:30"] == {"str,str": 1}
+        # `result.append` and `str(value).upper`.
+        assert counts["5:8:5:21"] == {"list": 2}
+        assert counts["9:12:9:28"] == {"str": 1}
+
+    def test_unknown_rule(self):
+        with pytest.raises(ValueError):
+            profile.instrument("a", "example", ["not a rule"])
+
+
+class TestSpecialize:
+    def test_monomorphic(self, recorded):
+        run(profile.instrument(SOURCE, "example"))
+        desugared = profile.specialize(SOURCE, "example", recorded)
+        assert "_builtins.float.__mul__(value, factor)" in desugared
+        assert "_builtins.str.__add__(" in desugared
+        assert "_builtins.getattr(result, 'append')" in desugared
+        # `add()` was called with both `int` and `float`.
+        assert (
+            "_desugar_operator.__lt__(_desugar_operator.__add__(a, b), 10)" in desugared
+        )
+        assert "_builtins.int.__" not in desugared
+        assert run(desugared) == run(SOURCE)
+
+    def test_other_types(self, recorded):
+        """The generic path is taken when the types differ from the profile."""
+        run(profile.instrument(SOURCE, "example"))
+        desugared = profile.specialize(SOURCE, "example", recorded)
+        namespace = {"__name__": "example"}
+        exec(compile(desugared, "<example>", "exec"), namespace)
+        assert namespace["scale"]([1, 2], 3) == [3, 6]
+        assert namespace["scale"](["a"], 2) == ["aa"]
+        assert namespace["describe"](b"a") == "value: B'A'"
+
+    def test_other_module(self, recorded):
+        run(profile.instrument(SOURCE, "example"))
+        desugared = profile.specialize(SOURCE, "other", recorded)
+        assert "_builtins.float.__mul__" not in desugared
+
+
+class TestProfile:
+    def test_round_trip(self, tmp_path):
+        path = tmp_path / "profile.json"
+        original = profile.Profile({"app:1:0:1:5": {"int,int": 3}})
+        original.dump(path)
+        assert profile.Profile.load(path).sites == original.sites
+
+    def test_not_a_profile(self, tmp_path):
+        path = tmp_path / "profile.json"
+        path.write_text("[]", encoding="utf-8")
+        with pytest.raises(ValueError):
+            profile.Profile.load(path)
+
+    def test_merge(self, tmp_path):
+        paths = [tmp_path / "a.json", tmp_path / "b.json"]
+        profile.Profile({"app:1:0:1:5": {"int,int": 3}}).dump(paths[0])
+        profile.Profile(
+            {"app:1:0:1:5": {"int,int": 1, "str,str": 2}, "app:2:0:2:5": {"str": 1}}
+        ).dump(paths[1])
+        merged = profile.merge(paths)
+        assert merged.sites == {
+            "app:1:0:1:5": {"int,int": 4, "str,str": 2},
+            "app:2:0:2:5": {"str": 1},
+        }
+
+    def test_monomorphic(self):
+        recorded = profile.Profile(
+            {
+                "a:b:1:0:1:5": {"int,float": 3},
+                "a:b:2:0:2:5": {"int,int": 1, "str,str": 1},
+                "a:3:0:3:5": {"int,int": 1},
+            }
+        )
+        assert recorded.monomorphic("a:b") == {"1:0:1:5": ("int", "float")}
@@ -0,0 +1,1917 @@
+import ast
+import asyncio
+import collections.abc
+import math
+import sys
+import textwrap
+import types
+
+import pytest
+
+import desugar.builtins
+import desugar.loop
+import desugar.transform as transform
+
+
+def execute(source, rules=None):
+    """Execute the source code, desugared if rules are specified."""
+    source = textwrap.dedent(source)
+    if rules is not None:
+        source = transform.transform(source, rules)
+    namespace = {"__name__": "example"}
+    exec(compile(source, "<example>", "exec"), namespace)
+    return namespace
+
+
+def check(source, rules=transform.DEFAULT_RULES):
+    """Assert `result` is the same with and without desugaring."""
+    expected = execute(source)["result"]
+    assert execute(source, rules)["result"] == expected
+    return expected
+
+
+def nodes(source, rules=transform.DEFAULT_RULES):
+    """Return the types of AST nodes in the desugared code (sans prologue)."""
+    source = textwrap.dedent(source)
+    module = ast.parse(transform.transform(source, rules))
+    del module.body[: len(ast.parse(transform.PROLOGUE).body)]
+    return {
+        type(node)
+        for node in ast.walk(module)
+        # Ignore references to what the prologue imports, e.g. `_builtins.len`.
+        if not (
+            isinstance(node, ast.Attribute)
+            and isinstance(node.value, ast.Name)
+            and node.value.id.startswith("_")
+        )
+    }
+
+
+class TestAPI:
+    def test_unknown_rule(self):
+        with pytest.raises(ValueError):
+            transform.transform("a", ["not a rule"])
+
+    def test_no_rules(self):
+        """With no rules the code is only reformatted."""
+        source = "a = b + c\n"
+        assert transform.transform(source, []).endswith(source)
+
+    def test_docstring_and_future_imports(self):
+        """The module docstring and __future__ imports stay first."""
+        source = '''\
+            """Docstring."""
+            from __future__ import annotations
+            a = 1
+            '''
+        module = ast.parse(transform.transform(textwrap.dedent(source)))
+        assert ast.get_docstring(module) == "Docstring."
+        assert module.body[1].module == "__future__"
+        assert isinstance(module.body[2], ast.Import)
+
+    def test_ast(self):
+        """An AST can be desugared and the result compiled directly."""
+        module = ast.parse("result = [1, 2][0] + 2")
+        desugared = transform.transform_ast(module)
+        namespace = {}
+        exec(compile(desugared, "<example>", "exec"), namespace)
+        assert namespace["result"] == 3
+
+    def test_streaming(self):
+        """The statements are produced as a stream."""
+        source = "a = 1\nb = 2\n"
+        chunks = list(transform.iter_transform(source))
+        assert "".join(chunks) == transform.transform(source)
+        assert chunks[-2:] == ["a = 1\n", "b = 2\n"]
+
+    def test_temporaries_independent_of_position(self):
+        """Temporary names do not depend on preceding statements."""
+        statement = "for x in y:\n    pass\n"
+        once = transform.transform(statement)
+        twice = transform.transform(statement * 2)
+        assert twice.endswith(once[len(transform.transform("")) :] * 2)
+
+    def test_line_numbers(self):
+        """Generated code keeps the line number of its statement."""
+        module = transform.transform_ast("a = 1\n\nassert a")
+        assert module.body[-1].lineno == 3
+        assert all(
+            hasattr(node, "lineno")
+            for node in ast.walk(module.body[-1])
+            if isinstance(node, ast.stmt)
+        )
+
+
+class TestExpressions:
+    def test_attribute(self):
+        assert ast.Attribute not in nodes("a.b", ["attribute"])
+        check(
+            """
+            class A:
+                x = 42
+            A.y = 1
+            result = A.x, A().y
+            """
+        )
+
+    def test_private_names(self):
+        """Private names are mangled like the compiler does."""
+        check(
+            """
+            class _Private:
+                def __init__(self):
+                    self.__value = 42
+                    self.__dunder__ = "dunder"
+                def get(self):
+                    return self.__value, self.__dunder__
+            result = _Private().get(), _Private()._Private__value
+            """
+        )
+
+    def test_binary(self):
+        assert ast.BinOp not in nodes("a + b", ["binary"])
+        check("result = (1 + 2 * 3 - 4 / 5 // 1 % 7) ** 2, 'a%s' % 'b', [1] * 3")
+        check("result = 5 << 2 >> 1 & 7 ^ 3 | 8")
+
+    def test_augmented(self):
+        assert ast.AugAssign not in nodes("a += b", ["augmented"])
+        check(
+            """
+            a = 1
+            a += 2
+            b = [1]
+            c = b
+            b += [2]
+            class A:
+                x = 1
+            A.x *= 3
+            d = {"k": 2}
+            d["k"] **= 3
+            e = [1, 2, 3]
+            e[1:] += [4]
+            result = a, b, c, A.x, d, e
+            """
+        )
+
+    def test_augmented_evaluates_target_once(self):
+        check(
+            """
+            calls = []
+            def key():
+                calls.append("key")
+                return 0
+            def container():
+                calls.append("container")
+                return d
+            d = {0: 1}
+            container()[key()] += 1
+            result = d, calls
+            """
+        )
+
+    @pytest.mark.parametrize(
+        "rules", [transform.DEFAULT_RULES, transform.DEFAULT_RULES - {"subscript"}]
+    )
+    def test_augmented_target_rebound(self, rules):
+        """The target's object is the one before the value rebinds its name."""
+        check(
+            """
+            class A:
+                pass
+            old = x = A()
+            x.v = 1
+            def rebind_x():
+                global x
+                x = A()
+                x.v = 5
+                return 95
+            x.v += rebind_x()
+            old_list = y = [1]
+            def rebind_y():
+                global y
+                y = [0]
+                return 10
+            y[0] += rebind_y()
+            result = old.v, x.v, old_list, y
+            """,
+            rules,
+        )
+
+    def test_unary(self):
+        assert ast.UnaryOp not in nodes("-a", ["unary"])
+        check("result = -1, +2, ~3, not 0, not []")
+
+    def test_comparison(self):
+        assert ast.Compare not in nodes("a < b", ["comparison"])
+        check(
+            "result = 1 < 2, 1 <= 1, 1 > 2, 2 >= 3, 1 == 1.0, 1 != 2, None is None,"
+            " [] is not None, 1 in [1], 1 not in [1]"
+        )
+
+    def test_chained_comparison(self):
+        assert ast.Compare not in nodes("a < b < c", ["comparison"])
+        check(
+            """
+            calls = []
+            def value(x):
+                calls.append(x)
+                return x
+            result = value(1) < value(2) < value(3), value(3) < value(2) < value(1), calls
+            """
+        )
+
+    def test_boolean(self):
+        assert ast.BoolOp not in nodes("a or b and c", ["boolean"])
+        check("result = 0 or 1, 1 or 0, [] and 1, 2 and 3, 0 or [] or 5, 1 and 2 and 0")
+
+    def test_no_temporaries_in_class_or_comprehension(self):
+        """Assignment expressions are not used in class bodies or comprehensions."""
+        check(
+            """
+            class A:
+                x = 1 and 2
+                y = 1 < 2 < 3
+                z = [a or 1 for a in range(3)]
+            result = A.x, A.y, A.z, [n for n in vars(A) if n.startswith("_temp")]
+            """
+        )
+
+    def test_subscript(self):
+        assert ast.Subscript not in nodes("a[b]\na[b] = c\ndel a[b]", ["subscript"])
+        check(
+            """
+            a = list(range(10))
+            b = a[2], a[1:5], a[::2], a[-1]
+            a[0] = 42
+            a[1:3] = [7]
+            del a[-1]
+            del a[2:4]
+            result = a, b, {(1, 2): 3}[1, 2]
+            """
+        )
+
+    def test_subscript_assignment_order(self):
+        check(
+            """
+            calls = []
+            def f(x):
+                calls.append(x)
+                return x
+            d = {}
+            f(d)[f("key")] = f("value")
+            result = calls
+            """
+        )
+
+    def test_slice(self):
+        assert ast.Slice not in nodes("a[1:2]", ["slice"])
+        check("result = [1, 2, 3][1:], 'abc'[::-1]", ["slice"])
+
+    def test_literal(self):
+        assert ast.Constant not in {
+            type(node)
+            for node in ast.walk(
+                ast.parse(transform.transform("None", ["literal"])).body[-1]
+            )
+        }
+        check(
+            "result = True, False, None, 'ABC', 'ünïcödé', b'ABC', 4+3j, ..., 42, 1.5, '', b''"
+        )
+
+    def test_literal_docstring(self):
+        namespace = execute(
+            '''
+            def f():
+                """Docstring."""
+            ''',
+            ["literal"],
+        )
+        assert namespace["f"].__doc__ == "Docstring."
+
+    def test_fstring(self):
+        check('x = 3.14159\nresult = f\'{x!r:>{10}} {x:.{2}f} {"a" + "b"} {None}\'')
+
+    def test_display(self):
+        assert not {ast.List, ast.Tuple, ast.Set, ast.Dict} & nodes(
+            "[a, b], (a, b), {a, b}, {a: b}", ["display"]
+        )
+        check(
+            "a = [1, 2]\nresult = [*a, 3], (), (1,), (*a, 4), {1, 2, *a}, {1: 2, 3: 4}"
+        )
+
+    def test_display_unpacking(self):
+        """Dict unpacking is left as-is."""
+        check("a = {1: 2}\nresult = {**a, 3: 4}")
+
+    def test_comprehension(self):
+        assert not {ast.ListComp, ast.SetComp, ast.DictComp} & nodes(
+            "[a for a in b], {a for a in b}, {a: a for a in b}", ["comprehension"]
+        )
+        check(
+            "result = [x * 2 for x in range(5) if x % 2], {x % 3 for x in range(9)},"
+            " {x: y for x, y in zip('abc', range(3))}"
+        )
+
+    def test_comprehension_scoping(self):
+        check(
+            """
+            x = "outer"
+            class A:
+                values = [1, 2]
+                squares = [v * v for v in values]
+            result = x, A.squares, [x for x in range(3)], x
+            """
+        )
+
+    def test_lambda(self):
+        assert ast.Lambda not in nodes("f = lambda a, b=1: a + b", ["lambda"])
+        check(
+            """
+            def outer(n):
+                return lambda x, y=2: (x + n) * y
+            f = lambda *args, **kwargs: (args, kwargs)
+            result = outer(1)(3), outer(1)(3, 4), f(1, a=2), (lambda: lambda: 42)()()
+            """
+        )
+        namespace = execute("f = lambda: 1", ["lambda"])
+        assert namespace["f"].__name__ == "<lambda>"
+
+    def test_lambda_not_hoisted(self):
+        """Lambdas whose hoisting would change semantics are left as-is."""
+        check(
+            """
+            n = 1
+            class A:
+                f = staticmethod(lambda: 42)
+            fs = [lambda: i for i in range(3)]
+            g = lambda x=n + 1: x
+            result = A.f(), [f() for f in fs], g()
+            """
+        )
+
+
+class TestStatements:
+    def test_assert(self):
+        assert ast.Assert not in nodes("assert a, b", ["assert"])
+        check(
+            """
+            try:
+                assert 1 == 2, "message"
+            except AssertionError as exc:
+                result = exc.args
+            """
+        )
+        check(
+            """
+            assert True
+            try:
+                assert False
+            except AssertionError as exc:
+                result = exc.args
+            """
+        )
+
+    def test_for(self):
+        assert ast.For not in nodes("for a in b:\n    c", ["for"])
+        check(
+            """
+            result = []
+            for x in range(3):
+                result.append(x)
+            for a, (b, c) in [(1, (2, 3))]:
+                result.append(a + b + c)
+            result.append(x)
+            """
+        )
+
+    def test_for_else(self):
+        check(
+            """
+            result = []
+            for x in range(3):
+                result.append(x)
+            else:
+                result.append("else")
+            for x in []:
+                pass
+            else:
+                result.append("empty")
+            """,
+            ["for"],
+        )
+
+    @pytest.mark.parametrize(
+        "rules",
+        [
+            transform.DEFAULT_RULES,
+            ["for"],
+            ["break", "continue"],
+            ["for", "break"],
+            ["for", "continue", "if", "elif"],
+        ],
+    )
+    def test_break_and_continue(self, rules):
+        check(
+            """
+            result = []
+            for x in range(10):
+                if x == 2:
+                    continue
+                elif x == 6:
+                    break
+                for y in range(3):
+                    if y == 1:
+                        break
+                    result.append((x, y))
+                else:
+                    result.append("unreachable")
+                result.append(x)
+            else:
+                result.append("no break")
+            n = 0
+            while n < 5:
+                n += 1
+                if n % 2:
+                    continue
+                result.append(n)
+            else:
+                result.append("while else")
+            """,
+            rules,
+        )
+
+    def test_break_not_raised_through_with_or_broad_handler(self):
+        """A `break` which an exception handler could catch is left as-is."""
+        assert ast.Break in nodes(
+            """
+            for x in y:
+                try:
+                    break
+                except:
+                    pass
+            """
+        )
+        check(
+            """
+            import contextlib
+            result = []
+            for x in range(3):
+                with contextlib.suppress(BaseException):
+                    result.append(x)
+                    break
+            for x in range(3):
+                try:
+                    continue
+                except BaseException:
+                    result.append("caught")
+                finally:
+                    result.append(x)
+            """
+        )
+
+    def test_break_through_finally(self):
+        check(
+            """
+            result = []
+            for x in range(3):
+                try:
+                    try:
+                        break
+                    except ValueError:
+                        pass
+                finally:
+                    result.append("finally")
+            """
+        )
+
+    def test_with(self):
+        assert ast.With not in nodes("with a as b, c:\n    d", ["with"])
+        check(
+            """
+            import contextlib
+            result = []
+            @contextlib.contextmanager
+            def manager(name):
+                result.append(("enter", name))
+                try:
+                    yield name
+                except ValueError:
+                    result.append(("suppressed", name))
+                finally:
+                    result.append(("exit", name))
+            with manager("a") as a, manager("b") as b:
+                result.append(a + b)
+            with manager("c"):
+                raise ValueError
+            try:
+                with manager("d"):
+                    raise TypeError
+            except TypeError:
+                result.append("raised")
+            """
+        )
+
+    def test_with_return(self):
+        """`with` is left alone when `return` would skip `__exit__`."""
+        check(
+            """
+            import contextlib
+            result = []
+            @contextlib.contextmanager
+            def manager():
+                yield
+                result.append("exit")
+            def f():
+                with manager():
+                    return 42
+            result.append(f())
+            """
+        )
+
+    def test_decorator(self):
+        assert not any(
+            node.decorator_list
+            for node in ast.walk(
+                ast.parse(
+                    transform.transform(
+                        "@a\n@b\ndef c(): pass\n@d\nclass E: pass", ["decorator"]
+                    )
+                )
+            )
+            if isinstance(node, (ast.FunctionDef, ast.ClassDef))
+            and not node.name.startswith("_")
+        )
+        check(
+            """
+            order = []
+            def record(name):
+                order.append(("evaluated", name))
+                def decorator(func):
+                    order.append(("applied", name))
+                    return func
+                return decorator
+            @record("outer")
+            @record("inner")
+            def f():
+                return 42
+            class A:
+                @property
+                def x(self):
+                    return self._x
+                @x.setter
+                def x(self, value):
+                    self._x = value
+            a = A()
+            a.x = 3
+            def tag(cls):
+                cls.tagged = True
+                return cls
+            @tag
+            class B:
+                pass
+            result = order, f(), f.__name__, a.x, B.tagged
+            """
+        )
+
+    def test_if(self):
+        assert ast.If not in nodes("if a:\n    b", ["if"])
+        check(
+            """
+            result = []
+            for x in range(4):
+                if x == 0:
+                    result.append("zero")
+                elif x == 1:
+                    result.append("one")
+                elif x == 2:
+                    result.append("two")
+                else:
+                    result.append("many")
+            if result:
+                result.append("end")
+            if x == 3:
+                result.append("three")
+            else:
+                result.append("not three")
+            result.append(sorted(name for name in globals() if name.startswith("_ran_")))
+            """
+        )
+
+    def test_if_return(self):
+        check(
+            """
+            def f(x):
+                if x:
+                    return "yes"
+                return "no"
+            result = f(1), f(0)
+            """
+        )
+
+    def test_try_else(self):
+        assert not any(
+            isinstance(node, ast.Try) and node.orelse
+            for node in ast.walk(
+                ast.parse(
+                    transform.transform(
+                        "try:\n    a\nexcept:\n    b\nelse:\n    c", ["try_else"]
+                    )
+                )
+            )
+        )
+        check(
+            """
+            result = []
+            for value in (1, 0):
+                try:
+                    1 / value
+                except ZeroDivisionError:
+                    result.append("except")
+                else:
+                    result.append("else")
+                finally:
+                    result.append("finally")
+            """
+        )
+
+    def test_try_else_exception_not_caught(self):
+        """An exception raised in `else` is not handled by the `except` clauses."""
+        check(
+            """
+            try:
+                try:
+                    pass
+                except ValueError:
+                    result = "wrong"
+                else:
+                    raise ValueError
+            except ValueError:
+                result = "right"
+            """
+        )
+
+    def test_finally(self):
+        assert not any(
+            isinstance(node, ast.Try) and node.finalbody
+            for node in ast.walk(
+                ast.parse(
+                    transform.transform("try:\n    a\nfinally:\n    b", ["finally"])
+                )
+            )
+        )
+        check(
+            """
+            result = []
+            try:
+                try:
+                    raise ValueError
+                finally:
+                    result.append("finally")
+            except ValueError:
+                result.append("raised")
+            def f():
+                try:
+                    return 1
+                finally:
+                    result.append("return")
+            result.append(f())
+            """
+        )
+
+    def test_raise_from(self):
+        check(
+            """
+            result = []
+            for cause in (KeyError, KeyError("key"), None):
+                try:
+                    raise ValueError from cause
+                except ValueError as exc:
+                    result.append((type(exc.__cause__), exc.__suppress_context__))
+            try:
+                raise 42 from None
+            except TypeError as exc:
+                result.append("type error")
+            """
+        )
+
+    def test_import(self):
+        assert not {ast.Import, ast.ImportFrom} & nodes(
+            "import a.b\nimport c.d as e\nfrom f import g\nfrom . import h", ["import"]
+        )
+        check(
+            """
+            import os.path
+            import os.path as p
+            import collections.abc
+            from os import path as q, sep
+            from collections import abc
+            try:
+                from os import does_not_exist
+            except ImportError:
+                missing = True
+            result = os.path is p is q, sep, abc is collections.abc, missing
+            """
+        )
+
+    def test_import_star_and_future(self):
+        """`from ... import *` and `__future__` imports are left alone."""
+        check("from __future__ import annotations\nfrom math import *\nresult = pi")
+
+    def test_pass(self):
+        namespace = execute(
+            """
+            def f():
+                pass
+            class A:
+                pass
+            for x in range(1):
+                pass
+            """,
+            ["pass"],
+        )
+        assert namespace["f"].__doc__ is None
+        assert namespace["A"].__doc__ is None
+        assert ast.Pass not in nodes("for x in y:\n    pass", ["pass"])
+
+    def test_del(self):
+        assert ast.Delete not in nodes("del a", ["del"])
+        check(
+            """
+            a = b = 1
+            del a
+            try:
+                del a
+            except NameError as exc:
+                error = str(exc)
+            def f():
+                c = 1
+                del c
+                return "local"
+            result = "a" in globals(), error, f()
+            """
+        )
+
+    def test_nested_functions_and_generators(self):
+        check(
+            """
+            def gen(n):
+                for i in range(n):
+                    if i % 2:
+                        yield i
+                    else:
+                        continue
+                return "done"
+            def closure():
+                count = 0
+                def inc():
+                    nonlocal count
+                    count += 1
+                    return count
+                return inc
+            inc = closure()
+            inc()
+            result = list(gen(6)), inc()
+            """
+        )
+
+    def test_class(self):
+        check(
+            """
+            class Base:
+                def __init__(self, value):
+                    self.value = value
+                def __eq__(self, other):
+                    return isinstance(other, Base) and self.value == other.value
+            class Child(Base):
+                '''Docstring.'''
+                def __init__(self, value):
+                    super().__init__(value * 2)
+            result = Child(2).value, Child(1) == Base(2), Child.__doc__
+            """
+        )
+
+
+class TestAsync:
+    def run(self, source, rules=transform.DEFAULT_RULES):
+        """Run `main()` with desugar.loop before and after desugaring."""
+        expected = desugar.loop.run(execute(source)["main"]())
+        assert desugar.loop.run(execute(source, rules)["main"]()) == expected
+        return expected
+
+    def test_async_def(self):
+        source = textwrap.dedent(
+            """
+            async def answer():
+                return 42
+            async def main():
+                return await answer()
+            """
+        )
+        assert ast.AsyncFunctionDef not in nodes(source, ["async_def"])
+        assert self.run(source) == 42
+        namespace = execute(source, ["async_def"])
+        assert isinstance(namespace["answer"], types.FunctionType)
+
+    def test_asyncio(self):
+        """asyncio runs desugared coroutines (it rejects generators from 3.12)."""
+        source = """
+            import asyncio
+            async def answer():
+                await asyncio.sleep(0)
+                return 42
+            async def main():
+                task = asyncio.create_task(answer())
+                return await task, await answer()
+            """
+        expected = asyncio.run(execute(source)["main"]())
+        coroutine = execute(source, transform.DEFAULT_RULES)["main"]()
+        # What asyncio.iscoroutine() checks from 3.12.
+        assert isinstance(coroutine, collections.abc.Coroutine)
+        assert asyncio.run(coroutine) == expected
+
+    def test_flat_await(self):
+        """Under trampoline() the awaits of nested coroutines are flattened."""
+        source = """
+            import sys
+            import desugar.loop
+            def frames():
+                frame, count = sys._getframe(), 0
+                while frame is not None:
+                    frame, count = frame.f_back, count + 1
+                return count
+            async def nested(depth):
+                if depth:
+                    return await nested(depth - 1)
+                await desugar.loop.sleep(0)
+                return frames()
+            async def main():
+                return await nested(2), await nested(20)
+            """
+        rules = transform.DEFAULT_RULES | {"flat_await"}
+        assert "flat_await" not in transform.DEFAULT_RULES
+        assert "_await_flat" in transform.transform(textwrap.dedent(source), rules)
+        main = execute(source, rules)["main"]
+        # Without the trampoline the awaits delegate as usual.
+        shallow, deep = desugar.loop.run(main())
+        assert deep > shallow
+        shallow, deep = desugar.loop.run(desugar.builtins.trampoline(main()))
+        assert deep == shallow
+
+    def test_async_for_and_with(self):
+        source = """
+            import desugar.loop
+            class Counter:
+                def __init__(self, stop):
+                    self.n, self.stop = 0, stop
+                def __aiter__(self):
+                    return self
+                async def __anext__(self):
+                    await desugar.loop.sleep(0)
+                    if self.n >= self.stop:
+                        raise StopAsyncIteration
+                    self.n += 1
+                    return self.n
+            class Manager:
+                def __init__(self, log):
+                    self.log = log
+                async def __aenter__(self):
+                    self.log.append("enter")
+                    return self
+                async def __aexit__(self, *exc_info):
+                    self.log.append(("exit", exc_info[0]))
+                    return True
+            async def main():
+                log = []
+                async for x in Counter(3):
+                    log.append(x)
+                else:
+                    log.append("else")
+                async with Manager(log) as manager:
+                    log.append(manager is not None)
+                    raise ValueError
+                return log
+            """
+        assert not {ast.AsyncFor, ast.AsyncWith, ast.Await} & nodes(source)
+        self.run(source)
+
+    def test_async_generator(self):
+        """Async generators stay native coroutines, with `async for` desugared."""
+        source = """
+            async def agen():
+                yield 1
+                yield 2
+            async def main():
+                result = []
+                async for x in agen():
+                    result.append(x)
+                return result
+            """
+        assert ast.AsyncFor not in nodes(source, ["async_for"])
+        assert self.run(source) == [1, 2]
+
+
+class TestTemporaries:
+
+    RULES = transform.DEFAULT_RULES | {"temporaries"}
+
+    def desugar(self, source):
+        prologue = transform.transform("", self.RULES)
+        return transform.transform(textwrap.dedent(source), self.RULES)[len(prologue) :]
+
+    def test_not_a_default(self):
+        assert "temporaries" in transform.ALL_RULES
+        assert "temporaries" not in transform.DEFAULT_RULES
+
+    def test_import_from(self):
+        """The module is only loaded once, right after it is imported."""
+        desugared = self.desugar("from textwrap import dedent")
+        assert "_module_" not in desugared
+        assert "del" not in desugared
+        check(
+            """
+            def f():
+                from textwrap import dedent
+                return dedent
+            result = f()(" a")
+            """,
+            self.RULES,
+        )
+
+    def test_stable_value(self):
+        """A stable value may move past other statements."""
+        desugared = self.desugar(
+            """
+            async def f():
+                return 1
+            """
+        )
+        assert "_decorator_" not in desugared
+        assert "f = _desugar_builtins._coroutine(f)" in desugared
+        namespace = execute(
+            """
+            async def f():
+                return 1
+            """,
+            self.RULES,
+        )
+        assert desugar.loop.run(namespace["f"]()) == 1
+
+    def test_used_more_than_once(self):
+        desugared = self.desugar(
+            """
+            from os import path, sep
+            for x in y:
+                pass
+            """
+        )
+        assert "_module_0" in desugared
+        assert "_iter_0" in desugared
+
+    def test_evaluation_order(self):
+        """A temporary is kept if inlining it would reorder evaluation."""
+        desugared = self.desugar(
+            """
+            x[i] = f()
+            @decorator
+            def f():
+                pass
+            """
+        )
+        assert "_value_0 = f()" in desugared
+        assert "_decorator_0 = decorator" in desugared
+        check(
+            """
+            order = []
+            def log(value):
+                order.append(value)
+                return value
+            x = {}
+            def decorate(function):
+                order.append(function.__name__)
+                return function
+            log(x)[log(1)] = log(2)
+            @decorate
+            def f():
+                pass
+            result = order, x
+            """,
+            self.RULES,
+        )
+
+    def test_unused(self):
+        module = ast.parse("_a_0 = _builtins.len\n_b_1 = f()\ndel _a_0, _b_1")
+        temporaries = transform._Temporaries(module.body, {"_a_0", "_b_1"})
+        temporaries.optimize(module.body)
+        temporaries.remove_deletes(module.body)
+        assert ast.unparse(module) == "f()"
+
+
+class TestFlags:
+
+    RULES = transform.DEFAULT_RULES | {"flags"}
+    LOOPS = """
+        import contextlib
+        result = []
+        for x in range(10):
+            if x == 2:
+                continue
+            elif x == 6:
+                break
+            for y in range(3):
+                if y == 1:
+                    break
+                result.append((x, y))
+            else:
+                result.append("unreachable")
+            try:
+                if x == 3:
+                    continue
+            except:
+                result.append("unreachable")
+            else:
+                result.append("try else")
+            finally:
+                result.append("finally")
+            with contextlib.suppress(BaseException):
+                if x == 4:
+                    continue
+                result.append("with")
+            result.append(x)
+        else:
+            result.append("no break")
+        for x in range(3):
+            pass
+        else:
+            result.append("for else")
+        n = 0
+        while n < 5:
+            n += 1
+            if n % 2:
+                continue
+            result.append(n)
+        else:
+            result.append("while else")
+        while True:
+            n -= 1
+            if not n:
+                break
+        else:
+            result.append("unreachable")
+        """
+
+    def test_not_a_default(self):
+        assert "flags" in transform.ALL_RULES
+        assert "flags" not in transform.DEFAULT_RULES
+
+    def test_no_exceptions(self):
+        """No exceptions are raised (or caught) to jump."""
+        assert not nodes(self.LOOPS, self.RULES) & {ast.Break, ast.Continue}
+        prologue = transform.transform("")
+        for rules, expected in [(self.RULES, False), (transform.DEFAULT_RULES, True)]:
+            desugared = transform.transform(textwrap.dedent(self.LOOPS), rules)
+            for name in ["_BreakStatement", "_ContinueStatement", "_Done"]:
+                assert (name in desugared[len(prologue) :]) is expected
+
+    @pytest.mark.parametrize(
+        "rules",
+        [
+            transform.DEFAULT_RULES,
+            ["for"],
+            ["break", "continue"],
+            ["for", "break"],
+            ["for", "continue", "if", "elif"],
+            ["for", "break", "continue", "if", "elif", "try_else", "with"],
+        ],
+    )
+    def test_loops(self, rules):
+        check(self.LOOPS, {*rules, "flags"})
+
+    def test_flags_deleted(self):
+        """No flag is left behind in the module's namespace."""
+        empty = """
+            for x in []:
+                if x:
+                    continue
+            """
+        namespace = execute(self.LOOPS, self.RULES)
+        namespace.update(execute(empty, self.RULES))
+        leaked = [
+            name
+            for name in namespace
+            if name.startswith(("_running_", "_proceed_", "_if_"))
+        ]
+        assert not leaked
+
+    def test_if(self):
+        check(
+            """
+            result = []
+            def truth(value):
+                result.append(value)
+                return value
+            for x in range(3):
+                if truth(x):
+                    result.append("true")
+            """,
+            self.RULES,
+        )
+
+    def test_jump_from_finally(self):
+        """Jumping from `finally` discards any exception, so raises as before."""
+        source = """
+            result = []
+            for x in range(3):
+                try:
+                    raise ValueError
+                finally:
+                    result.append(x)
+                    continue
+            """
+        assert ast.Raise in nodes(source, self.RULES)
+        check(source, self.RULES)
+
+
+class TestSpecialize:
+
+    RULES = transform.DEFAULT_RULES | {"specialize"}
+
+    def desugar(self, source):
+        prologue = transform.transform("", self.RULES)
+        return transform.transform(textwrap.dedent(source), self.RULES)[len(prologue) :]
+
+    def test_not_a_default(self):
+        assert "specialize" in transform.ALL_RULES
+        assert "specialize" not in transform.DEFAULT_RULES
+
+    def test_annotations(self):
+        desugared = self.desugar(
+            """
+            def f(a: int, b: "float", c: str, d):
+                e: int = a * 2
+                return a + e, a < b, c * a, a + d, -a - b
+            """
+        )
+        assert "_builtins.int.__mul__(a, 2)" in desugared
+        assert "_builtins.int.__add__(a, e)" in desugared
+        assert "_builtins.float.__gt__(b, a)" in desugared
+        assert "_builtins.str.__mul__(c, a)" in desugared
+        assert "__add__(a, d)" in desugared
+        assert "_builtins.float.__rsub__(" in desugared
+        assert "_builtins.int.__add__(" in self.desugar("def f(x): len(x) + int(x)")
+        assert "_builtins.int.__" not in self.desugar("def f(a: int, b): a + b")
+
+    def test_correct(self):
+        """The same result for every combination of types of the operands,
+        annotated correctly or not."""
+        check(
+            """
+            import itertools
+            def f(a: int, b: float, c: str, n: int):
+                results = [a + b, a * b, b / a, a // n, a ** 2, c * n, c + c, a < b]
+                n += a
+                a -= n
+                c += c
+                results.extend([a >> n, n % a, b > a, c >= c, c != "", a, n, c])
+                return results
+            def g(a, b, c, n):
+                try:
+                    return f(a, b, c, n)
+                except Exception as exc:
+                    return type(exc)
+            values = [2, -3, 2.5, "x", True, None, 10**20, 0]
+            result = [
+                g(*args) for args in itertools.product(values, repeat=4)
+            ]
+            """,
+            self.RULES,
+        )
+
+    def test_subclass(self):
+        """Subclasses may override operators, so take the generic path."""
+        check(
+            """
+            class Int(int):
+                def __add__(self, other):
+                    return "overridden"
+            def f(a: int, b: int):
+                return a + b, b + a
+            result = f(Int(1), 2)
+            """,
+            self.RULES,
+        )
+
+    def test_evaluation_order(self):
+        """Operands are evaluated once and in order."""
+        check(
+            """
+            order = []
+            def log(value: int) -> int:
+                order.append(value)
+                return value
+            def f(a: int, b: int):
+                x = int(log(a)) + int(log(b))
+                b += int(log(a))
+                return x, b, a + (a := 10), order
+            result = f(1, 2), f(1.5, 2)
+            """,
+            self.RULES,
+        )
+
+    def test_class_scope(self):
+        """No temporaries are bound where doing so would leak them."""
+        check(
+            """
+            def f(a: int):
+                class C:
+                    b = a + int(a)
+                return C.b
+            result = f(2)
+            """,
+            self.RULES,
+        )
+
+
+class TestHoistLiterals:
+
+    RULES = transform.DEFAULT_RULES | {"hoist_literals"}
+
+    def test_not_a_default(self):
+        assert "hoist_literals" in transform.ALL_RULES
+        assert "hoist_literals" not in transform.DEFAULT_RULES
+
+    def test_literals(self):
+        check(
+            """
+            def f(x):
+                return [x[1:3], "ABC", b"ABC", 4 + 3j, True, False, None, ..., 1.5]
+            result = f("abcd"), f([1, 2, 3]), "ABC", b"ABC"[::2]
+            """,
+            self.RULES,
+        )
+
+    def test_bound_once(self):
+        """A literal is built once, even when used by several statements."""
+        source = """
+            def f():
+                return "ABC"
+            def g():
+                for _ in range(2):
+                    yield "ABC", 3j
+            x = "ABC"
+            """
+        module = ast.parse(transform.transform(textwrap.dedent(source), self.RULES))
+        bound = [
+            statement.targets[0].id
+            for statement in module.body
+            if isinstance(statement, ast.Assign)
+            and statement.targets[0].id.startswith("_literal_")
+        ]
+        assert len(bound) == len(set(bound)) == 2
+        namespace = execute(source, self.RULES)
+        assert list(namespace["g"]()) == [("ABC", 3j)] * 2
+        assert namespace["f"]() is namespace["x"]
+
+    def test_incremental(self):
+        """Each statement binds the literals it uses when desugared
+        incrementally, as it may be reused without the others."""
+        incremental = transform.Incremental(self.RULES)
+        incremental.transform("a = 'ABC'\nb = 'ABC'\n")
+        desugared = incremental.transform("a = 1\nb = 'ABC'\n")
+        assert incremental.reused == 1
+        namespace = {}
+        exec(desugared, namespace)
+        assert namespace["b"] == "ABC"
+
+
+class TestFusedComprehension:
+
+    RULES = transform.DEFAULT_RULES | {"fused_comprehension"}
+
+    def test_not_a_default(self):
+        assert "fused_comprehension" in transform.ALL_RULES
+        assert "fused_comprehension" not in transform.DEFAULT_RULES
+
+    def test_no_generator(self):
+        source = """
+            def f(xs):
+                return [x for x in xs], {x for x in xs}, {x: x for x in xs}
+            """
+        assert ast.GeneratorExp not in nodes(source, self.RULES)
+        assert ast.For in nodes(source, self.RULES)
+
+    def test_comprehensions(self):
+        check(
+            """
+            def f(xs):
+                y = 10
+                a = [x * y for x in xs if x % 2 for z in range(x) if z]
+                b = {x: [x for x in range(x)] for x in xs}
+                c = {x % 3 for x in xs}
+                d = [(i, j) for i, j in enumerate(xs)]
+                e = [[lambda: x for x in range(2)] for _ in xs]
+                return a, b, c, d, [[g() for g in row] for row in e]
+            result = f(range(6)), [i for i in range(3)]
+            """,
+            self.RULES,
+        )
+
+    def test_evaluation_order(self):
+        check(
+            """
+            order = []
+            def log(value):
+                order.append(value)
+                return value
+            def f():
+                return {log(k): log(v) for k, v in log([(1, 2), (3, 4)]) if log(k)}
+            result = f(), order
+            """,
+            self.RULES,
+        )
+
+    def test_scope(self):
+        """Loop variables do not leak, and the first iterable is evaluated in
+        the enclosing scope."""
+        check(
+            """
+            x = "module"
+            def f():
+                x = "local"
+                values = [x for x in range(3)]
+                return x, values
+            class C:
+                v = 3
+                w = [i for i in range(v)]
+            result = f(), [x for x in range(2)], x, C.w
+            """,
+            self.RULES,
+        )
+
+    def test_not_fused(self):
+        """An assignment expression binds in the enclosing scope, so the
+        comprehension is not moved into a function."""
+        source = """
+            def f(xs):
+                values = [(last := x) for x in xs]
+                return values, last
+            result = f([1, 2])
+            """
+        assert ast.GeneratorExp in nodes(source, self.RULES)
+        check(source, self.RULES)
+
+
+class TestRange:
+
+    RULES = transform.DEFAULT_RULES | {"range"}
+    LOOPS = """
+        result = []
+        for i in range(5):
+            if i == 2:
+                continue
+            elif i == 3:
+                i = "reassigned"
+            result.append(i)
+        else:
+            result.append("else")
+        for j in range(10, 0, -3):
+            if j < 3:
+                break
+            result.append(j)
+        else:
+            result.append("unreachable")
+        for k in range(0):
+            result.append("unreachable")
+        big = 2 ** 70
+        for n in range(big, big + 6, 2):
+            result.append(n)
+        for a in range(2):
+            for b in range(a, 3):
+                result.append((a, b))
+        result.append((i, j, n, a, b, "k" in globals()))
+        """
+
+    def test_not_a_default(self):
+        assert "range" in transform.ALL_RULES
+        assert "range" not in transform.DEFAULT_RULES
+
+    @pytest.mark.parametrize(
+        "rules",
+        [
+            transform.DEFAULT_RULES,
+            transform.DEFAULT_RULES | {"flags"},
+            transform.DEFAULT_RULES | {"flags", "temporaries"},
+            ["for"],
+            ["for", "break", "continue"],
+        ],
+    )
+    def test_loops(self, rules):
+        check(self.LOOPS, {*rules, "range"})
+
+    def test_counts(self):
+        """A range is not iterated with `next()`."""
+        desugared = transform.transform("for i in range(3): pass", self.RULES)
+        assert "_counter_" in desugared
+        namespace = execute(
+            """
+            import desugar.builtins
+            calls = []
+            def next(*args):
+                calls.append(args)
+                raise AssertionError
+            desugar.builtins.next, original = next, desugar.builtins.next
+            result = []
+            try:
+                for i in range(3):
+                    result.append(i)
+            finally:
+                desugar.builtins.next = original
+            """,
+            self.RULES,
+        )
+        assert namespace["result"] == [0, 1, 2]
+        assert not namespace["calls"]
+
+    def test_rebound(self):
+        """When `range` is not the built-in, the result is iterated."""
+        check(
+            """
+            def range(*args):
+                return ["not", "a", "range"]
+            result = []
+            for i in range(3):
+                result.append(i)
+            """,
+            self.RULES,
+        )
+
+    def test_errors(self):
+        check(
+            """
+            result = []
+            for arguments in [(1, 2, 0), (1.5,), ("a",)]:
+                try:
+                    for i in range(*arguments):
+                        pass
+                except (ValueError, TypeError) as exc:
+                    result.append(type(exc))
+            """,
+            self.RULES,
+        )
+
+
+class TestSharedFinally:
+
+    RULES = transform.DEFAULT_RULES | {"shared_finally"}
+
+    def test_not_a_default(self):
+        assert "shared_finally" in transform.ALL_RULES
+        assert "shared_finally" not in transform.DEFAULT_RULES
+
+    def test_single_copy(self):
+        source = "a()"
+        for depth in range(5):
+            source = f"try:\n    pass\nfinally:\n{textwrap.indent(source, '    ')}"
+        assert transform.transform(source, self.RULES).count("a()") == 1
+        assert transform.transform(source).count("a()") == 2 ** 5
+
+    @pytest.mark.parametrize(
+        "rules",
+        [
+            ["finally"],
+            ["finally", "try_else"],
+            transform.DEFAULT_RULES,
+            transform.DEFAULT_RULES | {"flags", "temporaries"},
+        ],
+    )
+    def test_finally(self, rules):
+        check(
+            """
+            result = []
+            def chain(exc):
+                links = []
+                while exc is not None:
+                    links.append(type(exc).__name__)
+                    exc = exc.__context__
+                return links
+            def run(error, finally_error):
+                try:
+                    try:
+                        if error:
+                            raise error
+                    except KeyError:
+                        result.append("except")
+                    else:
+                        result.append("else")
+                    finally:
+                        result.append("finally")
+                        try:
+                            pass
+                        finally:
+                            if finally_error:
+                                raise finally_error
+                except Exception as exc:
+                    result.append(chain(exc))
+            for error in (None, KeyError, ValueError):
+                for finally_error in (None, TypeError):
+                    run(error, finally_error)
+                    try:
+                        raise LookupError
+                    except LookupError:
+                        run(error, finally_error)
+            def nested_handler():
+                try:
+                    try:
+                        raise KeyError
+                    except KeyError:
+                        raise ValueError
+                finally:
+                    result.append("nested")
+            try:
+                raise LookupError
+            except LookupError:
+                try:
+                    nested_handler()
+                except ValueError as exc:
+                    result.append(chain(exc))
+            def generator():
+                try:
+                    yield 1
+                    yield 2
+                finally:
+                    result.append("closed")
+            def consume():
+                for value in generator():
+                    break
+            consume()
+            result.append("_pending_0" in globals())
+            """,
+            {*rules, "shared_finally"},
+        )
+
+    def test_reraise(self):
+        """A bare `raise` re-raises the pending exception, so is left in a
+        handler."""
+        source = """
+            result = []
+            try:
+                try:
+                    raise KeyError
+                finally:
+                    result.append("finally")
+                    raise
+            except KeyError:
+                result.append("raised")
+            """
+        assert "_pending_" not in transform.transform(
+            textwrap.dedent(source), self.RULES
+        )
+        check(source, self.RULES)
+
+    @pytest.mark.parametrize(
+        "finally_block",
+        [
+            """
+            try:
+                raise ValueError(2)
+            except ValueError as exc:
+                result.append(repr(exc.__context__))
+            """,
+            """
+            result.append(repr(sys.exc_info()[1]))
+            """,
+            """
+            with contextlib.suppress(ValueError):
+                raise ValueError(2)
+            """,
+        ],
+    )
+    def test_observes_exception(self, finally_block):
+        """A block which could tell whether the pending exception is being
+        handled is copied into a handler as usual."""
+        source = f"""
+            import contextlib
+            import sys
+            result = []
+            try:
+                try:
+                    raise KeyError(1)
+                finally:
+{textwrap.indent(textwrap.dedent(finally_block), " " * 20)}
+            except KeyError:
+                result.append("raised")
+            """
+        assert "_pending_" not in transform.transform(
+            textwrap.dedent(source), self.RULES
+        )
+        check(source, self.RULES)
+
+
+@pytest.mark.skipif(sys.version_info < (3, 10), reason="`match` is new in 3.10")
+class TestMatch:
+
+    PROGRAM = """
+        import collections
+        class Point:
+            __match_args__ = ("x", "y")
+            def __init__(self, x, y):
+                self.x, self.y = x, y
+        class Point3(Point):
+            __match_args__ = ("x", "y", "z")
+            def __init__(self, x, y, z):
+                super().__init__(x, y)
+                self.z = z
+        class NoArgs:
+            x = 5
+        class BadArgs:
+            __match_args__ = ["x"]
+        class Weird:
+            def __eq__(self, other):
+                return other == 3
+            __hash__ = None
+        class Color:
+            RED = 1
+            BLUE = "blue"
+        def describe(subject):
+            out = []
+            try:
+                match subject:
+                    case 0 | 1 | 2:
+                        out.append("small")
+                    case 3:
+                        out.append("three")
+                    case -1.5:
+                        out.append("negative")
+                    case "a" | b"a":
+                        out.append("a")
+                    case 1j:
+                        out.append("complex")
+                    case None:
+                        out.append("none")
+                    case True:
+                        out.append("true")
+                    case Color.RED:
+                        out.append("red")
+                    case Color.BLUE:
+                        out.append("blue")
+                    case Point(x=0, y=y) if y > 1:
+                        out.append(("y", y))
+                    case Point3(1, 2, z):
+                        out.append(("z", z))
+                    case Point(1, q) | [q, *_, 2]:
+                        out.append(("q", q))
+                    case Point(x, y) if x == y:
+                        out.append(("diagonal", x))
+                    case Point(x=x, y=0) | Point(x=0, y=x):
+                        out.append(("axis", x))
+                    case [1, *rest]:
+                        out.append(("rest", rest))
+                    case [a, b, c]:
+                        out.append(("three", a, b, c))
+                    case [*_, "end"]:
+                        out.append("end")
+                    case ([] | ()) as empty:
+                        out.append(("empty", empty))
+                    case {"k": v, **others}:
+                        out.append(("mapping", v, others))
+                    case {Color.RED: v}:
+                        out.append(("red key", v))
+                    case {}:
+                        out.append("any mapping")
+                    case int(n) if n > 100:
+                        out.append(("big", n))
+                    case str() | bytes():
+                        out.append("text")
+                    case BadArgs(a) if subject == 50:
+                        out.append("unreachable")
+                    case Point(1, 2, 3) if subject == 2.5:
+                        out.append("unreachable")
+                    case Color() if subject == "zzz":
+                        out.append("unreachable")
+                    case {Color.RED: 1, 1: 2} if subject == 50:
+                        out.append("unreachable")
+                    case NoArgs(x=5):
+                        out.append("no args")
+                    case Point():
+                        out.append("point")
+                    case _:
+                        out.append("other")
+            except Exception as exc:
+                out.append((type(exc).__name__, str(exc)))
+            names = {"subject", "out", "exc"}
+            return out, sorted(
+                name for name in locals() if name[0] != "_" and name not in names
+            )
+        subjects = [
+            0, 2, 3, 3.0, True, False, None, -1.5, "a", b"a", bytearray(b"a"), 1j,
+            Weird(), Point(0, 5), Point(0, 1), Point(1, 9), Point(2, 2),
+            Point(7, 0), Point(3, 4), Point3(1, 2, 3), Point3(0, 5, 1), [1, 2, 3],
+            [9, 8, 2], [5], [4, 5, 6], ["x", "end"], [], (), {"k": 1, "j": 2},
+            {1: "r"}, {}, collections.OrderedDict(k=3), 500, 50, "zzz", 2.5,
+            NoArgs(), BadArgs(), range(3), "end",
+        ]
+        result = [describe(subject) for subject in subjects]
+        """
+
+    def test_default(self):
+        assert "match" in transform.DEFAULT_RULES
+
+    @pytest.mark.parametrize(
+        "rules",
+        [
+            ["match"],
+            transform.DEFAULT_RULES,
+            transform.DEFAULT_RULES
+            | {"flags", "temporaries", "hoist_literals", "specialize"},
+        ],
+    )
+    def test_match(self, rules):
+        assert ast.Match not in nodes(self.PROGRAM, rules)
+        check(self.PROGRAM, rules)
+
+    def test_table(self):
+        """Literal cases are looked up in a dict, each body emitted once."""
+        desugared = transform.transform(
+            textwrap.dedent(
+                """
+                match x:
+                    case 1:
+                        a()
+                    case 2 | 3:
+                        b()
+                    case "c":
+                        c()
+                    case _:
+                        d()
+                """
+            ),
+            ["match"],
+        )
+        assert "_match_table_" in desugared
+        for call in ["a()", "b()", "c()", "d()"]:
+            assert desugared.count(call) == 1
+
+    @pytest.mark.parametrize(
+        "rules", [["match"], transform.DEFAULT_RULES | {"flags", "temporaries"}]
+    )
+    def test_statements(self, rules):
+        check(
+            """
+            result = []
+            for i in range(6):
+                match i:
+                    case 0:
+                        continue
+                    case 4:
+                        break
+                    case n if n % 2:
+                        match [n, n]:
+                            case [a, b] if a == b:
+                                result.append(("pair", a))
+                    case _:
+                        result.append(i)
+            class C:
+                match "x":
+                    case "x" as y:
+                        z = y * 2
+            result.append(sorted(name for name in vars(C) if name[0] != "_"))
+            def generator(items):
+                for item in items:
+                    match item:
+                        case (1, x):
+                            yield x
+                        case [*rest] if rest:
+                            yield from rest
+            result.append(list(generator([(1, 5), [7, 8], []])))
+            """,
+            rules,
+        )
+
+    def test_many_cases(self):
+        """More cases than Python allows nested blocks."""
+        cases = "".join(
+            f"    case [{i}, x]:\n        result = x + {i}\n" for i in range(150)
+        )
+        check(f"match [149, 1]:\n{cases}", ["match"])
+
+
+class TestIncremental:
+    VERSION = textwrap.dedent(
+        '''\
+        """Docstring."""
+        import math
+
+
+        def area(radius):
+            return math.pi * radius**2
+
+
+        @staticmethod
+        def double(x):
+            return [x, x]
+
+
+        a = 1; b = 2
+        result = area(a), double(b)
+        '''
+    )
+
+    def line_numbers(self, module):
+        return [
+            (type(node).__name__, node.lineno)
+            for node in ast.walk(module)
+            if isinstance(node, ast.stmt)
+        ]
+
+    def test_same_as_transform(self):
+        incremental = transform.Incremental()
+        assert incremental.transform(self.VERSION) == transform.transform(self.VERSION)
+        edited = self.VERSION.replace("radius**2", "radius * radius")
+        assert incremental.transform(edited) == transform.transform(edited)
+
+    def test_reuse(self):
+        incremental = transform.Incremental()
+        incremental.transform(self.VERSION)
+        assert (incremental.reused, incremental.desugared) == (0, 6)
+        incremental.transform(self.VERSION.replace("[x, x]", "(x, x)"))
+        assert (incremental.reused, incremental.desugared) == (5, 1)
+
+    def test_line_numbers(self):
+        """Moved statements have their line numbers updated."""
+        incremental = transform.Incremental()
+        incremental.transform_ast(self.VERSION)
+        for edited in (
+            self.VERSION.replace("import math\n", "import math\n\n# Comment.\n\n"),
+            self.VERSION.replace("import math\n", "import math\nimport os\n"),
+            self.VERSION,
+        ):
+            module = incremental.transform_ast(edited)
+            assert incremental.desugared <= 1
+            expected = transform.transform_ast(edited)
+            assert self.line_numbers(module) == self.line_numbers(expected)
+            assert ast.dump(module, include_attributes=True) == ast.dump(
+                expected, include_attributes=True
+            )
+
+    def test_partial_parse(self):
+        """Edits which only make sense with the rest of the module still work."""
+        incremental = transform.Incremental()
+        incremental.transform(self.VERSION)
+        for edited in (
+            # Comments and blank lines only.
+            self.VERSION.replace("\n\n@", "\n# Comment.\n@"),
+            # Continues the preceding statement.
+            self.VERSION.replace("radius**2\n", "radius**2\n    return None\n"),
+            # Opens a bracket which is closed by a later statement.
+            self.VERSION.replace("import math\n", "import math\nx = (\n"),
+            self.VERSION.replace("import math\n", "import math\nx = ((\n1)\n"),
+            # The docstring changes.
+            self.VERSION.replace("Docstring.", "Changed."),
+            self.VERSION,
+        ):
+            try:
+                expected = transform.transform(edited)
+            except SyntaxError:
+                with pytest.raises(SyntaxError):
+                    incremental.transform(edited)
+            else:
+                assert incremental.transform(edited) == expected
+
+    @pytest.mark.parametrize(
+        "header", ['"""doc"""\n', "from __future__ import annotations\n"]
+    )
+    def test_header_added(self, header):
+        """A docstring or `__future__` import added to a module without one."""
+        source = "# Comment.\nimport math\nx = 1\n"
+        incremental = transform.Incremental()
+        incremental.transform(source)
+        edited = source.replace("# Comment.\n", "# Comment.\n" + header)
+        assert incremental.transform(edited) == transform.transform(edited)
+        namespace = {}
+        exec(compile(incremental.transform_ast(edited), "<x>", "exec"), namespace)
+        assert namespace.get("__doc__") == ("doc" if "doc" in header else None)
+
+    def test_runs(self):
+        incremental = transform.Incremental()
+        namespace = {}
+        exec(compile(incremental.transform_ast(self.VERSION), "<x>", "exec"), namespace)
+        assert namespace["result"] == (math.pi, [2, 2])
+
+    def test_repeated_statements(self):
+        """Identical statements on different lines get their own line numbers."""
+        source = "x = 1\nx = 1\n\nx = 1\n"
+        incremental = transform.Incremental()
+        incremental.transform_ast(source)
+        module = incremental.transform_ast("\n" + source)
+        expected = transform.transform_ast("\n" + source)
+        assert self.line_numbers(module) == self.line_numbers(expected)
+
+    def test_bytes(self):
+        source = b"# -*- coding: latin-1 -*-\nresult = '\xe9'\n"
+        incremental = transform.Incremental(["attribute"])
+        assert incremental.transform(source) == transform.transform(
+            source, ["attribute"]
+        )
+
+    def test_unknown_rule(self):
+        with pytest.raises(ValueError):
+            transform.Incremental(["nope"])